@@ -1,29 +1,43 @@
-from flask import Flask, render_template, request, jsonify, url_for, redirect, session
+from flask import Flask, render_template, request, jsonify, url_for, redirect, session, g
 import random
 import numpy as np
 import sympy  
 from collections import deque
 from spotit_game_logic import generate_cards, shuffle_cards, SpotItGame, ALL_EMOJIS
+from shared_state import InProcessSharedState, create_shared_state
+from failure_detector import PhiAccrualFailureDetector
+from lobby import Lobby
+from tracing import Tracer, RingExporter, JsonlExporter
+from metrics import MetricsRegistry, SIZE_BUCKETS, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from logs import get_logger, configure_logging
+from profiling import sample_stacks, MAX_PROFILE_SECONDS
+from backend_client import BackendClient, call_once
+import logging
+import hmac
 import argparse
 import json
 import os
 import time
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 import threading
+from functools import wraps
 import chat_pb2
 import chat_pb2_grpc
 import grpc
 from apscheduler.schedulers.background import BackgroundScheduler
-from server import ports
+from cluster import load_cluster_config, cluster_from_ips
 import sys
 import requests
 from flask import Response
 from flask_cors import CORS
+from itsdangerous import URLSafeSerializer, BadSignature
 
 app = Flask(__name__)
 CORS(app)
-app.config['SECRET_KEY'] = os.urandom(24)  # Secret key for session management
+# Secret key for session management and session tokens. Every app in the cluster
+# must share it (--secret_key / SPOTIT_SECRET_KEY) so a failover keeps players signed in.
+app.config['SECRET_KEY'] = os.environ.get('SPOTIT_SECRET_KEY') or os.urandom(24)
 app.config['SESSION_TYPE'] = 'filesystem'
 app.config['SESSION_PERMANENT'] = True
 app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hour session lifetime
@@ -31,25 +45,83 @@ app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hour session lifetime
 CLIENT_VERSION = "1.0.0"
 SERVER_HOST = ""
 SERVER_PORT = ""
-stub = None
+backend = BackendClient()  # The backend leader, called with deadlines, retries and a circuit breaker
+save_pending = False  # A snapshot failed to save; flush_pending_save sends the latest state
+game_id = uuid.uuid4().hex  # Names this game's saves on the backend; taken over from loaded state
+save_seq = 0  # Sequence number of the latest save; snapshots carry it so a new leader continues from it
+backend_seq = 0  # Newest save sequence number the backend reported when it refused one of ours
+# Saves are queued under the game lock and sent once the route lets go of it
+# (see with_game_lock), so other requests and workers don't wait on the RPC
+save_outbox = deque()  # (SaveGameStateRequest, event_type), oldest first
+save_send_lock = threading.Lock()  # One thread sends the outbox at a time, keeping saves in order
+SAVE_RETRY_INTERVAL = 1  # seconds between attempts to flush a pending save
 all_host_port_pairs = []
 is_leader = False
 AUTO_RELOAD_NEEDED = None
 
 scheduler = BackgroundScheduler()
 
+log = get_logger("app")
+
+# Metrics, served as text by /metrics
+metrics = MetricsRegistry()
+REQUEST_SECONDS = metrics.histogram("spotit_http_request_seconds", "Request latency by route",
+                                    labels=("route", "method", "status"))
+SAVE_RPC_SECONDS = metrics.histogram("spotit_save_rpc_seconds", "SaveGameState round trip to the backend",
+                                     labels=("result",))
+SNAPSHOT_BYTES = metrics.histogram("spotit_snapshot_bytes", "Size of the session snapshot sent to the backend",
+                                   buckets=SIZE_BUCKETS)
+ELECTION_TRANSITIONS = metrics.counter("spotit_app_election_transitions_total",
+                                       "App leader election state changes by new state", labels=("state",))
+metrics.gauge("spotit_rooms", "Lobby rooms by status", labels=("status",),
+              fn=lambda: lobby.room_counts())
+metrics.gauge("spotit_players", "Players seated at the table", fn=lambda: len(players))
+metrics.gauge("spotit_lobby_open_seats", "Players still needed to fill the room being formed",
+              fn=lambda: lobby.waiting_count())
+
+trace_ring = RingExporter()  # Recent spans, served by /debug/traces
+tracer = Tracer("app", exporters=[trace_ring])  # Sample rate and an optional JSONL file are set in main
+
+# Token required by /debug/profile (--admin_token / SPOTIT_ADMIN_TOKEN); profiling is off without one
+ADMIN_TOKEN = os.environ.get('SPOTIT_ADMIN_TOKEN')
+profile_lock = threading.Lock()  # One profile at a time per process
+
+# Client features rendered into the game page (see --card_format and
+# --match_mode); a page can override each one with a query flag, e.g. ?compact=0
+CLIENT_CONFIG = {"compact": True, "optimistic": True}
+
 # Game state variables
-expected_players = None
+expected_players = 3  # --players
+lobby = Lobby(expected_players)  # Waiting players; main resizes its rooms to --players
+game_finished_at = None  # time.time() when the current game finished
+RESULTS_GRACE = 30  # seconds a finished game keeps the table before a waiting room is seated
+LOBBY_WAIT_SECONDS = 10  # a lobby long-poll answers after this even if nothing changed
+LOBBY_RETRY_SECONDS = 2  # how soon a client polls again when no request thread was free to wait
+lobby_waiters = threading.BoundedSemaphore(4)  # Request threads that may block in /lobby/wait; half of --threads
 restart_votes = set()  # track session_ids that agreed to restart
 restart_requesters = set()  # track usernames who requested restart
 restart_initiator = None  # track who first requested the restart
 restart_initiator_clear_time = None  # track when to clear the initiator
 restart_in_progress = False  # track if a restart is in progress
 restart_cooldown_until = 0  # timestamp until when restart is in cooldown
+restart_next_seed = None  # deck seed of the next game, chosen on the first restart vote
+next_game = None  # that game, dealt in the background while the vote runs (this process only)
+
+# Restart timeline, driven by scheduler date jobs: the first vote pre-deals the
+# next game, the last vote swaps it in RESTART_DELAY seconds later (so clients
+# can show the notification), and the restart flag clears RESTART_FLAG_DURATION
+# seconds after that
+RESTART_DELAY = 3
+RESTART_FLAG_DURATION = 10
+RESTART_COOLDOWN = 30  # seconds before another restart can be requested
+DECLINE_COOLDOWN = 15
 game_started = False
 game_finished = False
 winner = None
 spotit_game = None
+# Bumped whenever the cards on the table change (match, shuffle, new game), so a
+# match claim can tell whether the player saw the current center card
+state_version = 0
 cards = None
 cards_pile = None
 scores = None
@@ -59,128 +131,324 @@ last_clicked_center_emoji = None
 # Player tracking
 players = {}  # Dictionary to track player status: {username: {"status": "waiting/active/finish", "joined_at": timestamp, "session_id": session_id}}
 player_sessions = {}  # Map session IDs to usernames
-
-# Game history tracking
-game_history = []
+# Lookup indexes kept in sync with players/player_sessions, so a request
+# resolves its player without rebuilding list(players.keys())
+player_names = []  # Usernames in join order; the position is the player ID
+player_ids = {}  # Map usernames to player IDs
+session_player_ids = {}  # Map session IDs to player IDs
+
+# Game history: every snapshot names the compact event it was saved for, and
+# the backend keeps the saved snapshots (GetGameHistory), so /game_history
+# reads one history from any worker or app, and it survives failovers
+last_event = None  # The event of the latest save (see history_event)
+game_start_time = datetime.now().isoformat()  # When the current game was dealt
+HISTORY_PAGE_LIMIT = 200  # Most events /game_history returns at once
 
 initial_state_loaded = False # Flag to track initial load
 
+# Backups follow the backend leader's committed state (see subscribe_to_updates)
+subscription_thread = None
+subscription_call = None
+subscription_active = False
+
+# Game room players join; signed into their session tokens and saved with the snapshot
+room_id = None
+
+# Session IDs handed to players are signed tokens carrying their room and player
+# ID, so any app that shares the secret key can identify them without a lookup
+session_serializer = URLSafeSerializer(app.config['SECRET_KEY'], salt='spotit-session')
+# Lobby tickets are signed the same way, carrying the username and lobby room,
+# so the lobby keeps no ticket table and nothing secret reaches the snapshot
+ticket_serializer = URLSafeSerializer(app.config['SECRET_KEY'], salt='spotit-lobby')
+
+# Serializes every transition of the shared game state (routes, restart timers,
+# state loads from the backend) so a threaded WSGI server can't lose updates.
+# Re-entrant because handlers call helpers like new_game_state/save_game_state.
+game_lock = threading.RLock()
+
+# Game, session and election state shared with the other worker processes of
+# this frontend (see shared_state.py). Replaced in __main__ for multi-worker runs.
+shared_state = InProcessSharedState()
+local_state_version = 0 # Version of the shared session this worker last applied
+# The lobby, waiting players and all, is shared under a key of its own: the
+# session snapshot, which is also replicated, only carries its sealed rooms
+local_lobby_version = 0 # Version of the shared lobby this worker last applied or published
+lobby_shared_at = None # lobby.version when it was last applied or published; None to publish it again
+game_lock_depth = threading.local() # with_game_lock calls this thread is in; saves are sent when it drops to 0
+
+def rebuild_player_indexes():
+    """Rebuild the player lookup indexes from players and player_sessions."""
+    player_names[:] = players.keys()
+    player_ids.clear()
+    player_ids.update((name, i) for i, name in enumerate(player_names))
+    session_player_ids.clear()
+    session_player_ids.update((sid, player_ids[name]) for sid, name in player_sessions.items() if name in player_ids)
+
+def index_player(username, session_id):
+    """Add a player who just joined (and is already in players) to the indexes."""
+    if username not in player_ids:
+        player_ids[username] = len(player_names)
+        player_names.append(username)
+    map_session(session_id, username)
+
+def map_session(sid, username):
+    """Point a session ID at a username, keeping the session index in sync."""
+    player_sessions[sid] = username
+    if username in player_ids:
+        session_player_ids[sid] = player_ids[username]
+    else:
+        session_player_ids.pop(sid, None)
+
+def configure_secret_key(secret_key):
+    """Use the cluster-wide secret key for cookies and session tokens."""
+    global session_serializer, ticket_serializer
+    app.config['SECRET_KEY'] = secret_key
+    session_serializer = URLSafeSerializer(secret_key, salt='spotit-session')
+    ticket_serializer = URLSafeSerializer(secret_key, salt='spotit-lobby')
+
+def make_session_token(username, player_id):
+    """Create the signed session ID handed to a player when they join."""
+    return session_serializer.dumps({'room': room_id, 'player_id': player_id, 'username': username})
+
+def make_lobby_ticket(username, lobby_room_id):
+    """Create the signed ticket a waiting player follows the lobby with."""
+    return ticket_serializer.dumps({'username': username, 'room': lobby_room_id})
+
+def read_lobby_ticket(ticket):
+    """Return the (username, lobby room ID) signed into a ticket, or None if it isn't valid."""
+    try:
+        identity = ticket_serializer.loads(ticket)
+    except BadSignature:
+        return None
+    return identity['username'], identity['room']
+
+def read_session_token(sid):
+    """Return the identity signed into a session token, or None if it isn't valid here."""
+    try:
+        identity = session_serializer.loads(sid)
+    except BadSignature:
+        return None
+    # Before any state is loaded room_id is unknown, trust the signature alone
+    if room_id is not None and identity.get('room') != room_id:
+        return None
+    return identity
+
+def session_room_closed(sid):
+    """True if sid was signed for an earlier room that has since given up the table."""
+    try:
+        identity = session_serializer.loads(sid)
+    except BadSignature:
+        return False
+    return room_id is not None and identity.get('room') != room_id
+
+def get_username_from_sid(sid):
+    """Resolve a session ID to a username via the session map or its signed token."""
+    if not sid:
+        return None
+    if sid in player_sessions:
+        return player_sessions[sid]
+    identity = read_session_token(sid)
+    return identity['username'] if identity else None
+
+def with_game_lock(f):
+    """Run a route or callback that changes the game while holding the game lock.
+
+    The shared state lock is taken as well so that worker processes take turns,
+    and the worker first catches up with any session another worker published.
+    Saves the call queued are sent to the backend once both locks are released.
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        game_lock_depth.value = getattr(game_lock_depth, 'value', 0) + 1
+        try:
+            with game_lock, shared_state.lock():
+                sync_from_shared_state()
+                return f(*args, **kwargs)
+        finally:
+            game_lock_depth.value -= 1
+            if game_lock_depth.value == 0:
+                send_queued_saves()
+    return wrapper
+
+def with_game_snapshot(f):
+    """Run a read-only route on this worker's copy of the game.
+
+    The copy is caught up with the last session any worker published, but the
+    shared state lock isn't taken, so reads don't queue behind other workers'
+    writes. Only the process-local game lock is held, to read a consistent copy.
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        with game_lock:
+            sync_from_shared_state()
+            return f(*args, **kwargs)
+    return wrapper
+
+def shared_state_changed():
+    """True if another worker has published a session or lobby this worker hasn't applied."""
+    return (shared_state.version('session') != local_state_version
+            or shared_state.version('lobby') != local_lobby_version)
+
+def sync_from_shared_state():
+    """Apply the shared session and lobby if another worker has published newer ones."""
+    global local_state_version, local_lobby_version, lobby_shared_at
+    # Versions are checked without reading (and parsing) the whole session
+    if shared_state.version('session') != local_state_version:
+        version, session_data = shared_state.get('session')
+        local_state_version = version
+        if session_data is not None:
+            apply_session_data(session_data, load_lobby=False)
+    if shared_state.version('lobby') != local_lobby_version:
+        version, lobby_data = shared_state.get('lobby')
+        local_lobby_version = version
+        if lobby_data is not None:
+            lobby.load(lobby_data)
+            lobby_shared_at = lobby.version
+
+def publish_lobby():
+    """Publish this worker's lobby, waiting players included, so the other workers pick it up."""
+    global local_lobby_version, lobby_shared_at
+    lobby_shared_at = lobby.version
+    local_lobby_version = shared_state.put('lobby', lobby.to_dict())
+
+def publish_shared_state(session_data=None):
+    """Publish this worker's session (and its lobby, if it changed) so the other workers pick it up."""
+    global local_state_version
+    if session_data is None:
+        session_data = build_session_data()
+    local_state_version = shared_state.put('session', session_data)
+    if lobby.version != lobby_shared_at:
+        publish_lobby()
+
+def apply_session_data(loaded_data, start_missing_game=True, load_lobby=True):
+    """Replace the game globals with a session snapshot built by build_session_data.
+
+    If the snapshot says the game started but has no cards yet, a new game is
+    dealt unless start_missing_game is False (backups wait for the leader's deal).
+    The snapshot's lobby (its sealed rooms) is loaded unless load_lobby is False,
+    as for sessions from another worker, which shares its lobby separately.
+    """
+    global expected_players, room_id, player_sessions, players, game_started, game_finished, winner, scores, cards, cards_pile, spotit_game, state_version, game_finished_at
+    global restart_votes, restart_requesters, restart_initiator, restart_initiator_clear_time, restart_in_progress, restart_cooldown_until, restart_next_seed
+    global game_id, save_seq, last_event, game_start_time, lobby_shared_at
+
+    # --- Update Global State Variables --- 
+    game_id = loaded_data.get('game_id', game_id)
+    save_seq = max(save_seq, loaded_data.get('save_seq', 0))
+    last_event = loaded_data.get('event', last_event)
+    game_start_time = loaded_data.get('server_start_time', game_start_time)
+    expected_players = loaded_data.get('expected_players', expected_players)
+    room_id = loaded_data.get('room_id')
+    player_sessions = loaded_data.get('player_sessions', {})
+    if load_lobby and loaded_data.get('lobby'):
+        lobby.load(loaded_data['lobby'])
+        lobby_shared_at = None  # The other workers get it with the next publish
+
+    current_state = loaded_data.get('current_state', {})
+    game_started = current_state.get('game_started', False)
+    game_finished = current_state.get('game_finished', False)
+    winner = current_state.get('winner', None)
+    game_finished_at = current_state.get('finished_at')
+    state_version = current_state.get('state_version', state_version)
+    loaded_scores = current_state.get('scores')
+    loaded_cards_pile = current_state.get('cards_pile')
+    loaded_deck = current_state.get('deck') # {"seed", "q"}; cards_pile then holds card IDs
+    loaded_cards = current_state.get('full_card_deck') # Legacy snapshots carry the full deck
+
+    restart_state = loaded_data.get('restart_state', {})
+    restart_votes = set(restart_state.get('votes', []))
+    restart_requesters = set(restart_state.get('requesters', []))
+    restart_initiator = restart_state.get('initiator')
+    restart_initiator_clear_time = restart_state.get('initiator_clear_time')
+    restart_in_progress = restart_state.get('in_progress', False)
+    restart_cooldown_until = restart_state.get('cooldown_until', 0)
+    restart_next_seed = restart_state.get('next_seed')
+
+    # Reconstruct players dictionary 
+    loaded_players_state = current_state.get('players', {})
+    players.clear()
+    players.update(loaded_players_state)
+    
+    rebuild_player_indexes()
+
+    # --- Initialize SpotItGame Object --- 
+    player_names_list = list(player_names)
+    if loaded_deck and loaded_cards_pile and loaded_scores is not None and player_names_list:
+        spotit_game = SpotItGame.from_card_ids(player_names_list, loaded_deck['seed'], loaded_deck['q'],
+                                               loaded_cards_pile, loaded_scores)
+        cards, cards_pile, scores = spotit_game.cards, spotit_game.cards_pile, spotit_game.scores
+    elif loaded_cards and loaded_cards_pile and loaded_scores is not None and player_names_list:
+        scores = loaded_scores # Update global scores
+        cards = loaded_cards # Update global cards (full deck)
+        cards_pile = loaded_cards_pile # Update global cards_pile
+        
+        # Convert card pile values back to deque if needed (center)
+        if 'center' in cards_pile and isinstance(cards_pile['center'], list):
+             cards_pile['center'] = deque(cards_pile['center'])
+        
+        spotit_game = SpotItGame(player_names_list, 
+                                 initial_cards=cards, 
+                                 initial_cards_pile=cards_pile, 
+                                 initial_scores=scores)
+        # SpotItGame re-keys the piles, keep the globals pointing at its state
+        cards_pile = spotit_game.cards_pile
+        log.debug("[LoadState] SpotItGame object re-initialized from loaded state.")
+    elif player_names_list and game_started and start_missing_game: # If state incomplete but players exist, start new game logic
+         log.info("[LoadState] Incomplete state loaded, initializing new SpotItGame logic.")
+         new_game_state() # Fallback to creating a new game state if loaded is incomplete
+    else:
+        log.debug("[LoadState] No game in progress in loaded state, SpotItGame not initialized.")
+        spotit_game = None # Ensure game object is None if we can't init
+        cards = cards_pile = scores = None
+
+@with_game_lock
 def load_game_state_from_server():
     """Load game state from the leader server via gRPC and update globals."""
-    global stub, expected_players, player_sessions, players, game_started, game_finished, winner, scores, cards, cards_pile, game_history, spotit_game, initial_state_loaded
+    global initial_state_loaded
     
-    if not stub:
-        print("[LoadState] Error: No connection to leader server (stub is None).")
+    if not backend.connected:
+        log.error("[LoadState] No connection to leader server.")
         return False
 
-    print("[LoadState] Attempting to load game state from leader...")
+    log.debug("[LoadState] Attempting to load game state from leader...")
     try:
-        response = stub.LoadGameState(chat_pb2.LoadGameStateRequest())
+        response = backend.call("LoadGameState", chat_pb2.LoadGameStateRequest())
         if response.success and response.session_data_json:
-            print("[LoadState] Successfully received game state from leader.")
-            loaded_data = json.loads(response.session_data_json)
-            
-            # --- Update Global State Variables --- 
-            expected_players = loaded_data.get('expected_players', expected_players)
-            player_sessions = loaded_data.get('player_sessions', {})
-            game_history = loaded_data.get('game_history', []) # Load history
-
-            current_state = loaded_data.get('current_state', {})
-            game_started = current_state.get('game_started', False)
-            game_finished = current_state.get('game_finished', False)
-            winner = current_state.get('winner', None)
-            loaded_scores = current_state.get('scores')
-            loaded_cards_pile = current_state.get('cards_pile')
-            loaded_cards = current_state.get('full_card_deck') # Use the full deck saved
-
-            # Reconstruct players dictionary 
-            loaded_players_state = current_state.get('players', {})
-            players.clear()
-            players.update(loaded_players_state)
-            
-            # --- Initialize SpotItGame Object --- 
-            player_names_list = list(players.keys())
-            if loaded_cards and loaded_cards_pile and loaded_scores is not None and player_names_list:
-                scores = loaded_scores # Update global scores
-                cards = loaded_cards # Update global cards (full deck)
-                cards_pile = loaded_cards_pile # Update global cards_pile
-                
-                # Convert card pile values back to deque if needed (center)
-                if 'center' in cards_pile and isinstance(cards_pile['center'], list):
-                     cards_pile['center'] = deque(cards_pile['center'])
-                
-                spotit_game = SpotItGame(player_names_list, 
-                                         initial_cards=cards, 
-                                         initial_cards_pile=cards_pile, 
-                                         initial_scores=scores)
-                print("[LoadState] SpotItGame object re-initialized from loaded state.")
-            elif player_names_list: # If state incomplete but players exist, start new game logic
-                 print("[LoadState] Incomplete state loaded, initializing new SpotItGame logic.")
-                 new_game_state() # Fallback to creating a new game state if loaded is incomplete
-            else:
-                print("[LoadState] No player names found in loaded state, cannot initialize SpotItGame.")
-                spotit_game = None # Ensure game object is None if we can't init
+            log.debug("[LoadState] Successfully received game state from leader.")
+            apply_session_data(json.loads(response.session_data_json))
+            publish_shared_state()
 
             initial_state_loaded = True # Mark initial load as complete
-            print(f"[LoadState] Game state loaded. Started: {game_started}, Finished: {game_finished}, Winner: {winner}")
-            print(f"[LoadState] Players: {players}")
-            print(f"[LoadState] Scores: {scores}")
+            log.info("[LoadState] Game state loaded. Started: %s, Finished: %s, Winner: %s", game_started, game_finished, winner)
+            log.debug("[LoadState] Players: %s, scores: %s", players, scores)
             return True
         else:
-            print(f"[LoadState] Failed to load game state from leader. Success: {response.success}, Message: {response.message}")
+            log.warning("[LoadState] Failed to load game state from leader. Success: %s, Message: %s", response.success, response.error_message)
             # If loading fails on first attempt, maybe start fresh? Or wait?
             if not initial_state_loaded:
-                print("[LoadState] Initial load failed. Starting with a fresh state.")
+                log.info("[LoadState] Initial load failed. Starting with a fresh state.")
                 # Potentially call new_game_state() here if desired
                 pass # Currently does nothing, waits for players to join
             return False
     except grpc.RpcError as e:
-        print(f"[LoadState] gRPC Error loading game state: {e.details()}")
+        log.error("[LoadState] gRPC error loading game state: %s", e.details())
         return False
     except json.JSONDecodeError as e:
-        print(f"[LoadState] Error decoding JSON game state: {e}")
+        log.error("[LoadState] Error decoding JSON game state: %s", e)
         return False
     except Exception as e:
-        print(f"[LoadState] Unexpected error loading game state: {e}")
+        log.exception("[LoadState] Unexpected error loading game state: %s", e)
         return False
 
-def connect_to_leader():
-    global SERVER_HOST, SERVER_PORT, stub, subscription_thread, subscription_call, subscription_active
-    print('checking leader')
-    noleader = True
-    for server in all_host_port_pairs:
-        print(f"Trying to connect to {server}")
-        print(f"All servers: {all_host_port_pairs}")
-        try:
-            temp_channel = grpc.insecure_channel(server)
-            temp_stub = chat_pb2_grpc.ChatServiceStub(temp_channel)
-            response = temp_stub.GetLeaderInfo(chat_pb2.GetLeaderInfoRequest())
-            leader_host, leader_port = response.info.split(':')
-            noleader = False
-
-            # update leader if necessary
-            if SERVER_HOST != leader_host or SERVER_PORT != leader_port:
-                SERVER_HOST = leader_host
-                SERVER_PORT = leader_port
-                print('NEW LEADER:', SERVER_HOST, SERVER_PORT)
-                channel = grpc.insecure_channel(f"{SERVER_HOST}:{SERVER_PORT}")
-                stub = chat_pb2_grpc.ChatServiceStub(channel)
-                load_game_state_from_server() # Load state from the new leader
-            break
-        except grpc.RpcError as e:
-            print(f"Failed to connect to {server}: {e.details()}")
-            continue  # Try next server
-    
-    return noleader
-
 def start_connect_to_leader_scheduler():
     if connect_to_leader():
-        print("No leader found. Exiting application.")
+        log.critical("No leader found. Exiting application.")
         sys.exit(1)
 
     # Add periodic leader check
-    scheduler.add_job(func=connect_to_leader, trigger="interval", seconds=5)
-    scheduler.start()
+    scheduler.add_job(func=connect_to_leader, trigger="interval", seconds=5, id='connect_job')
+    if not scheduler.running:
+        scheduler.start()
 
 def check_version_number():
     """
@@ -196,84 +464,41 @@ def check_version_number():
     """
     # Check connection
     try: 
-       response = stub.CheckVersion(chat_pb2.Version(version=CLIENT_VERSION))
+       response = backend.call("CheckVersion", chat_pb2.Version(version=CLIENT_VERSION))
        if not response.success:
-           print(f"Error: {response.message}") 
+           log.error("Version check failed: %s", response.message)
            return None
        
-       print(f"Successfully connected to server at {SERVER_HOST}:{SERVER_PORT} {response.message}")
+       log.info("Successfully connected to server at %s:%s %s", SERVER_HOST, SERVER_PORT, response.message)
        if not initial_state_loaded:
            load_game_state_from_server()
        return True
     except grpc.RpcError as e:
-        print(f"Error: {e.details()}")
+        log.error("Version check failed: %s", e.details())
         return None
 
-def save_game_state(event_type="update", extra_data=None):
-    """Save the current game state to the server session JSON file"""
-    # Serialize current state for event history
-    serial_pile = {k: list(v) if hasattr(v, '__iter__') else v for k,v in cards_pile.items()} if cards_pile else None
-    event = {
-        "timestamp": datetime.now().isoformat(),
-        "event_type": event_type,
-        "expected_players": expected_players,
-        "game_started": game_started,
-        "game_finished": game_finished,
-        "winner": winner,
-        "players": players.copy(),
-        "scores": spotit_game.scores.copy() if spotit_game and spotit_game.scores else None,
-        "cards_pile": serial_pile,
-        "last_clicked_player_emoji": last_clicked_player_emoji,
-        "last_clicked_center_emoji": last_clicked_center_emoji
-    }
-    
-    if extra_data:
-        event.update(extra_data)
-    
-    # Add the event to the history
-    game_history.append(event)
-    
-    # Build full session snapshot for failover
-    session_data = {
-        "server_start_time": game_history[0]["timestamp"] if game_history else datetime.now().isoformat(),
-        "last_update_time": datetime.now().isoformat(),
-        "expected_players": expected_players,
-        "player_sessions": player_sessions,
-        "current_state": {
-            "game_started": game_started,
-            "game_finished": game_finished,
-            "winner": winner,
-            "players": players,
-            "scores": spotit_game.scores if spotit_game else None,
-            "cards_pile": {k: list(v) for k,v in cards_pile.items()} if cards_pile else None,
-            "full_card_deck": spotit_game.cards if spotit_game else None,
-            "last_clicked_player_emoji": last_clicked_player_emoji,
-            "last_clicked_center_emoji": last_clicked_center_emoji
-        },
-    }
-
-    response = stub.SaveGameState(chat_pb2.SaveGameStateRequest(session_data_json = json.dumps(session_data)))
-    if response.success:
-        print(response.success, 'saved game state')
-    else:
-        print(response.success, 'failed to save game state')
-
+def new_game_state(prepared_game=None, seed=None):
+    """Initialize a new game state with cards, card piles, and scores.
 
-def new_game_state():
-    """Initialize a new game state with cards, card piles, and scores"""
-    global cards, cards_pile, scores, spotit_game, game_history, game_started, game_finished, winner
+    prepared_game, a SpotItGame dealt ahead of time (see prepare_next_game), is
+    used as is if it was dealt for the current players; otherwise a game is
+    dealt here, from seed if one is given.
+    """
+    global cards, cards_pile, scores, spotit_game, game_started, game_finished, winner, game_start_time
+    
+    # Get player names in join order (the game keeps its own copy)
+    rebuild_player_indexes()
+    names = list(player_names)
+    if prepared_game is None or prepared_game.player_names != names:
+        prepared_game = SpotItGame(names, seed=seed)
     
-    # Reset game status and history
-    game_history.clear()
+    # Reset game status, then swap the new game in
+    game_start_time = datetime.now().isoformat()
     game_started = True
     game_finished = False
     winner = None
-    
-    # Get player names from the players dictionary
-    names = list(players.keys())
-    
-    # Initialize the SpotItGame with the player names and extract its state
-    spotit_game = SpotItGame(names)
+    spotit_game = prepared_game
+    bump_state_version()
     cards = spotit_game.cards
     cards_pile = spotit_game.cards_pile
     scores = spotit_game.scores
@@ -309,47 +534,145 @@ def get_player_center_emojis(player_id):
     player_emojis = state['player']
     center_emojis = state['center']
     if center_emojis is None:
-        global game_finished, winner
-        game_finished = True
-        winner = list(players.keys())[spotit_game.scores.index(max(spotit_game.scores))]
-        
-        # Update player statuses to "finish"
-        for player in players:
-            players[player]["status"] = "finish"
-        
+        if not game_finished:
+            finish_game()
         center_emojis = f"DONE {winner}"
         
-        # Save final game state
-        save_game_state(event_type="game_finish")
-        
     return player_emojis, center_emojis
 
+@with_game_lock
+def finish_game():
+    """Finish a game whose center pile is empty. Read-only routes that notice it
+    come here too, so the finish is written under the shared lock exactly once."""
+    global game_finished, winner, game_finished_at
+    if game_finished or spotit_game is None or spotit_game.cards_pile['center']:
+        return  # Another worker finished it first (or it isn't over)
+    game_finished = True
+    game_finished_at = time.time()
+    winner = player_names[spotit_game.scores.index(max(spotit_game.scores))]
+    # Hand the table to a waiting room once the results have been seen
+    scheduler.add_job(seat_waiting_room, 'date', run_date=datetime.now() + timedelta(seconds=RESULTS_GRACE),
+                      id='seat_waiting_room', replace_existing=True)
+    
+    # Update player statuses to "finish"
+    for player in players:
+        players[player]["status"] = "finish"
+    
+    # Save final game state
+    save_game_state(event_type="game_finish")
+
+def bump_state_version():
+    global state_version
+    state_version += 1
+
 def update_cards(player_id):
-    """Update the cards after a match is found"""
+    """Update the cards after a match is found; the caller saves the match"""
     player_emojis, center_emojis = spotit_game.update_cards(player_id)
-    
-    # Save game state after card update
-    save_game_state(event_type="card_update")
-    
+    bump_state_version()
     return player_emojis, center_emojis
 
 def get_player_id_from_session():
     """Get the player ID based on header, URL param, or cookie"""
     # Identify via header or URL param first
     sid = request.headers.get('X-Session-Id') or request.args.get('session_id')
-    print(f"DEBUG get_player_id_from_session: sid={sid}")
-    if sid and sid in player_sessions:
-        username = player_sessions[sid]
-        print(f"DEBUG get_player_id_from_session: username={username}")
-        return list(players.keys()).index(username)
+    log.debug("get_player_id_from_session: sid=%s", sid)
+    player_id = session_player_ids.get(sid) if sid else None
+    if player_id is None and sid:
+        # Not in this app's session map (e.g. right after a failover): trust the signed token
+        identity = read_session_token(sid)
+        if identity and identity['player_id'] < len(player_names):
+            player_id = identity['player_id']
+    if player_id is not None:
+        log.debug("get_player_id_from_session: player_id=%s", player_id)
+        return player_id
     # Fallback to Flask cookie session
     username = session.get('username')
-    print(f"DEBUG get_player_id_from_session: fallback cookie username={username}")
-    if username and username in players:
-        return list(players.keys()).index(username)
+    log.debug("get_player_id_from_session: fallback cookie username=%s", username)
+    player_id = player_ids.get(username) if username else None
+    if player_id is not None:
+        return player_id
     # Default to first player
     return 0
 
+# -------------------------
+# Tracing: every request is the root span of a trace (recorded for a
+# --trace_sample_rate fraction of requests). The trace follows a save through
+# SaveGameState on the backend leader and its replication to the followers.
+# -------------------------
+@app.before_request
+def start_request_span():
+    g.trace_span = tracer.start_span(f"{request.method} {request.path}").activate()
+
+@app.after_request
+def tag_request_span(response):
+    span = g.get('trace_span')
+    if span is not None:
+        span.set_attribute("status", response.status_code)
+    return response
+
+@app.teardown_request
+def finish_request_span(exc):
+    span = g.pop('trace_span', None)
+    if span is not None:
+        if exc is not None:
+            span.error = f"{type(exc).__name__}: {exc}"
+        span.finish()
+
+# -------------------------
+# Metrics: request latency per route (the URL rule, so there is one series
+# per route rather than per URL), plus save, snapshot and election metrics
+# recorded where they happen. Each worker process keeps its own.
+# -------------------------
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method,
+                                status=response.status_code)
+    return response
+
+@app.route('/metrics')
+def metrics_text():
+    return Response(metrics.render(), mimetype=METRICS_CONTENT_TYPE)
+
+@app.route('/debug/traces')
+def debug_traces():
+    """Recent spans of this process, oldest first; ?trace_id= for one trace, ?limit= (default 200)"""
+    limit = min(request.args.get('limit', 200, type=int), trace_ring.spans.maxlen)
+    return jsonify({"spans": trace_ring.recent(request.args.get('trace_id'), limit)})
+
+@app.route('/debug/profile')
+def debug_profile():
+    """Sample this process's threads for ?seconds= (default 10) and return the profile as text.
+
+    Needs the admin token in X-Admin-Token. ?format=top (default) is a table of functions by
+    samples, ?format=collapsed is flame graph input; ?thread= keeps threads whose name contains
+    it (request threads are "process_request_thread"), ?interval= is seconds between samples."""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Profiling is disabled, start the app with --admin_token"}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({"error": "Invalid admin token"}), 403
+    fmt = request.args.get('format', 'top')
+    if fmt not in ('top', 'collapsed'):
+        return jsonify({"error": "format must be top or collapsed"}), 400
+    seconds = request.args.get('seconds', 10.0, type=float)
+    interval = request.args.get('interval', 0.005, type=float)
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or not 0.001 <= interval <= 1:
+        return jsonify({"error": f"seconds must be in (0, {MAX_PROFILE_SECONDS}] and interval in [0.001, 1]"}), 400
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({"error": "A profile is already running"}), 409
+    try:
+        log.info("Profiling for %.1f s", seconds)
+        profile = sample_stacks(seconds, interval, request.args.get('thread'))
+    finally:
+        profile_lock.release()
+    return Response(profile.render(fmt), mimetype='text/plain')
+
 @app.route('/')
 def login():
     """Render the login page with waiting room information"""
@@ -358,55 +681,56 @@ def login():
     global players, expected_players
     
     # Debug session info
-    print(f"Session at login: {session}")
-    print(f"Session ID: {session.get('session_id', 'None')}")
-    print(f"Username: {session.get('username', 'None')}")
+    log.debug("Session at login: %s", session)
     
     return render_template('login.html', 
-                          current_players=len(players), 
+                          current_players=expected_players - lobby.waiting_count(), 
                           expected_players=expected_players)
 
 @app.route('/check_game_status')
+@with_game_snapshot
 def check_game_status():
-    """Check if all players have joined and the game is ready to start"""
-    global players, expected_players, game_started
-    
-    waiting_count = expected_players - len(players)
-    
-    # If the game has already started, redirect any waiting players to the game
-    if game_started:
-        sid = request.headers.get('X-Session-Id')
-        return jsonify({
-            "game_ready": True,
-            "redirect": url_for('spot_it_game', session_id=sid)
-        })
-    
-    # If all players have joined but game hasn't officially started yet
-    if len(players) >= expected_players and not game_started:
-        # All players have joined, start the game
-        game_started = True
-        
-        # Update all player statuses to "active"
-        for player in players:
-            players[player]["status"] = "active"
-        
-        # Save game state
-        save_game_state(event_type="all_players_joined")
-        
-        sid = request.headers.get('X-Session-Id')
-        return jsonify({
-            "game_ready": True,
-            "redirect": url_for('spot_it_game', session_id=sid)
-        })
-    else:
-        # Still waiting for players
-        return jsonify({
-            "game_ready": False,
-            "waiting_count": waiting_count,
-            "players": players
-        })
+    """Lobby status for ?ticket=, without waiting for a change (see /lobby/wait)"""
+    return jsonify(lobby_status(request.args.get('ticket')))
+
+@app.route('/lobby/wait')
+def lobby_wait():
+    """Long-poll: the lobby status for ?ticket= once the lobby has changed since ?version=.
+
+    A client that hasn't seen the current version is answered at once, others
+    wait up to LOBBY_WAIT_SECONDS. Only lobby_waiters request threads may wait
+    at a time; past that the status comes back at once with retry_after, so
+    waiting players poll instead of taking every thread of the worker. Other
+    workers' changes are picked up within a second, and the game lock is only
+    taken to apply them and to read the answer.
+    """
+    ticket = request.args.get('ticket')
+    if not ticket:
+        return jsonify({"error": "ticket is required"}), 400
+    seen = request.args.get('version', type=int)
+    retry_after = 0
+    if shared_state_changed():
+        with game_lock:
+            sync_from_shared_state()
+    if seen == lobby.version:
+        if lobby_waiters.acquire(blocking=False):
+            try:
+                deadline = time.monotonic() + LOBBY_WAIT_SECONDS
+                while lobby.version == seen and time.monotonic() < deadline:
+                    lobby.wait_for_change(seen, timeout=min(1.0, deadline - time.monotonic()))
+                    if shared_state_changed():
+                        with game_lock:
+                            sync_from_shared_state()
+            finally:
+                lobby_waiters.release()
+        else:
+            retry_after = LOBBY_RETRY_SECONDS
+    with game_lock:  # A join that woke us may still be seating its room
+        sync_from_shared_state()
+        return jsonify({**lobby_status(ticket), "version": lobby.version, "retry_after": retry_after})
 
 @app.route('/spot_it_game')
+@with_game_lock
 def spot_it_game():
     """Initialize the game and render the game page"""
     # Ensure session_id in URL or cookie; redirect to include param
@@ -416,10 +740,13 @@ def spot_it_game():
         if sid:
             return redirect(url_for('spot_it_game', session_id=sid))
         return redirect(url_for('login'))
+    if session_room_closed(sid):
+        return redirect(url_for('login'))
     # Rehydrate server-side session for page navigations
-    if sid in player_sessions:
+    sid_username = get_username_from_sid(sid)
+    if sid_username:
         session['session_id'] = sid
-        session['username'] = player_sessions[sid]
+        session['username'] = sid_username
     global cards, cards_pile, scores, game_started, spotit_game
     
     # Only allow access if the game has started
@@ -439,103 +766,143 @@ def spot_it_game():
     # Get player name safely
     player_name = "Unknown"
     sid_to_use = request.headers.get('X-Session-Id') or request.args.get('session_id')
-    if sid_to_use in player_sessions:
-        player_name = player_sessions[sid_to_use]
+    sid_username = get_username_from_sid(sid_to_use)
+    if sid_username:
+        player_name = sid_username
     elif session.get('username'):
         player_name = session.get('username')
         # Repair the player_sessions mapping if needed
         if session.get('session_id'):
-            player_sessions[session.get('session_id')] = player_name
+            map_session(session.get('session_id'), player_name)
     
     return render_template('emojis.html', 
                            player_emojis=player_emojis, 
                            center_emojis=center_emojis, 
-                           names=list(players.keys()),
+                           names=player_names,
                            scores=spotit_game.scores,
                            player_id=player_id,
-                           player_name=player_name)
+                           player_name=player_name,
+                           state_version=state_version,
+                           player_rotation=player_rotation(player_emojis),
+                           client_config=CLIENT_CONFIG)
 
 @app.route('/set_username', methods=['POST'])
+@with_game_lock
 def set_username():
-    """Add a new player to the game"""
-    global players, expected_players, game_started, player_sessions
-    
+    """Queue a player in the lobby; a room that fills up is seated as soon as the table is free"""
     data = request.get_json()
     username = data.get('username')
     
-    # Debug session info before processing
-    print(f"Session before set_username: {session}")
+    try:
+        if not username or username in players:
+            raise ValueError(f"Username {username} is already taken")
+        room = lobby.join(username)
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "Username already taken"
+        })
+    log.info("%s joined the lobby (room %s)", username, room['id'])
     
-    if username and username not in players and len(players) < expected_players:
-        # Generate a unique session ID for this player
-        session_id = str(uuid.uuid4())
-        
-        # Store in session
-        session['session_id'] = session_id
+    if room['status'] == 'ready':
+        seat_waiting_room()
+        if room['status'] == 'ready':
+            # Sealed but queued behind the table: backups must know the room to seat it after a failover
+            save_game_state(event_type="room_ready")
+    else:
+        # Joins to the forming room only reach the other workers; the backend gets them once the room is sealed
+        publish_lobby()
+    
+    ticket = make_lobby_ticket(username, room['id'])
+    status = lobby_status(ticket)
+    if status['game_ready']:
+        session['session_id'] = status['session_id']
         session['username'] = username
+    return jsonify({"success": True, "ticket": ticket, **status})
 
-        # Debug after setting
-        print(f"Set username in session: {username}")
-        print(f"Session ID: {session_id}")
-        print(f"Full session: {session}")
+def table_is_free():
+    """The table is free before the first game and once a finished game's results have been seen."""
+    if not game_started:
+        return True
+    return game_finished and game_finished_at is not None and time.time() >= game_finished_at + RESULTS_GRACE
 
-        # Add player to tracking
+@with_game_lock
+def seat_waiting_room():
+    """Give the table to the oldest full lobby room, if the table is free."""
+    global room_id, game_started, game_finished, game_finished_at, winner, spotit_game, cards, cards_pile, scores
+    global last_clicked_player_emoji, last_clicked_center_emoji
+    global restart_votes, restart_requesters, restart_initiator, restart_in_progress, restart_next_seed
+    if not table_is_free():
+        return
+    room = lobby.take_ready_room()
+    if room is None:
+        return
+    if room_id is not None:
+        lobby.close_room(room_id)
+    
+    # The room's members become the players, with session IDs for the new room
+    room_id = room['id']
+    players.clear()
+    player_sessions.clear()
+    for player_id, username in enumerate(room['members']):
+        session_id = make_session_token(username, player_id)
         players[username] = {
-            "status": "waiting",
+            "status": "active",
             "joined_at": datetime.now().isoformat(),
             "session_id": session_id
         }
-        
-        # Map session ID to username
         player_sessions[session_id] = username
-        
-        # Save game state after player joins
-        save_game_state(event_type="player_joined")
-        
-        waiting_count = expected_players - len(players)
-        
-        # Check if this was the last player needed
-        if len(players) >= expected_players:
-            game_started = True
-            
-            # Update all player statuses to "active"
-            for player in players:
-                players[player]["status"] = "active"
-            
-            # Save game state
-            save_game_state(event_type="all_players_joined")
-            
-            # Redirect with session_id query param to keep client-specific state
-            return jsonify({
-                "success": True,
-                "redirect": url_for('spot_it_game', session_id=session_id),
-                "session_id": session_id,
-                "username": username
-            })
-        else:
-            # Still waiting for more players
-            return jsonify({
-                "success": True,
-                "waiting_count": waiting_count,
-                "players": players,
-                "session_id": session_id,
-                "username": username
-            })
-    else:
-        # Username already taken or max players reached
-        return jsonify({
-            "success": False,
-            "error": "Username already taken or maximum players reached"
-        })
+    rebuild_player_indexes()
+    
+    # The first visit to the game page deals the cards
+    game_started = True
+    game_finished = False
+    game_finished_at = None
+    winner = None
+    spotit_game = cards = cards_pile = scores = None
+    last_clicked_player_emoji = last_clicked_center_emoji = None
+    restart_votes.clear()
+    restart_requesters.clear()
+    restart_initiator = None
+    restart_in_progress = False
+    restart_next_seed = None
+    bump_state_version()
+    log.info("Room %s seated: %s", room_id, room['members'])
+    save_game_state(event_type="all_players_joined")
+
+def lobby_status(ticket):
+    """What a waiting player sees: the room's progress, or where to go once it is seated."""
+    identity = read_lobby_ticket(ticket) if ticket else None
+    status = lobby.status(*identity) if identity else None
+    if status is None:
+        return {"game_ready": False, "waiting_count": lobby.waiting_count()}
+    username = status['username']
+    player = players.get(username)
+    if status['status'] == 'playing' and status['room_id'] == room_id and player:
+        session_id = player['session_id']
+        return {
+            "game_ready": True,
+            "username": username,
+            "session_id": session_id,
+            "redirect": url_for('spot_it_game', session_id=session_id)
+        }
+    return {
+        "game_ready": False,
+        "username": username,
+        "waiting_count": status['waiting_count'],
+        "rooms_ahead": status['rooms_ahead'],
+        "players": status['members']
+    }
 
 @app.route('/clickedPlayer', methods=['POST'])
+@with_game_lock
 def clicked_player():
     """Handle when a player clicks on their own card"""
     global last_clicked_player_emoji, last_clicked_center_emoji
-    print(f"DEBUG clicked_player: headers={dict(request.headers)}, cookie_session={dict(session)}")
+    log.debug("clicked_player: headers=%s, cookie_session=%s", request.headers, session)
     # Get the player ID based on the session
     player_id = get_player_id_from_session()
-    print(f"DEBUG clicked_player: resolved player_id={player_id}")
+    log.debug("clicked_player: resolved player_id=%s", player_id)
     data = request.get_json()
     last_clicked_player_emoji = data.get('emoji')
     if last_clicked_player_emoji == last_clicked_center_emoji: 
@@ -543,14 +910,13 @@ def clicked_player():
         player_emojis, center_emojis = update_cards(player_id)
         
         # Save the match event
-        save_game_state(event_type="match_found")
+        save_game_state(event_type="match_found", player_id=player_id)
         
         json_message = jsonify({
             'message': f'You found a match {last_clicked_player_emoji}!',
-            'player_emojis': player_emojis,
-            'center_emojis': center_emojis,
+            **card_payload(player_emojis, center_emojis),
             'clear_highlight': True,
-            'names': list(players.keys()),
+            'names': player_names,
             'scores': spotit_game.scores
         })
         last_clicked_player_emoji = None
@@ -558,7 +924,7 @@ def clicked_player():
         return json_message
     elif last_clicked_center_emoji is not None: 
         # Save the no-match event
-        save_game_state(event_type="no_match")
+        save_game_state(event_type="no_match", player_id=player_id)
         
         json_message = jsonify({
             'message': f'{last_clicked_player_emoji} and {last_clicked_center_emoji} is not a match!',
@@ -569,20 +935,21 @@ def clicked_player():
         return json_message
     else: 
         # Save the player click event
-        save_game_state(event_type="player_emoji_clicked")
+        save_game_state(event_type="player_emoji_clicked", player_id=player_id)
         
         return jsonify({
             'highlight': last_clicked_player_emoji
         })
 
 @app.route('/clickedCenter', methods=['POST'])
+@with_game_lock
 def clicked_center():
     """Handle when a player clicks on the center card"""
     global last_clicked_player_emoji, last_clicked_center_emoji
-    print(f"DEBUG clicked_center: headers={dict(request.headers)}, cookie_session={dict(session)}")
+    log.debug("clicked_center: headers=%s, cookie_session=%s", request.headers, session)
     # Get the player ID based on the session
     player_id = get_player_id_from_session()
-    print(f"DEBUG clicked_center: resolved player_id={player_id}")
+    log.debug("clicked_center: resolved player_id=%s", player_id)
     data = request.get_json()
     last_clicked_center_emoji = data.get('emoji')
     if last_clicked_player_emoji == last_clicked_center_emoji: 
@@ -590,14 +957,13 @@ def clicked_center():
         player_emojis, center_emojis = update_cards(player_id)
         
         # Save the match event
-        save_game_state(event_type="match_found")
+        save_game_state(event_type="match_found", player_id=player_id)
         
         json_message = jsonify({
             'message': f'You found a match {last_clicked_player_emoji}!',
-            'player_emojis': player_emojis,
-            'center_emojis': center_emojis,
+            **card_payload(player_emojis, center_emojis),
             'clear_highlight': True,
-            'names': list(players.keys()),
+            'names': player_names,
             'scores': spotit_game.scores
         })
         last_clicked_player_emoji = None
@@ -605,7 +971,7 @@ def clicked_center():
         return json_message
     elif last_clicked_player_emoji is not None: 
         # Save the no-match event
-        save_game_state(event_type="no_match")
+        save_game_state(event_type="no_match", player_id=player_id)
         
         json_message = jsonify({
             'message': f'{last_clicked_player_emoji} and {last_clicked_center_emoji} is not a match!',
@@ -616,16 +982,64 @@ def clicked_center():
         return json_message
     else: 
         # Save the center click event
-        save_game_state(event_type="center_emoji_clicked")
+        save_game_state(event_type="center_emoji_clicked", player_id=player_id)
         
         return jsonify({
             'highlight': last_clicked_center_emoji
         })
 
+@app.route('/claim_match', methods=['POST'])
+@with_game_lock
+def claim_match():
+    """Settle a match the browser has already shown optimistically.
+
+    The claim names the symbol and the state_version of the cards the player
+    was looking at. If the cards changed since then (another player took the
+    center card, or it was shuffled) the claim is rejected and the current
+    cards are returned, so the same center card is never awarded twice.
+    """
+    global last_clicked_player_emoji, last_clicked_center_emoji
+    player_id = get_player_id_from_session()
+    data = request.get_json()
+    emoji = data.get('emoji')
+
+    if spotit_game is None or game_finished:
+        return jsonify({'accepted': False, 'message': 'The game is over'})
+
+    player_emojis, center_emojis = get_player_center_emojis(player_id)
+    if data.get('state_version') != state_version:
+        message = 'Too slow, someone else took that card!'
+    elif isinstance(center_emojis, str) or not (any(e['emoji'] == emoji for e in player_emojis)
+                                                 and any(e['emoji'] == emoji for e in center_emojis)):
+        message = f'{emoji} is not on both cards!'
+    else:
+        spotit_game.scores[player_id] += 1
+        player_emojis, center_emojis = update_cards(player_id)
+        save_game_state(event_type="match_found", player_id=player_id)
+        last_clicked_player_emoji = None
+        last_clicked_center_emoji = None
+        return jsonify({
+            'accepted': True,
+            'message': f'You found a match {emoji}!',
+            **card_payload(player_emojis, center_emojis),
+            'names': player_names,
+            'scores': spotit_game.scores
+        })
+
+    return jsonify({
+        'accepted': False,
+        'message': message,
+        **card_payload(player_emojis, center_emojis),
+        'names': player_names,
+        'scores': spotit_game.scores
+    })
+
 @app.route('/shuffle', methods=['POST'])
+@with_game_lock
 def shuffle():
     """Shuffle the center cards"""
     spotit_game.cards_pile['center'] = deque(shuffle_cards(list(spotit_game.cards_pile['center'])))
+    bump_state_version()
     
     # Get the player ID based on the session
     player_id = get_player_id_from_session()
@@ -633,54 +1047,52 @@ def shuffle():
     player_emojis, center_emojis = get_player_center_emojis(player_id)
     
     # Save game state after shuffle
-    save_game_state(event_type="cards_shuffled")
+    save_game_state(event_type="cards_shuffled", player_id=player_id)
     
     return jsonify({
-        'player_emojis': player_emojis,
-        'center_emojis': center_emojis,
+        **card_payload(player_emojis, center_emojis),
         'clear_highlight': True
     })
 
 @app.route('/rotate', methods=['POST'])
+@with_game_snapshot
 def rotate():
-    """Rotate the player's card"""
-    # Get the player ID based on the session
+    """Record how far the player has turned their card.
+
+    The browser turns the card itself; the offset is only kept so a reload
+    shows it the same way. It lives in the player's session cookie, tagged
+    with the card it belongs to, so a rotation never touches the game state.
+    """
     player_id = get_player_id_from_session()
-    
+    if spotit_game is None or player_id >= spotit_game.n_players:
+        return jsonify({'error': 'Game not started'}), 400
+
+    card = spotit_game.cards_pile[player_id][-1]
+    steps = player_rotation(card)
     data = request.get_json()
-    direction = data.get('direction')
-    player_emojis = spotit_game.cards_pile[player_id][-1] 
-    for player_emoji in player_emojis:
-        if direction == 'clockwise':
-            if player_emoji['index'] != 0:
-                player_emoji['index'] = (player_emoji['index'] % 7) + 1
-            player_emoji['rotation'] = (player_emoji['rotation'] + 360/7) % 360
-        if direction == 'counterclockwise':
-            if player_emoji['index'] != 0:
-                player_emoji['index'] = ((player_emoji['index'] - 2) % 7) + 1
-            player_emoji['rotation'] = (player_emoji['rotation'] - 360/7) % 360
-    
-    player_emojis, center_emojis = get_player_center_emojis(player_id)
-    
-    # Save game state after rotation
-    save_game_state(event_type="card_rotated")
-    
-    response = {
-        'player_emojis': player_emojis,
-        'center_emojis': center_emojis
-    }
-    if last_clicked_center_emoji and last_clicked_player_emoji is None:
-        response['containerId'] = "center-circle-container"
-        response['highlight'] = last_clicked_center_emoji
-    elif last_clicked_player_emoji and last_clicked_center_emoji is None:
-        response['containerId'] = "player-circle-container"
-        response['highlight'] = last_clicked_player_emoji
-    return jsonify(response)
+    if data.get('rotation') is not None:
+        steps = int(data['rotation'])
+    elif data.get('direction') in ('clockwise', 'counterclockwise'):
+        steps += 1 if data['direction'] == 'clockwise' else -1
+    steps %= spotit_game.q  # q symbols sit on the ring
+    session['player_rotation'] = [spotit_game.deck_id, spotit_game.card_id(card), steps]
+    return jsonify({'player_rotation': steps})
+
+def player_rotation(player_emojis):
+    """Notches clockwise this browser has turned player_emojis; 0 for a card it hasn't turned."""
+    saved = session.get('player_rotation')
+    if not saved or player_emojis is None or spotit_game is None:
+        return 0
+    deck_id, card_id, steps = saved
+    if deck_id != spotit_game.deck_id or card_id != spotit_game.card_id(player_emojis):
+        return 0
+    return steps
 
 @app.route('/request_restart', methods=['POST'])
+@with_game_lock
 def request_restart():
     """Handle a player's vote to start a new game"""
-    global restart_votes, restart_requesters, restart_initiator, cards, cards_pile, scores, spotit_game, game_started, game_finished, winner, restart_in_progress, restart_cooldown_until
+    global restart_votes, restart_requesters, restart_initiator, restart_in_progress, restart_next_seed, restart_initiator_clear_time
     
     # Check if restart is in cooldown period
     current_time = time.time()
@@ -702,20 +1114,16 @@ def request_restart():
     
     # Get session ID from various sources
     sid = request.headers.get('X-Session-Id') or request.args.get('session_id') or session.get('session_id')
-    print(f"Request restart - headers: {dict(request.headers)}")
-    print(f"Request restart - session: {dict(session)}")
-    print(f"Request restart - sid: {sid}")
+    log.debug("Request restart - headers: %s, session: %s, sid: %s", request.headers, session, sid)
     
     # Get username from session or request
-    username = None
-    if sid and sid in player_sessions:
-        username = player_sessions[sid]
-    elif session.get('username'):
+    username = get_username_from_sid(sid)
+    if not username and session.get('username'):
         username = session.get('username')
         # Repair session mapping if needed
         if sid:
-            player_sessions[sid] = username
-    else:
+            map_session(sid, username)
+    elif not username:
         # Try to get username from request data
         data = request.get_json(silent=True) or {}
         if data.get('username'):
@@ -724,16 +1132,16 @@ def request_restart():
             if not sid:
                 sid = str(uuid.uuid4())
                 session['session_id'] = sid
-            player_sessions[sid] = username
-            print(f"Created new session mapping: {sid} -> {username}")
+            map_session(sid, username)
+            log.info("Created new session mapping: %s -> %s", sid, username)
     
     if not username:
-        print(f"ERROR: Could not determine username for restart request")
+        log.warning("Could not determine username for restart request")
         # Use a fallback username rather than failing
         username = f"Player-{len(restart_votes)+1}"
         if sid:
-            player_sessions[sid] = username
-            print(f"Using fallback username: {username} for sid: {sid}")
+            map_session(sid, username)
+            log.warning("Using fallback username: %s for sid: %s", username, sid)
      
     # Add this player's vote and track their username
     if sid:
@@ -744,21 +1152,28 @@ def request_restart():
     restart_requesters.add(username)
     
     # Track who initiated the restart (first requester)
+    if restart_initiator_expired():
+        restart_initiator = None  # Still set from a declined restart
+        restart_initiator_clear_time = None
     if restart_initiator is None:
         restart_initiator = username
-        print(f"Restart initiated by: {restart_initiator}")
+        log.info("Restart initiated by: %s", restart_initiator)
+    
+    # Deal the next game while the others vote
+    if restart_next_seed is None:
+        restart_next_seed = random.randrange(2**32)
+        scheduler.add_job(prepare_next_game, args=[restart_next_seed, list(player_names)],
+                          id='prepare_next_game', replace_existing=True)
      
     total = len(player_sessions)
     count = len(restart_votes)
      
-    print(f"Restart vote from {username} (sid={sid}). Current votes: {count}/{total}. Initiator: {restart_initiator}")
-    print(f"Voters: {restart_votes}")
-    print(f"Requesters: {restart_requesters}")
-    print(f"Player sessions: {player_sessions}")
+    log.info("Restart vote from %s. Current votes: %s/%s. Initiator: %s", username, count, total, restart_initiator)
+    log.debug("Voters: %s, requesters: %s, player sessions: %s", restart_votes, restart_requesters, player_sessions)
      
     # all agreed -> restart
     if count >= total:
-        print(f"All {total} players agreed to restart. Resetting game...")
+        log.info("All %s players agreed to restart. Resetting game...", total)
         
         # Set a flag to indicate restart is in progress
         restart_in_progress = True
@@ -766,46 +1181,9 @@ def request_restart():
         # Save game state before resetting
         save_game_state(event_type="game_restarted")
         
-        # Delay the actual restart to ensure all clients get the restart notification
-        def delayed_restart():
-            global restart_votes, restart_requesters, restart_initiator, cards, cards_pile, scores, spotit_game, game_started, game_finished, winner, restart_in_progress, restart_cooldown_until
-            
-            # Reset game state
-            game_started = False
-            game_finished = False
-            winner = None
-            
-            # clear votes and re-initiate game state
-            restart_votes.clear()
-            restart_requesters.clear()
-            restart_initiator = None
-            
-            # Clear game state
-            spotit_game = None
-            cards = None
-            cards_pile = None
-            scores = None
-            
-            # Re-initialize game state immediately
-            cards, cards_pile, scores = new_game_state()
-            game_started = True
-            print("Game state re-initialized after restart")
-            
-            # Set cooldown period (30 seconds) before another restart can be initiated
-            restart_cooldown_until = time.time() + 30
-            print(f"Restart cooldown set until: {restart_cooldown_until}")
-            
-            # Reset restart flag after 10 seconds to ensure all clients have seen it
-            def reset_restart_flag():
-                global restart_in_progress
-                restart_in_progress = False
-                print("Reset restart_in_progress flag after delay")
-            
-            threading.Timer(10.0, reset_restart_flag).start()
-        
-        # Start the delayed restart after 3 seconds
-        # This gives clients time to receive and display the restart notification
-        threading.Timer(3.0, delayed_restart).start()
+        # Swap the new game in once all clients have had time to show the notification
+        scheduler.add_job(delayed_restart, 'date', run_date=datetime.now() + timedelta(seconds=RESTART_DELAY),
+                          id='restart_game', replace_existing=True)
         
         return jsonify({
             'success': True, 
@@ -824,53 +1202,98 @@ def request_restart():
             'restart_initiator': restart_initiator
         })
 
+def prepare_next_game(seed, names):
+    """Scheduler job: deal the next game off the request path during a restart vote."""
+    global next_game
+    game = SpotItGame(names, seed=seed)  # Building the deck is the slow part; no lock needed
+    with game_lock:
+        next_game = game
+    log.info("Next game dealt in the background (seed %s)", seed)
+
+@with_game_lock
+def delayed_restart():
+    """Scheduler job: start the game prepared during the vote."""
+    global restart_votes, restart_requesters, restart_initiator, restart_cooldown_until, restart_next_seed, next_game
+
+    # clear votes and swap in the next game (dealt now if the background deal
+    # happened in another process or for other players)
+    restart_votes.clear()
+    restart_requesters.clear()
+    restart_initiator = None
+    prepared = next_game if next_game is not None and next_game.seed == restart_next_seed else None
+    new_game_state(prepared_game=prepared, seed=restart_next_seed)
+    next_game = None
+    restart_next_seed = None
+    log.info("Game state re-initialized after restart")
+    
+    # Set cooldown period before another restart can be initiated
+    restart_cooldown_until = time.time() + RESTART_COOLDOWN
+    log.info("Restart cooldown set until: %s", restart_cooldown_until)
+    publish_shared_state()
+    
+    # Reset restart flag later to ensure all clients have seen it
+    scheduler.add_job(reset_restart_flag, 'date', run_date=datetime.now() + timedelta(seconds=RESTART_FLAG_DURATION),
+                      id='reset_restart_flag', replace_existing=True)
+
+@with_game_lock
+def reset_restart_flag():
+    """Scheduler job: end the restart notification window."""
+    global restart_in_progress
+    restart_in_progress = False
+    log.info("Reset restart_in_progress flag after delay")
+    publish_shared_state()
+
 @app.route('/decline_restart', methods=['POST'])
+@with_game_lock
 def decline_restart():
     """Handle a player's vote to decline a restart"""
-    global restart_votes, restart_requesters, restart_initiator, restart_in_progress, restart_cooldown_until
+    global restart_votes, restart_requesters, restart_initiator, restart_in_progress, restart_cooldown_until, restart_next_seed, next_game
     
     # Get session ID from various sources
     sid = request.headers.get('X-Session-Id') or request.args.get('session_id') or session.get('session_id')
-    print(f"Decline restart - headers: {dict(request.headers)}")
-    print(f"Decline restart - session: {dict(session)}")
-    print(f"Decline restart - sid: {sid}")
+    log.debug("Decline restart - headers: %s, session: %s, sid: %s", request.headers, session, sid)
     
     # Get username from session or request
-    username = None
-    if sid and sid in player_sessions:
-        username = player_sessions[sid]
-    elif session.get('username'):
+    username = get_username_from_sid(sid)
+    if not username and session.get('username'):
         username = session.get('username')
-    else:
+    elif not username:
         # Try to get username from request data
         data = request.get_json(silent=True) or {}
         if data.get('username'):
             username = data.get('username')
     
     if not username:
-        print(f"ERROR: Could not determine username for decline restart request")
+        log.warning("Could not determine username for decline restart request")
         return jsonify({'success': False, 'error': 'Could not identify player'})
     
-    print(f"Player {username} declined to restart")
+    log.info("Player %s declined to restart", username)
     
     # Store the initiator before clearing
     current_initiator = restart_initiator
     
-    # Cancel the restart process
+    # Cancel the restart process and drop the pre-dealt game
     restart_votes.clear()
     restart_requesters.clear()
     restart_in_progress = False
+    restart_next_seed = None
+    next_game = None
+    # Nor deal or swap in the next game if the vote already scheduled it
+    for job_id in ('prepare_next_game', 'restart_game'):
+        if scheduler.get_job(job_id):
+            scheduler.remove_job(job_id)
     
-    # Set cooldown period (15 seconds) before another restart can be initiated
-    restart_cooldown_until = time.time() + 15
-    print(f"Restart cooldown set until: {restart_cooldown_until} after decline")
+    # Set cooldown period before another restart can be initiated
+    restart_cooldown_until = time.time() + DECLINE_COOLDOWN
+    log.info("Restart cooldown set until: %s after decline", restart_cooldown_until)
     
     # Save the decline event
-    save_game_state(event_type="restart_declined", extra_data={"declined_by": username})
+    save_game_state(event_type="restart_declined", event_data={"declined_by": username})
     
     # Set a timer to clear the initiator after 5 seconds
     global restart_initiator_clear_time
     restart_initiator_clear_time = time.time() + 5
+    publish_shared_state()
     
     # Notify all players that the restart was declined
     return jsonify({
@@ -878,10 +1301,11 @@ def decline_restart():
         'restart_cancelled': True,
         'declined_by': username,
         'restart_initiator': current_initiator,
-        'cooldown_seconds': 15
+        'cooldown_seconds': DECLINE_COOLDOWN
     })
 
 @app.route('/player_status')
+@with_game_snapshot
 def player_status():
     """Get the status of all players"""
     global players
@@ -890,21 +1314,25 @@ def player_status():
         "game_started": game_started,
         "game_finished": game_finished,
         "winner": winner,
-        "current_player": player_sessions[request.headers.get('X-Session-Id') or request.args.get('session_id')],
+        "current_player": get_username_from_sid(request.headers.get('X-Session-Id') or request.args.get('session_id')),
         "session_id": request.headers.get('X-Session-Id') or request.args.get('session_id')
     })
 
 @app.route('/game_state')
+@with_game_snapshot
 def game_state():
     """Get the current game state"""
-    global spotit_game, cards, cards_pile, scores, game_started, game_finished, winner, restart_votes, restart_requesters, restart_initiator, restart_in_progress, restart_cooldown_until, restart_initiator_clear_time
+    # Players of a finished room whose table went to the next room go back to the lobby
+    sid = request.headers.get('X-Session-Id') or request.args.get('session_id')
+    if sid and session_room_closed(sid):
+        return jsonify({'room_closed': True, 'redirect': url_for('login')})
     
     # Get player ID from session
     player_id = get_player_id_from_session()
     
     # Ensure game state is initialized
     if spotit_game is None and game_started:
-        cards, cards_pile, scores = new_game_state()
+        deal_missing_game()
     
     # Get current player and center emojis
     player_emojis = None
@@ -914,16 +1342,11 @@ def game_state():
         try:
             player_emojis, center_emojis = get_player_center_emojis(player_id)
         except Exception as e:
-            print(f"Error getting emojis: {e}")
+            log.error("Error getting emojis: %s", e)
             # Provide fallback emojis
             player_emojis = [{"emoji": "⚠️", "index": 0, "size": 60, "rotation": 0}]
             center_emojis = [{"emoji": "⚠️", "index": 0, "size": 60, "rotation": 0}]
     
-    # Check if we need to clear the restart initiator
-    if restart_initiator_clear_time and time.time() > restart_initiator_clear_time:
-        restart_initiator = None
-        restart_initiator_clear_time = None
-    
     # Calculate cooldown remaining (if any)
     cooldown_remaining = max(0, int(restart_cooldown_until - time.time())) if restart_cooldown_until else 0
     
@@ -931,13 +1354,12 @@ def game_state():
     response = {
         'game_started': game_started,
         'game_finished': game_finished,
-        'player_emojis': player_emojis,
-        'center_emojis': center_emojis,
-        'names': list(players.keys()),
+        **card_payload(player_emojis, center_emojis),
+        'names': player_names,
         'scores': spotit_game.scores if spotit_game else [0] * len(players),
         'restart_votes': list(restart_votes),
         'restart_requesters': list(restart_requesters),
-        'restart_initiator': restart_initiator,
+        'restart_initiator': None if restart_initiator_expired() else restart_initiator,
         'restart_started': restart_in_progress,
         'total_players': len(players),
         'cooldown_remaining': cooldown_remaining
@@ -949,20 +1371,116 @@ def game_state():
     
     return jsonify(response)
 
-@app.route('/game_history')
-def get_game_history():
-    """Get the full game history"""
+@with_game_lock
+def deal_missing_game():
+    """Deal the cards of a started game whose snapshot had none, for every worker."""
+    global cards, cards_pile, scores
+    if spotit_game is None and game_started:
+        cards, cards_pile, scores = new_game_state()
+        publish_shared_state()
+
+def restart_initiator_expired():
+    """True once the initiator of a declined restart is no longer shown (see decline_restart)."""
+    return bool(restart_initiator_clear_time) and time.time() > restart_initiator_clear_time
+
+def wants_compact_cards():
+    """Clients opt in to the compact card format with an X-Card-Format: compact header."""
+    return (request.headers.get('X-Card-Format') == 'compact'
+            and spotit_game is not None and spotit_game.seed is not None)
+
+def card_payload(player_emojis, center_emojis):
+    """Cards for a response: full symbol lists, or card IDs into /deck for compact clients,
+    plus the player's rotation offset and the state_version they belong to."""
+    full = {'player_emojis': player_emojis, 'center_emojis': center_emojis, 'state_version': state_version}
+    if player_emojis is None:
+        return full
+    # Cards are always sent unrotated; the browser turns the player's card by this offset
+    rotation = player_rotation(player_emojis)
+    full['player_rotation'] = rotation
+    if not wants_compact_cards():
+        return full
+    payload = {
+        'deck_id': spotit_game.deck_id,
+        'player_card': spotit_game.card_id(player_emojis),
+        'player_rotation': rotation,
+        'center_card': None,
+        'state_version': state_version,
+    }
+    if isinstance(center_emojis, str):
+        payload['center_emojis'] = center_emojis  # "DONE <winner>"
+    elif center_emojis is not None:
+        payload['center_card'] = spotit_game.card_id(center_emojis)
+        if payload['center_card'] is None:
+            return full
+    if payload['player_card'] is None:
+        return full  # Not a card from this deck (e.g. the error placeholder)
+    return payload
+
+@app.route('/deck')
+@with_game_snapshot
+def deck():
+    """Symbols and unrotated layout of every card in the current deck.
+
+    Compact clients fetch this once per deck_id and cache it; each card is a
+    list of [symbol, size, rotation, index] entries.
+    """
+    if spotit_game is None or spotit_game.seed is None:
+        return jsonify({"error": "No seeded deck in play"}), 404
+    symbols = ALL_EMOJIS[:spotit_game.q**2 + spotit_game.q + 1]
+    symbol_ids = {symbol: i for i, symbol in enumerate(symbols)}
+    base_cards = shuffle_cards(generate_cards(spotit_game.seed, spotit_game.q), spotit_game.seed)
     return jsonify({
-        "history": game_history,
-        "current_state": {
-            "game_started": game_started,
-            "game_finished": game_finished,
-            "winner": winner,
-            "players": players,
-            "scores": spotit_game.scores if spotit_game else None
-        }
+        "deck_id": spotit_game.deck_id,
+        "symbols": symbols,
+        "cards": [[[symbol_ids[e['emoji']], e['size'], e['rotation'], e['index']] for e in card]
+                  for card in base_cards],
     })
 
+@app.route('/game_history')
+def get_game_history():
+    """Get one page of the game history from the backend, after the ?cursor= of the previous page.
+
+    Each event names its type, player and card IDs and the save_seq it was
+    saved with. Every so many events also carry a checkpoint of the scores
+    and piles, so a page can be replayed from its first checkpoint.
+    """
+    cursor = request.args.get('cursor', 0, type=int)
+    limit = request.args.get('limit', 100, type=int)
+    if limit <= 0:
+        return jsonify({"error": "limit must be a positive number"}), 400
+    limit = min(limit, HISTORY_PAGE_LIMIT)
+    try:
+        # Asked outside the game lock: the routes that change the game don't wait for the backend
+        response = backend.call("GetGameHistory", chat_pb2.GameHistoryRequest(game_id=game_id, after=cursor, limit=limit))
+    except grpc.RpcError as e:
+        return jsonify({"error": f"Game history unavailable: {e.details()}"}), 503
+    events = []
+    for entry in response.entries:
+        checkpoint = json.loads(entry.session_data_json) if entry.session_data_json else None
+        event = json.loads(entry.event_json) if entry.event_json else {}
+        if not event and checkpoint:
+            event = checkpoint.get('event') or {}  # Logged by an older server, with the whole state
+        if not event:
+            continue  # Saved without an event, e.g. by an older app
+        event = dict(event, cursor=entry.id, save_seq=entry.seq)
+        if checkpoint:
+            current_state = checkpoint.get('current_state', {})
+            event['checkpoint'] = {"scores": current_state.get('scores'), "cards_pile": current_state.get('cards_pile'),
+                                   "deck": current_state.get('deck')}
+        events.append(event)
+    next_cursor = response.entries[-1].id if len(response.entries) == limit else None
+    return jsonify({"history": events, "next_cursor": next_cursor, "current_state": current_game_summary()})
+
+@with_game_snapshot
+def current_game_summary():
+    return {
+        "game_started": game_started,
+        "game_finished": game_finished,
+        "winner": winner,
+        "players": players,
+        "scores": spotit_game.scores if spotit_game else None
+    }
+
 @app.route('/clear_session')
 def clear_session():
     """Clear the current session (for debugging)"""
@@ -977,8 +1495,11 @@ def health_check():
     return jsonify({"status": "ok"}), 200
 
 ### Leader Election and Frontend Replication
-APP_ELECTION_INTERVAL = 5 # Check peer status every 5 seconds
-APP_PEER_TIMEOUT = 2 # Timeout for health check request
+APP_ELECTION_INTERVAL = 0.2 # Re-evaluate leadership from the failure detectors every 200 ms
+APP_PROBE_INTERVAL = 0.2 # Each peer is probed every 200 ms on its own thread
+APP_PEER_TIMEOUT = 0.5 # Timeout for health check request
+APP_PHI_THRESHOLD = 8.0 # Suspicion level at which a peer is considered down (see failure_detector.py)
+APP_PHI_MIN_STD_DEV = 0.1 # Seconds; probes answered in a few ms would otherwise make any late one suspicious
 
 # Global state for App Leader Election
 APP_ELECTION_STATE = "initializing" # States: initializing, backup, leader
@@ -1004,37 +1525,61 @@ class AppLeaderElection:
         self.peer_configs = [cfg for cfg in all_configs if cfg['id'] != self.app_id]
         self.peer_status = {peer['id']: False for peer in self.peer_configs}
         self.peer_ever_alive = {peer['id']: False for peer in self.peer_configs}
+
+        # Each peer is probed on its own thread over a keep-alive session, feeding
+        # an accrual failure detector; elect() only reads the detectors.
+        self.peer_sessions = {peer['id']: requests.Session() for peer in self.peer_configs}
+        self.peer_detectors = {
+            # A probe may legitimately take up to APP_PEER_TIMEOUT, so one slow or missed
+            # probe (a GC or load pause) must not be enough to start an election
+            peer['id']: PhiAccrualFailureDetector(threshold=APP_PHI_THRESHOLD, first_interval=APP_PROBE_INTERVAL,
+                                                  acceptable_pause=APP_PEER_TIMEOUT, min_std_dev=APP_PHI_MIN_STD_DEV)
+            for peer in self.peer_configs
+        }
+        self.first_probe_done = {peer['id']: threading.Event() for peer in self.peer_configs}
         
         # Store global refs
         this_app_config = next((cfg for cfg in all_configs if cfg['id'] == self.app_id), None)
         all_app_configs = all_configs
 
-    def ping_peer(self, host, port):
+    def ping_peer(self, peer_id, host, port):
         """ Pings another app instance's health endpoint using its host and port. """
         peer_url = f"http://{host}:{port}/healthz"
         try:
-            response = requests.get(peer_url, timeout=APP_PEER_TIMEOUT)
+            response = self.peer_sessions[peer_id].get(peer_url, timeout=APP_PEER_TIMEOUT)
             return response.status_code == 200
-        except requests.exceptions.RequestException as e:
-            # print(f"[App Election] Ping failed for {host}:{port}: {e}") 
+        except requests.exceptions.RequestException:
             return False
 
+    def run_probe_loop(self, peer_cfg):
+        """ Probes one peer forever, recording each answer as a heartbeat. """
+        peer_id = peer_cfg['id']
+        while True:
+            started = time.monotonic()
+            if self.ping_peer(peer_id, peer_cfg['host'], peer_cfg['port']):
+                self.peer_detectors[peer_id].heartbeat()
+            self.first_probe_done[peer_id].set()
+            time.sleep(max(0, APP_PROBE_INTERVAL - (time.monotonic() - started)))
+
     def elect(self):
         """ Performs the leader election logic using hosts and ports. """
         global APP_ELECTION_STATE, APP_LEADER_HOST, APP_LEADER_PORT, AUTO_RELOAD_NEEDED
+        changed = False
         with app_election_lock: # Use the global lock
+            # The detectors only do arithmetic, so reading them under the lock is cheap
+            peer_alive = {peer_id: detector.is_available() for peer_id, detector in self.peer_detectors.items()}
             
             # --- Update Peer Status --- 
             for peer_cfg in self.peer_configs:
                 peer_id = peer_cfg['id']
-                is_alive = self.ping_peer(peer_cfg['host'], peer_cfg['port'])
+                is_alive = peer_alive[peer_id]
                 # Track if peer was ever alive logic (same as before, using peer_id)
                 if is_alive and not self.peer_ever_alive.get(peer_id, False):
                      self.peer_ever_alive[peer_id] = True
                      self.peer_status[peer_id] = True
                 elif self.peer_ever_alive.get(peer_id, False) and not is_alive:
                     if self.peer_status.get(peer_id, False):
-                         print(f"[App Election] Peer app {peer_id} on {peer_cfg['host']}:{peer_cfg['port']} seems down.")
+                         log.warning("[App Election] Peer app %s on %s:%s seems down.", peer_id, peer_cfg['host'], peer_cfg['port'])
                     self.peer_status[peer_id] = False
                 elif not self.peer_ever_alive.get(peer_id, False) and not is_alive:
                      self.peer_status[peer_id] = False
@@ -1050,7 +1595,7 @@ class AppLeaderElection:
             if not alive_ids:
                 # Should not happen ideally, but if it does, assume self is leader
                 current_leader_id = self.app_id
-                print("[App Election] Warning: No live apps detected including self? Defaulting to self as leader.")
+                log.warning("[App Election] No live apps detected including self? Defaulting to self as leader.")
             else:
                 current_leader_id = min(alive_ids)
 
@@ -1059,7 +1604,7 @@ class AppLeaderElection:
 
             if leader_config is None:
                  # This is problematic, means leader ID is invalid or config list is wrong
-                 print(f"[App Election] Error: Could not find config for determined leader ID: {current_leader_id}")
+                 log.error("[App Election] Could not find config for determined leader ID: %s", current_leader_id)
                  # Fallback: Assume self is leader for safety?
                  leader_config = this_app_config
                  current_leader_id = self.app_id
@@ -1070,16 +1615,37 @@ class AppLeaderElection:
             new_leader_port = leader_config['port']
             
             # Update global state if changed
+            if APP_ELECTION_STATE != new_state:
+                ELECTION_TRANSITIONS.inc(state=new_state)
             if APP_ELECTION_STATE != new_state or APP_LEADER_HOST != new_leader_host or APP_LEADER_PORT != new_leader_port:
-                print(f"[App Election] App {self.app_id}: State -> {new_state}, Leader -> ID {current_leader_id} at {new_leader_host}:{new_leader_port}")
+                log.info("[App Election] App %s: State -> %s, Leader -> ID %s at %s:%s",
+                         self.app_id, new_state, current_leader_id, new_leader_host, new_leader_port)
                 APP_ELECTION_STATE = new_state
                 APP_LEADER_HOST = new_leader_host
                 APP_LEADER_PORT = new_leader_port
-                next_leader_config = next((cfg for cfg in self.all_configs if cfg['id'] > current_leader_id), None)
+                # The highest-numbered app has no successor to point players at
+                next_leader_config = next((cfg for cfg in self.all_configs if cfg['id'] > current_leader_id), leader_config)
                 AUTO_RELOAD_NEEDED = [next_leader_config['host'], next_leader_config['port']]
+                changed = True
+
+        # Share the outcome with the other workers outside app_election_lock:
+        # request threads take the shared state lock before app_election_lock.
+        if changed:
+            shared_state.put('election', {
+                'state': new_state,
+                'leader_host': new_leader_host,
+                'leader_port': new_leader_port,
+                'auto_reload': AUTO_RELOAD_NEEDED
+            })
 
     def run_election_loop(self):
         """ Continuously runs the election process. """
+        for peer_cfg in self.peer_configs:
+            threading.Thread(target=self.run_probe_loop, args=(peer_cfg,), daemon=True).start()
+        # Don't elect before every peer had a chance to answer, or a backup would
+        # briefly think it is the leader on startup
+        for probed in self.first_probe_done.values():
+            probed.wait(APP_PEER_TIMEOUT * 2)
         while True:
             self.elect()
             time.sleep(APP_ELECTION_INTERVAL)
@@ -1090,14 +1656,25 @@ def start_app_election(app_id, all_configs):
     election_manager = AppLeaderElection(app_id, all_configs)
     app_election_thread = threading.Thread(target=election_manager.run_election_loop, daemon=True)
     app_election_thread.start()
-    print(f"[App Election] Started election thread for App ID {app_id}")
+    log.info("[App Election] Started election thread for App ID %s", app_id)
+
+def restore_election_state():
+    """Start from the election outcome another worker already published, if any."""
+    global APP_ELECTION_STATE, APP_LEADER_HOST, APP_LEADER_PORT, AUTO_RELOAD_NEEDED
+    _, election = shared_state.get('election')
+    if election:
+        with app_election_lock:
+            APP_ELECTION_STATE = election['state']
+            APP_LEADER_HOST = election['leader_host']
+            APP_LEADER_PORT = election['leader_port']
+            AUTO_RELOAD_NEEDED = election['auto_reload']
 
 # --- Request Hook for Leader Check ---
 @app.before_request
 def check_app_leader_status():
     """ Intercept requests and check if this instance is the leader. """
     # Allow health check requests regardless of leader status
-    if request.path == '/healthz':
+    if request.path in ('/healthz', '/metrics', '/debug/traces', '/debug/profile'):
         return
 
     # Allow static files (CSS, JS) regardless of leader status
@@ -1143,63 +1720,27 @@ def check_app_leader_status():
         # Decide if initializing state should block or show a specific page
         return Response("<html><body><h1>Initializing Leader Election...</h1><p>Please wait.</p></body></html>", status=200, mimetype='text/html')
 
-# --- Check if new leader has been decided, in which case need to initiate reload
-# @app.before_request
-# def check_reload_needed():
-#     global AUTO_RELOAD_NEEDED
-#     if AUTO_RELOAD_NEEDED:
-#         AUTO_RELOAD_NEEDED = False  # reset flag after redirect
-#         print('CURRENT ISD', current_player_sid)
-#         if current_player_sid:
-#             url = f"http://{APP_LEADER_HOST}:{APP_LEADER_PORT}/spot_it_game?session_id={current_player_sid}"
-#         else:
-#             url = f"http://{APP_LEADER_HOST}:{APP_LEADER_PORT}"
-#         return redirect(url, code=302)
-
 @app.context_processor
 def inject_auto_reload_url():
     global AUTO_RELOAD_NEEDED
     sid = request.headers.get('X-Session-Id') or request.args.get('session_id')
     return {'auto_reload_url': F'http://{AUTO_RELOAD_NEEDED[0]}:{AUTO_RELOAD_NEEDED[1]}/spot_it_game?session_id={sid}'}
-    # global AUTO_RELOAD_NEEDED
-    # print('AUTORELOADTYPE', type(AUTO_RELOAD_NEEDED))
-    # if AUTO_RELOAD_NEEDED:
-    #     response = {'auto_reload_url': f'http://{AUTO_RELOAD_NEEDED}:{AUTO_RELOAD_NEEDED}/'}
-    #     print(response)
-    #     # AUTO_RELOAD_NEEDED = False
-    #     return {'auto_reload_url': 'http://127.0.0.1:5002'}
-    # else:
-    #     return {'auto_reload_url': None}
 
 
 # --- gRPC Connection Management ---
-@scheduler.scheduled_job('interval', seconds=10, id='connect_job')
-def connect_to_leader_job():
-    """Scheduled job to check and connect to the backend leader."""
-    with app_election_lock:
-        am_leader = (APP_ELECTION_STATE == 'leader')
-    if not am_leader:
-        # print("[Connect Job] Not the app leader, skipping backend connection attempt.")
-        return # Only the leader app connects to the backend leader
-    connect_to_leader()
-
 def connect_to_leader():
-    global stub, SERVER_HOST, SERVER_PORT, subscription_active
+    """Find the backend leader. The app leader loads state from it, backups
+    stream its committed state so they are warm when promoted."""
+    global SERVER_HOST, SERVER_PORT, subscription_active
 
     with app_election_lock:
-        if APP_ELECTION_STATE != 'leader':
-            # print("[Connect] Not leader, skipping connection.")
-            return # Ensure only leader connects
+        am_leader = (APP_ELECTION_STATE == 'leader')
 
-    # Rest of connect_to_leader logic...
     noleader = True
     for server in all_host_port_pairs:
-        print(f"Trying to connect to {server}")
-        print(f"All servers: {all_host_port_pairs}")
+        log.debug("Trying to connect to %s (all servers: %s)", server, all_host_port_pairs)
         try:
-            temp_channel = grpc.insecure_channel(server)
-            temp_stub = chat_pb2_grpc.ChatServiceStub(temp_channel)
-            response = temp_stub.GetLeaderInfo(chat_pb2.GetLeaderInfoRequest())
+            response = call_once(server, "GetLeaderInfo", chat_pb2.GetLeaderInfoRequest())
             leader_host, leader_port = response.info.split(':')
             noleader = False
 
@@ -1207,87 +1748,246 @@ def connect_to_leader():
             if SERVER_HOST != leader_host or SERVER_PORT != leader_port:
                 SERVER_HOST = leader_host
                 SERVER_PORT = leader_port
-                print('NEW LEADER:', SERVER_HOST, SERVER_PORT)
-                channel = grpc.insecure_channel(f"{SERVER_HOST}:{SERVER_PORT}")
-                stub = chat_pb2_grpc.ChatServiceStub(channel)
-                load_game_state_from_server() # Load state from the new leader
+                log.info("New backend leader: %s:%s", SERVER_HOST, SERVER_PORT)
+                backend.connect(f"{SERVER_HOST}:{SERVER_PORT}")
+                shared_state.put('backend', {'host': SERVER_HOST, 'port': SERVER_PORT}) # For the other workers
+                if am_leader and save_pending:
+                    flush_pending_save() # The new leader gets the state the old one missed
+                elif am_leader:
+                    load_game_state_from_server() # Load state from the new leader
+                else:
+                    subscribe_to_updates(SERVER_HOST, SERVER_PORT)
+            elif am_leader and not initial_state_loaded:
+                load_game_state_from_server() # Promoted before any state arrived
+            elif not am_leader and not subscription_active:
+                subscribe_to_updates(SERVER_HOST, SERVER_PORT) # Stream dropped, resubscribe
             break
         except grpc.RpcError as e:
-            print(f"Failed to connect to {server}: {e.details()}")
+            log.warning("Failed to connect to %s: %s", server, e.details())
             continue  # Try next server
     
     return noleader
 
 def check_version_number():
     global initial_state_loaded
-    print("[State] Attempting to check version number and load initial state...")
+    log.info("[State] Attempting to check version number and load initial state...")
     with app_election_lock:
         if APP_ELECTION_STATE != 'leader':
-            print("[State] Not leader, skipping version check and initial load.")
+            log.info("[State] Not leader, skipping version check and initial load.")
             return # Only leader performs initial check/load
 
 # --- Game State Synchronization ---
-def save_game_state(event_type="unknown", event_data=None):
-    with app_election_lock:
-        if APP_ELECTION_STATE != 'leader':
-            # print("[SaveState] Not leader, skipping save.")
-            return # Only leader saves state
+def deck_snapshot():
+    """The deal as seed plus card IDs per pile; the layout is rebuilt on load.
 
-    serial_pile = {k: list(v) if hasattr(v, '__iter__') else v for k,v in cards_pile.items()} if cards_pile else None
-    event = {
-        "timestamp": datetime.now().isoformat(),
-        "event_type": event_type,
-        "expected_players": expected_players,
-        "game_started": game_started,
-        "game_finished": game_finished,
-        "winner": winner,
-        "players": players.copy(),
-        "scores": spotit_game.scores.copy() if spotit_game and spotit_game.scores else None,
-        "cards_pile": serial_pile,
-        "last_clicked_player_emoji": last_clicked_player_emoji,
-        "last_clicked_center_emoji": last_clicked_center_emoji
+    Games loaded from a legacy snapshot have no seed and keep the full deck."""
+    if spotit_game is None:
+        return {"cards_pile": None}
+    if spotit_game.seed is None:
+        return {
+            "cards_pile": {k: list(v) for k, v in spotit_game.cards_pile.items()},
+            "full_card_deck": spotit_game.cards,
+        }
+    return {
+        "deck": {"seed": spotit_game.seed, "q": spotit_game.q},
+        "cards_pile": spotit_game.pile_ids(),
     }
-    
-    if event_data:
-        event.update(event_data)
-    
-    # Add the event to the history
-    game_history.append(event)
-    
-    # Build full session snapshot for failover
-    session_data = {
-        "server_start_time": game_history[0]["timestamp"] if game_history else datetime.now().isoformat(),
+
+def build_session_data():
+    """Build the full session snapshot used for failover and by the other workers."""
+    return {
+        "game_id": game_id,
+        "save_seq": save_seq,
+        "server_start_time": game_start_time,
+        "event": last_event,
         "last_update_time": datetime.now().isoformat(),
         "expected_players": expected_players,
+        "room_id": room_id,
         "player_sessions": player_sessions,
         "current_state": {
             "game_started": game_started,
             "game_finished": game_finished,
             "winner": winner,
+            "finished_at": game_finished_at,
             "players": players,
             "scores": spotit_game.scores if spotit_game else None,
-            "cards_pile": {k: list(v) for k,v in cards_pile.items()} if cards_pile else None,
-            "full_card_deck": spotit_game.cards if spotit_game else None,
+            **deck_snapshot(),
+            "state_version": state_version,
             "last_clicked_player_emoji": last_clicked_player_emoji,
             "last_clicked_center_emoji": last_clicked_center_emoji
         },
+        "lobby": lobby.to_dict(sealed_only=True),
+        "restart_state": {
+            "votes": list(restart_votes),
+            "requesters": list(restart_requesters),
+            "initiator": restart_initiator,
+            "initiator_clear_time": restart_initiator_clear_time,
+            "in_progress": restart_in_progress,
+            "cooldown_until": restart_cooldown_until,
+            "next_seed": restart_next_seed
+        },
     }
 
-    response = stub.SaveGameState(chat_pb2.SaveGameStateRequest(session_data_json = json.dumps(session_data)))
-    if response.success:
-        print(response.success, 'saved game state')
-    else:
-        print(response.success, 'failed to save game state')
+def history_event(event_type, player_id=None, event_data=None):
+    """The compact event a save is made for, sent with its snapshot.
+
+    An event only names the player and the IDs of the cards involved; the
+    snapshot it travels with has the scores and piles, so the backend's copy
+    of each save can be read on its own.
+    """
+    event = {"timestamp": datetime.now().isoformat(), "event_type": event_type}
+    if player_id is not None:
+        event["player"] = player_id
+        if spotit_game and spotit_game.cards_pile.get(player_id):
+            center = spotit_game.cards_pile['center']
+            event["cards"] = [spotit_game.card_id(spotit_game.cards_pile[player_id][-1]),
+                              spotit_game.card_id(center[0]) if center else None]
+    if event_data:
+        event.update(event_data)
+    return event
+
+def save_game_state(event_type="unknown", event_data=None, player_id=None):
+    global save_seq, last_event
+    with app_election_lock:
+        if APP_ELECTION_STATE != 'leader':
+            return # Only leader saves state
+
+    with tracer.start_span("save_game_state", attributes={"event_type": event_type}):
+        last_event = history_event(event_type, player_id, event_data)
+        
+        # Build full session snapshot for failover
+        save_seq = max(save_seq, backend_seq) + 1
+        with tracer.start_span("build_session_data"):
+            session_data = build_session_data()
+            publish_shared_state(session_data)
+        with tracer.start_span("json.dumps") as span:
+            session_data_json = json.dumps(session_data)
+            span.set_attribute("bytes", len(session_data_json))
+        SNAPSHOT_BYTES.observe(len(session_data_json))
+
+        queue_snapshot(session_data_json, event_type)
+
+def queue_snapshot(session_data_json, event_type):
+    """Queue the snapshot numbered save_seq for the backend (game lock held). Outside
+    with_game_lock it is sent right away, otherwise when the wrapper returns."""
+    request = chat_pb2.SaveGameStateRequest(session_data_json=session_data_json, game_id=game_id, seq=save_seq,
+                                            request_id=uuid.uuid4().hex)
+    save_outbox.append((request, event_type))
+    if not getattr(game_lock_depth, 'value', 0):
+        send_queued_saves()
+
+def send_queued_saves():
+    """Send the queued snapshots to the backend leader, oldest first."""
+    with save_send_lock:
+        while save_outbox:
+            send_snapshot(*save_outbox.popleft())
+
+def send_snapshot(request, event_type):
+    """Save a snapshot on the backend leader. A snapshot that can't be saved,
+    e.g. while a new backend leader is elected, is left to flush_pending_save
+    so the route that made the change doesn't fail or wait."""
+    global save_pending, backend_seq
+    seq = request.seq
+    with tracer.start_span("SaveGameState RPC", attributes={"seq": seq}):
+        started = time.perf_counter()
+        try:
+            # Retries resend the same request ID, which the backend acknowledges without writing twice
+            response = backend.call("SaveGameState", request, metadata=tracer.grpc_metadata())
+        except grpc.RpcError as e:
+            SAVE_RPC_SECONDS.observe(time.perf_counter() - started, result="error")
+            save_pending = True
+            log.warning("Failed to save game state (%s), will retry: %s", event_type, e.details())
+            return False
+        SAVE_RPC_SECONDS.observe(time.perf_counter() - started, result="ok" if response.success else "refused")
+    if not response.success and response.committed_seq >= seq:
+        # Another writer got a newer save in first; save again after it
+        backend_seq = max(backend_seq, response.committed_seq)
+        save_pending = True
+        log.warning("Save %s (%s) refused, the backend has save %s", seq, event_type, response.committed_seq)
+        return False
+    if not response.success:
+        backend.breaker.record_failure()  # Refused: the server lost its lease, an election is under way
+        save_pending = True
+        log.warning("Failed to save game state (%s), will retry: %s", event_type, response.error_message)
+        return False
+    if save_pending and event_type == "pending":
+        log.info("Saved the state held back while the backend was unavailable")
+    save_pending = False
+    log.debug("Saved game state %s (%s)%s", seq, event_type, ", already stored" if response.duplicate else "")
+    return True
+
+@scheduler.scheduled_job('interval', seconds=SAVE_RETRY_INTERVAL, id='flush_save_job')
+def flush_save_job():
+    if not save_pending:
+        return
+    if backend.breaker.state != "closed" and runs_app_services:
+        connect_to_leader()  # Look for a newly elected leader now rather than at the next connect_job
+    if save_pending:
+        flush_pending_save()
+
+@with_game_lock
+def flush_pending_save():
+    """Send the current state if a save failed. Saves are whole snapshots, so
+    the writes queued while the backend was unreachable collapse into one."""
+    global save_seq
+    if not save_pending:
+        return
+    with app_election_lock:
+        if APP_ELECTION_STATE != 'leader':
+            return
+    save_seq = max(save_seq, backend_seq) + 1
+    session_data = build_session_data()
+    publish_shared_state(session_data)
+    queue_snapshot(json.dumps(session_data), "pending")
 
 def subscribe_to_updates(host, port):
+    """Stream committed game state from the backend leader while this app is a backup."""
     global subscription_thread, subscription_call, subscription_active
 
     with app_election_lock:
-        if APP_ELECTION_STATE != 'leader':
-            print("[Subscribe] Not leader, skipping subscription.")
-            return # Only leader subscribes
-    
-    # Existing logic...
+        if APP_ELECTION_STATE == 'leader':
+            log.debug("[Subscribe] Leader, skipping subscription.")
+            return # The leader writes the state, only backups follow it
+
+    if subscription_call is not None:
+        subscription_call.cancel() # Drop the stream from the previous backend leader
+    watch_stub = chat_pb2_grpc.ChatServiceStub(grpc.insecure_channel(f"{host}:{port}"))
+    subscription_call = watch_stub.WatchGameState(chat_pb2.WatchGameStateRequest())
+    subscription_active = True
+    subscription_thread = threading.Thread(target=consume_state_updates, args=(subscription_call,), daemon=True)
+    subscription_thread.start()
+    log.info("[Subscribe] Following committed game state from %s:%s", host, port)
+
+def consume_state_updates(call):
+    """Apply streamed states to the warm game until promoted or the stream ends."""
+    global subscription_active
+    try:
+        for update in call:
+            if not apply_streamed_state(update.session_data_json):
+                # Promoted: from now on this app's own state is authoritative
+                call.cancel()
+                break
+    except grpc.RpcError as e:
+        if e.code() != grpc.StatusCode.CANCELLED:
+            log.warning("[Subscribe] State stream ended: %s", e.details())
+    finally:
+        if call is subscription_call:
+            subscription_active = False
+
+@with_game_lock
+def apply_streamed_state(session_data_json):
+    """Replace the warm game with a state the backend leader committed.
+
+    Returns False without applying it once this app has been promoted.
+    """
+    global initial_state_loaded
+    with app_election_lock:
+        if APP_ELECTION_STATE == 'leader':
+            return False
+    apply_session_data(json.loads(session_data_json), start_missing_game=False)
+    publish_shared_state()
+    initial_state_loaded = True
+    return True
 
 @app.route('/click/<card_index>/<emoji_index>')
 def click(card_index, emoji_index):
@@ -1305,43 +2005,174 @@ def reset_game():
 
     # Existing logic...
 
+def start_app_services(app_id):
+    """Start the app's background work: election, backend connection and state load."""
+    global runs_app_services
+    runs_app_services = True
+    restore_election_state()
+    # --- App Election Setup ---
+    start_app_election(app_id, all_app_configs)
+    # --- End App Election Setup ---
+
+    start_connect_to_leader_scheduler()
+    check_version_number()
+    # Initialize the first game state entry
+    # save_game_state(event_type="server_start") 
+
+# -------------------------
+# Gunicorn workers: the app services run in one worker per app, the one that
+# holds an flock on a file next to the shared state. The OS releases the lock
+# when that worker exits, and another worker takes the services over. The
+# other workers follow the election outcome and the backend leader through
+# the shared state, and send (and retry) their own saves.
+# -------------------------
+runs_app_services = False # This process runs the election and follows the backend leader
+services_lock_file = None # Open for as long as this worker lives: closing it would release the lock
+
+def try_lock_services(lock_file):
+    """Take the app services lock without waiting; True if this worker now holds it."""
+    import fcntl
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+def start_worker_services(app_id, lock_path):
+    """Start a forked gunicorn worker's background work (post_worker_init)."""
+    global services_lock_file
+    scheduler.start() # Jobs this worker's requests schedule, and retries of its failed saves
+    services_lock_file = open(lock_path, 'a')
+    if try_lock_services(services_lock_file):
+        start_app_services(app_id)
+    else:
+        threading.Thread(target=follow_app_services, args=(app_id, services_lock_file), daemon=True).start()
+
+def follow_app_services(app_id, lock_file):
+    """Take the election outcome and backend leader from the worker running the app
+    services, until that worker exits and this one takes the services over."""
+    global SERVER_HOST, SERVER_PORT, initial_state_loaded
+    backend_version = 0
+    while not try_lock_services(lock_file):
+        restore_election_state()
+        if shared_state.version('backend') != backend_version:
+            backend_version, leader = shared_state.get('backend')
+            SERVER_HOST, SERVER_PORT = leader['host'], leader['port']
+            backend.connect(f"{SERVER_HOST}:{SERVER_PORT}")
+        time.sleep(APP_ELECTION_INTERVAL)
+    log.info("Worker %s takes over the app services", os.getpid())
+    initial_state_loaded = shared_state.version('session') > 0 # Don't reload what the workers already share
+    start_app_services(app_id)
+
+def run_production_server(app_id, host, port, workers, threads, lock_path):
+    """Serve the app with gunicorn: several worker processes, each with a thread pool.
+
+    Threads don't survive fork(), so the background work starts in each worker
+    once it has been forked (post_worker_init), see start_worker_services.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class SpotItApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{host}:{port}")
+            self.cfg.set('workers', workers)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('threads', threads)
+            self.cfg.set('post_worker_init', lambda worker: start_worker_services(app_id, lock_path))
+
+        def load(self):
+            return app
+
+    SpotItApplication().run()
+
 if __name__ == '__main__':
     # Command line argument for number of players
     parser = argparse.ArgumentParser(description='Spot It Game Server')
     parser.add_argument('--players', type=int, default=3, help='Number of players expected to join')
-    parser.add_argument("--all_apps_ip", type=str, required=True,
-                        help="Comma-separated list of app IP addresses (order: app1,app2,app3)")
+    parser.add_argument("--all_apps_ip", type=str, default=None,
+                        help="Comma-separated list of app IP addresses (order: app1,app2,...); app i listens on port 5000+i")
     parser.add_argument("--app_id", type=int, required=True, help="Unique ID for this Flask app instance (e.g., 1)")
-    parser.add_argument("--all_ips", type=str, required=True,
-                       help="Comma-separated list of external IP addresses for all servers (order: server1,server2,server3)")
+    parser.add_argument("--all_ips", type=str, default=None,
+                       help="Comma-separated list of external IP addresses for all servers (order: server1,server2,...)")
+    parser.add_argument("--cluster", type=str, default=None,
+                        help="Cluster topology JSON file with every server and app (overrides --all_ips/--all_apps_ip)")
+    parser.add_argument("--secret_key", type=str, default=None,
+                        help="Secret key shared by all apps in the cluster for cookies and session tokens (or SPOTIT_SECRET_KEY)")
+    parser.add_argument("--production", action="store_true",
+                        help="Serve with gunicorn worker processes instead of the Flask debug server")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes in production mode")
+    parser.add_argument("--threads", type=int, default=8, help="Request threads per worker in production mode")
+    parser.add_argument("--state_backend", choices=["memory", "sqlite"], default=None,
+                        help="Where workers share game state (default: sqlite in production, memory otherwise)")
+    parser.add_argument("--state_path", type=str, default=None,
+                        help="SQLite file for shared state (default: app_state_<app_id>.db)")
+    parser.add_argument("--election_interval", type=float, default=APP_ELECTION_INTERVAL,
+                        help="Seconds between leadership re-evaluations")
+    parser.add_argument("--probe_interval", type=float, default=APP_PROBE_INTERVAL,
+                        help="Seconds between health probes of each peer app")
+    parser.add_argument("--log_level", type=str, default="INFO", help="DEBUG, INFO, WARNING or ERROR")
+    parser.add_argument("--trace_sample_rate", type=float, default=0.0,
+                        help="Fraction of requests traced through to the backend (see /debug/traces)")
+    parser.add_argument("--trace_file", type=str, default=None, help="Also append spans to this JSONL file")
+    parser.add_argument("--admin_token", type=str, default=None,
+                        help="Token that enables /debug/profile, sent in X-Admin-Token (or SPOTIT_ADMIN_TOKEN)")
+    parser.add_argument("--card_format", choices=["compact", "full"], default="compact",
+                        help="compact: the game page fetches the deck once and gets card IDs; full: every symbol each time")
+    parser.add_argument("--match_mode", choices=["optimistic", "clicks"], default="optimistic",
+                        help="optimistic: the game page judges a match itself and sends one claim; "
+                             "clicks: each click waits for /clickedPlayer or /clickedCenter")
     args = parser.parse_args()
-    all_ips = args.all_ips.split(",")
-    all_host_port_pairs = [f"{all_ips[i]}:{ports[i+1]}" for i in range(len(all_ips))]
-    flask_ports = {1: 5001, 2: 5002, 3: 5003}
-    all_app_configs = [
-        {'id': 1, 'host': args.all_apps_ip.split(",")[0], 'port': flask_ports[1]},
-        {'id': 2, 'host': args.all_apps_ip.split(",")[1], 'port': flask_ports[2]},
-        {'id': 3, 'host': args.all_apps_ip.split(",")[2], 'port': flask_ports[3]},
-    ]
+    configure_logging(args.log_level)
+    if args.log_level.upper() != "DEBUG":
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)  # One line per request otherwise
+    tracer.sample_rate = args.trace_sample_rate
+    if args.trace_file:
+        tracer.exporters.append(JsonlExporter(args.trace_file))
+    if args.admin_token:
+        ADMIN_TOKEN = args.admin_token
+    CLIENT_CONFIG["compact"] = args.card_format == "compact"
+    CLIENT_CONFIG["optimistic"] = args.match_mode == "optimistic"
+    APP_ELECTION_INTERVAL = args.election_interval
+    APP_PROBE_INTERVAL = args.probe_interval
+    if args.cluster:
+        cluster = load_cluster_config(args.cluster)
+    elif args.all_ips and args.all_apps_ip:
+        cluster = cluster_from_ips(args.all_ips, args.all_apps_ip)
+    else:
+        parser.error("either --cluster or both --all_ips and --all_apps_ip are required")
+    all_host_port_pairs = cluster.backend_addresses()
+    all_app_configs = cluster.apps
     expected_players = args.players
-    print(f"Starting Spot It game server with {expected_players} expected players")
+    lobby.room_size = expected_players
+    log.info("Starting Spot It game server with %s expected players", expected_players)
 
-    # --- App Election Setup ---
-    start_app_election(args.app_id, all_app_configs)
-    # --- End App Election Setup ---
+    if args.secret_key:
+        configure_secret_key(args.secret_key)
+    elif not os.environ.get('SPOTIT_SECRET_KEY'):
+        log.warning("No --secret_key/SPOTIT_SECRET_KEY, sessions won't survive a failover to another app")
 
-    start_connect_to_leader_scheduler()
-    check_version_number()
-    # Initialize the first game state entry
-    # save_game_state(event_type="server_start") 
+    state_backend = args.state_backend or ("sqlite" if args.production else "memory")
+    if args.production and args.workers > 1 and state_backend == "memory":
+        log.error("--state_backend memory cannot be shared by several workers, use sqlite")
+        sys.exit(1)
+    state_path = args.state_path or f"app_state_{args.app_id}.db"
+    shared_state = create_shared_state(state_backend, state_path)
 
     # Determine the host and port for this specific instance
     current_config = next((cfg for cfg in all_app_configs if cfg['id'] == args.app_id), None)
     if not current_config:
-        print(f"Error: Could not find configuration for app_id {args.app_id} in --all_apps_ip")
+        log.error("Could not find configuration for app_id %s in --all_apps_ip", args.app_id)
         sys.exit(1)
 
-    print(f"Starting Flask app on {current_config['host']}:{current_config['port']} with App ID {args.app_id}")
+    log.info("Starting Flask app on %s:%s with App ID %s", current_config['host'], current_config['port'], args.app_id)
     # Use 0.0.0.0 to bind to all interfaces if needed, but use specific host from config if provided
     run_host = '0.0.0.0' # Or current_config['host'] if you only want it accessible via that specific IP
-    app.run(host=run_host, port=current_config['port'], debug=True)
+    if args.production:
+        log.info("Production mode: %s workers x %s threads, shared state in %s", args.workers, args.threads, state_backend)
+        lobby_waiters = threading.BoundedSemaphore(max(1, args.threads // 2))
+        run_production_server(args.app_id, run_host, current_config['port'], args.workers, args.threads,
+                              state_path + ".lock")
+    else:
+        start_app_services(args.app_id)
+        app.run(host=run_host, port=current_config['port'], debug=True, threaded=True)
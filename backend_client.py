@@ -0,0 +1,166 @@
+import random
+import threading
+import time
+
+import grpc
+import chat_pb2_grpc
+from logs import get_logger
+
+log = get_logger("backend_client")
+
+# Seconds one attempt of each RPC may take before it is abandoned
+DEADLINES = {
+    "SaveGameState": 2.0,
+    "LoadGameState": 3.0,
+    "GetGameHistory": 3.0,
+    "CheckVersion": 1.0,
+    "GetLeaderInfo": 0.5,
+}
+DEFAULT_DEADLINE = 2.0
+# Failures that say nothing about the request itself, so trying again may work
+RETRYABLE_CODES = (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED)
+
+class CircuitOpenError(grpc.RpcError):
+    """Raised instead of calling a backend that has been failing. It is a
+    grpc.RpcError, so callers handle it wherever they handle failed calls."""
+    def __init__(self, address, retry_in):
+        super().__init__()
+        self.address = address
+        self.retry_in = retry_in
+
+    def code(self):
+        return grpc.StatusCode.UNAVAILABLE
+
+    def details(self):
+        if self.address is None:
+            return "Not connected to a backend leader"
+        return f"Circuit to {self.address} is open, next attempt in {self.retry_in:.1f} s"
+
+    def __str__(self):
+        return self.details()
+
+# -------------------------
+# CircuitBreaker: after `failure_threshold` failed attempts in a row the
+# circuit opens and calls fail at once instead of each waiting out a
+# deadline, which is what a backend leader that just died looks like until
+# a new one is elected. After `reset_timeout` seconds one trial call is let
+# through (half open); it closes the circuit again or reopens it.
+# -------------------------
+class CircuitBreaker:
+    def __init__(self, failure_threshold=3, reset_timeout=1.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None  # time.monotonic() the circuit opened, None while closed
+        self.trial_running = False
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self):
+        """Seconds until a call may be made, 0 if it may be made now (and is then the trial call)."""
+        with self.lock:
+            if self.opened_at is None:
+                return 0
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self.trial_running:
+                return max(remaining, 0.001)
+            self.trial_running = True
+            return 0
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    log.warning("Backend circuit opened after %s failures", self.failures)
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def reset(self):
+        self.record_success()
+
+# -------------------------
+# BackendClient: the app's connection to the backend leader. Every call has
+# a deadline. Idempotent calls are retried after UNAVAILABLE or
+# DEADLINE_EXCEEDED, with exponential backoff and full jitter so apps don't
+# retry in step. All calls go through one circuit breaker, which connect()
+# resets because a new leader deserves a fresh start.
+# -------------------------
+class BackendClient:
+    def __init__(self, retries=2, backoff=0.05, max_backoff=0.5, breaker=None, deadlines=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.deadlines = dict(DEADLINES, **(deadlines or {}))
+        self.lock = threading.Lock()
+        self.address = None
+        self.channel = None
+        self.stub = None
+
+    def connect(self, address):
+        """Point the client at the backend leader at address ("host:port")."""
+        channel = grpc.insecure_channel(address)
+        with self.lock:
+            old, self.channel = self.channel, channel
+            self.address = address
+            self.stub = chat_pb2_grpc.ChatServiceStub(channel)
+        if old is not None:
+            old.close()
+        self.breaker.reset()
+
+    @property
+    def connected(self):
+        return self.stub is not None
+
+    def deadline(self, method):
+        return self.deadlines.get(method, DEFAULT_DEADLINE)
+
+    def call(self, method, request, idempotent=True, metadata=None):
+        """Call method on the leader; raises grpc.RpcError (CircuitOpenError while the circuit is open)."""
+        attempt = 0
+        while True:
+            with self.lock:
+                stub, address = self.stub, self.address
+            if stub is None:
+                raise CircuitOpenError(None, 0)
+            wait = self.breaker.allow()
+            if wait:
+                raise CircuitOpenError(address, wait)
+            try:
+                response = getattr(stub, method)(request, timeout=self.deadline(method), metadata=metadata)
+            except grpc.RpcError as e:
+                if e.code() not in RETRYABLE_CODES:
+                    self.breaker.record_success()  # The backend answered, it just said no
+                    raise
+                self.breaker.record_failure()
+                if not idempotent or attempt >= self.retries:
+                    raise
+                attempt += 1
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                log.debug("%s to %s failed (%s), retry %s in %.3f s", method, address, e.code(), attempt, delay)
+                time.sleep(delay)
+                continue
+            except Exception:
+                self.breaker.record_failure()  # Else a failed trial call would keep the circuit half open for good
+                raise
+            self.breaker.record_success()
+            return response
+
+def call_once(address, method, request, timeout=None):
+    """One call to the server at address on a throwaway channel, e.g. to ask any server who leads."""
+    with grpc.insecure_channel(address) as channel:
+        stub = chat_pb2_grpc.ChatServiceStub(channel)
+        return getattr(stub, method)(request, timeout=timeout or DEADLINES.get(method, DEFAULT_DEADLINE))
@@ -0,0 +1,177 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import timeit
+from datetime import datetime
+
+from spotit_game_logic import SpotItGame, generate_cards, _deck_layout
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_THRESHOLD = 0.25  # Fail when a benchmark is more than 25% slower than its baseline
+SEED = 12345
+PLAYERS = ["alice", "bob"]
+
+# -------------------------
+# Benchmarks: each one is a setup function returning the callable to time,
+# so setup cost stays out of the measurement. They run on fixed seeds and
+# names so every run times exactly the same work.
+# -------------------------
+def bench_generate_cards_cold():
+    # Building the projective plane from scratch, as on the first deal of a new seed
+    def run():
+        _deck_layout.cache_clear()
+        generate_cards(SEED)
+    return run
+
+def bench_generate_cards_cached():
+    # Copying a cached layout, as on every load of a game already seen
+    generate_cards(SEED)
+    return lambda: generate_cards(SEED)
+
+def bench_game_init():
+    generate_cards(SEED)
+    return lambda: SpotItGame(PLAYERS, seed=SEED)
+
+def bench_update_cards():
+    game = SpotItGame(PLAYERS, seed=SEED)
+    def run():
+        game.update_cards(0)
+        # Put the card back so the center pile never runs out
+        game.cards_pile['center'].appendleft(game.cards_pile[0].pop())
+    return run
+
+def bench_get_player_center_emojis():
+    game = SpotItGame(PLAYERS, seed=SEED)
+    return lambda: game.get_player_center_emojis(0)
+
+def seat_benchmark_game():
+    """Put app.py's globals in the state of a two-player game in progress."""
+    import app
+    from lobby import Lobby
+    app.lobby = Lobby(len(PLAYERS))
+    app.expected_players = len(PLAYERS)
+    app.players.clear()
+    app.player_sessions.clear()
+    for player_id, username in enumerate(PLAYERS):
+        session_id = f"session-{username}"
+        app.players[username] = {"status": "active", "joined_at": "2024-01-01T00:00:00", "session_id": session_id}
+        app.player_sessions[session_id] = username
+    app.rebuild_player_indexes()
+    app.game_started = True
+    app.game_finished = False
+    app.spotit_game = SpotItGame(list(app.player_names), seed=SEED)
+    app.cards, app.cards_pile, app.scores = app.spotit_game.cards, app.spotit_game.cards_pile, app.spotit_game.scores
+    for _ in range(10):
+        app.update_cards(0)
+    return app
+
+def bench_build_session_data():
+    # The snapshot save_game_state builds on every event
+    app = seat_benchmark_game()
+    return app.build_session_data
+
+def bench_session_json_dumps():
+    app = seat_benchmark_game()
+    session_data = app.build_session_data()
+    return lambda: json.dumps(session_data)
+
+def bench_load_session():
+    # What load_game_state_from_server does with the leader's reply
+    app = seat_benchmark_game()
+    session_data_json = json.dumps(app.build_session_data())
+    return lambda: app.apply_session_data(json.loads(session_data_json))
+
+BENCHMARKS = {
+    "generate_cards_cold": bench_generate_cards_cold,
+    "generate_cards_cached": bench_generate_cards_cached,
+    "game_init": bench_game_init,
+    "update_cards": bench_update_cards,
+    "get_player_center_emojis": bench_get_player_center_emojis,
+    "build_session_data": bench_build_session_data,
+    "session_json_dumps": bench_session_json_dumps,
+    "load_session": bench_load_session,
+}
+
+def measure(setup, repeat=5, min_time=0.2):
+    """Seconds per call: the best of repeat rounds, each long enough to time reliably."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        func = setup()
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        number = max(1, int(number * min_time / 0.2))
+        return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def run_benchmarks(names=None, repeat=5, min_time=0.2):
+    results = {}
+    for name in names or BENCHMARKS:
+        results[name] = measure(BENCHMARKS[name], repeat=repeat, min_time=min_time)
+        print(f"{name:<28}{results[name] * 1e6:>14.2f} us")
+    return results
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Benchmarks more than threshold slower than baseline, as {name: (baseline, current)}.
+    Benchmarks missing from the baseline are not judged."""
+    regressions = {}
+    for name, seconds in results.items():
+        reference = baseline.get(name, {}).get("seconds_per_op")
+        if reference and seconds > reference * (1 + threshold):
+            regressions[name] = (reference, seconds)
+    return regressions
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get("benchmarks", {})
+
+def save_baseline(results, path=BASELINE_PATH):
+    with open(path, "w") as f:
+        json.dump({
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "benchmarks": {name: {"seconds_per_op": seconds} for name, seconds in sorted(results.items())},
+        }, f, indent=2)
+        f.write("\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for game logic and state serialization.")
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--baseline", type=str, default=BASELINE_PATH, help="Baseline file to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown as a fraction of the baseline (0.25 = 25%%)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing rounds per benchmark; the best counts")
+    parser.add_argument("--min_time", type=float, default=0.2, help="Seconds each round should take at least")
+    parser.add_argument("--confirm", type=int, default=2,
+                        help="Re-measure an apparent regression this many times before reporting it")
+    parser.add_argument("--update", action="store_true", help="Record these results as the new baseline")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    results = run_benchmarks(args.names, repeat=args.repeat, min_time=args.min_time)
+    if args.update:
+        baseline = load_baseline(args.baseline)
+        baseline = {name: entry["seconds_per_op"] for name, entry in baseline.items()}
+        baseline.update(results)
+        save_baseline(baseline, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        sys.exit(0)
+
+    baseline = load_baseline(args.baseline)
+    regressions = compare(results, baseline, args.threshold)
+    for _ in range(args.confirm):
+        if not regressions:
+            break
+        # A busy machine slows single rounds down; only a slowdown that persists counts
+        for name in regressions:
+            results[name] = min(results[name], measure(BENCHMARKS[name], repeat=args.repeat, min_time=args.min_time))
+        regressions = compare(results, baseline, args.threshold)
+    for name, (reference, seconds) in regressions.items():
+        print(f"REGRESSION {name}: {seconds * 1e6:.2f} us vs {reference * 1e6:.2f} us baseline "
+              f"({seconds / reference - 1:+.0%})")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,205 @@
+import argparse
+import json
+import statistics
+import threading
+import time
+
+import requests
+
+from loadgen import LatencyRecorder, start_players, print_summary
+from local_cluster import LocalCluster
+
+TARGETS = ("app", "backend", "both")
+MATCH_OUTCOMES = ("claim_accepted", "click_matched")
+
+def parse_schedule(text):
+    """"10:app,30:backend" -> [(10.0, "app"), (30.0, "backend")], sorted by time."""
+    schedule = []
+    for item in text.split(","):
+        at, _, target = item.strip().partition(":")
+        if target not in TARGETS:
+            raise ValueError(f"Unknown kill target {target!r}, expected one of {', '.join(TARGETS)}")
+        schedule.append((float(at), target))
+    return sorted(schedule)
+
+def fetch_scores(app_urls, session_id, timeout=2.0):
+    """{username: score} from the first app that answers for session_id, or None."""
+    for url in app_urls:
+        try:
+            response = requests.get(url + "/game_state", headers={"X-Session-Id": session_id}, timeout=timeout)
+            state = response.json()
+        except (requests.RequestException, ValueError):
+            continue
+        if response.status_code == 200 and "scores" in state:
+            return dict(zip(state["names"], state["scores"]))
+    return None
+
+def count_transitions(players, scores):
+    """Compare the matches each player was told about with the scores the cluster ended with.
+
+    A lost transition was acknowledged to a player but is missing from the
+    final state (it didn't survive the failover). A duplicated one is in the
+    final state without an acknowledgement, e.g. applied twice, or applied by
+    a leader that died before answering.
+    """
+    acknowledged = sum(player.matches for player in players)
+    lost = duplicated = 0
+    for player in players:
+        final = scores.get(player.username, 0)
+        lost += max(0, player.matches - final)
+        duplicated += max(0, final - player.matches)
+    return {"acknowledged": acknowledged, "final": sum(scores.values()), "lost": lost, "duplicated": duplicated}
+
+def kill_leaders(cluster, target, leader_timeout):
+    """Kill the current leader(s) of target and time how long the cluster takes to elect new ones."""
+    kill = {"target": target}
+    kinds = ["backend", "app"] if target == "both" else [target]
+    victims = {}
+    for kind in kinds:
+        victims[kind] = cluster.backend_leader()[0] if kind == "backend" else cluster.app_leader()
+    kill["killed_at"] = time.monotonic()
+    for kind, victim in victims.items():
+        cluster.kill(kind, victim)
+        kill[f"killed_{kind}"] = victim
+    for kind, victim in victims.items():
+        if kind == "backend":
+            leader, _ = cluster.wait_for_backend_leader(leader_timeout, exclude=victim)
+        else:
+            leader = cluster.wait_for_app_leader(leader_timeout, exclude=victim)
+        kill[f"new_{kind}"] = leader
+        kill[f"{kind}_leader_s"] = time.monotonic() - kill["killed_at"] if leader is not None else None
+        print(f"Killed {kind} {victim}; new {kind} leader: {leader} after {kill[f'{kind}_leader_s']} s")
+    return kill
+
+def first_match_after(recorder, since):
+    """Seconds from since to the first match any player had accepted, or None."""
+    with recorder.lock:
+        times = [t for t, outcome in recorder.outcome_events if outcome in MATCH_OUTCOMES and t >= since]
+    return min(times) - since if times else None
+
+def failed_requests_between(recorder, start, end):
+    with recorder.lock:
+        return sum(1 for t, _, ok in recorder.events if not ok and start <= t <= (end or float("inf")))
+
+# -------------------------
+# Chaos run: a loopback cluster under a full room of simulated players, with
+# the backend and/or app leader SIGKILLed at scripted times. Rematches are
+# not voted for, so the scores at the end cover the whole run and can be
+# checked against what players were told.
+# -------------------------
+def run_chaos(schedule, players=2, backends=3, apps=3, duration=None, think_time=2.0, poll_interval=0.5,
+              mode="claim", leader_timeout=30.0, seed=None, server_args=(), app_args=()):
+    cluster = LocalCluster(backends, apps, players, server_args=server_args, app_args=app_args)
+    print(f"Cluster file and logs in {cluster.workdir}")
+    stop_event = threading.Event()
+    simulated = []
+    try:
+        if cluster.start() is None or cluster.wait_for_backend_leader(leader_timeout)[0] is None:
+            raise RuntimeError(f"The cluster didn't elect leaders; see the logs in {cluster.workdir}")
+        app_urls = cluster.app_urls()
+        recorder = LatencyRecorder()
+        simulated = start_players(app_urls, players, recorder, stop_event, think_time=think_time,
+                                  poll_interval=poll_interval, mode=mode, seed=seed, vote_restart=False)
+        start = time.monotonic()
+        kills = []
+        for at, target in schedule:
+            if stop_event.wait(max(0, start + at - time.monotonic())):
+                break
+            kill = kill_leaders(cluster, target, leader_timeout)
+            kill["at_s"] = at
+            kills.append(kill)
+        end = start + (duration if duration is not None else (schedule[-1][0] if schedule else 0) + 15)
+        stop_event.wait(max(0, end - time.monotonic()))
+        stop_event.set()
+        for player in simulated:
+            player.join(timeout=10)
+
+        for kill in kills:
+            kill["first_match_s"] = first_match_after(recorder, kill["killed_at"])
+            recovered = kill["killed_at"] + kill["first_match_s"] if kill["first_match_s"] is not None else None
+            kill["failed_requests"] = failed_requests_between(recorder, kill["killed_at"], recovered)
+            del kill["killed_at"]
+        seated = next((p for p in simulated if p.session_id), None)
+        scores = fetch_scores(app_urls, seated.session_id) if seated else None
+        return {
+            "kills": kills,
+            "transitions": count_transitions(simulated, scores) if scores is not None else None,
+            "load": recorder.summary(),
+        }
+    finally:
+        stop_event.set()
+        cluster.stop()
+
+def print_report(report):
+    for kill in report["kills"]:
+        parts = [f"t={kill['at_s']:.0f}s kill {kill['target']}"]
+        for kind in ("backend", "app"):
+            if f"killed_{kind}" in kill:
+                seconds = kill[f"{kind}_leader_s"]
+                parts.append(f"{kind} {kill[f'killed_{kind}']} -> {kill[f'new_{kind}']} in "
+                             + (f"{seconds:.2f}s" if seconds is not None else "never"))
+        first = kill["first_match_s"]
+        parts.append("first match after " + (f"{first:.2f}s" if first is not None else "never"))
+        parts.append(f"{kill['failed_requests']} failed requests")
+        print("; ".join(parts))
+    transitions = report["transitions"]
+    if transitions is None:
+        print("Final scores unavailable: no app answered at the end of the run")
+    else:
+        print(f"Matches acknowledged {transitions['acknowledged']}, in final state {transitions['final']}: "
+              f"{transitions['lost']} lost, {transitions['duplicated']} duplicated")
+
+def summarize_trials(reports):
+    """Median and worst of each recovery time over several trials."""
+    summary = {}
+    for key in ("backend_leader_s", "app_leader_s", "first_match_s"):
+        values = [kill[key] for report in reports for kill in report["kills"] if kill.get(key) is not None]
+        missing = sum(1 for report in reports for kill in report["kills"] if key in kill and kill[key] is None)
+        if values or missing:
+            summary[key] = {"median": statistics.median(values) if values else None,
+                            "max": max(values) if values else None, "never": missing}
+    summary["lost"] = sum(r["transitions"]["lost"] for r in reports if r["transitions"])
+    summary["duplicated"] = sum(r["transitions"]["duplicated"] for r in reports if r["transitions"])
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kill leaders of a loopback Spot It cluster under load and measure recovery.")
+    parser.add_argument("--schedule", type=str, default="10:app,30:backend",
+                        help="Comma-separated SECONDS:TARGET kills, TARGET one of app, backend, both")
+    parser.add_argument("--duration", type=float, default=None, help="Seconds of load (default: last kill + 15)")
+    parser.add_argument("--players", type=int, default=2, help="Simulated players (one room)")
+    parser.add_argument("--backends", type=int, default=3, help="Number of backend servers")
+    parser.add_argument("--apps", type=int, default=3, help="Number of frontend apps")
+    parser.add_argument("--think_time", type=float, default=2.0, help="Median seconds before claiming a match")
+    parser.add_argument("--mode", choices=["claim", "clicks"], default="claim", help="How players claim matches")
+    parser.add_argument("--trials", type=int, default=1, help="Repeat the run this many times")
+    parser.add_argument("--heartbeat_interval", type=float, default=None, help="Passed to server.py")
+    parser.add_argument("--election_interval", type=float, default=None, help="Passed to app.py")
+    parser.add_argument("--probe_interval", type=float, default=None, help="Passed to app.py")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible think times")
+    parser.add_argument("--json", type=str, default=None, help="Also write the reports to this file")
+    args = parser.parse_args()
+
+    server_args = ["--heartbeat_interval", str(args.heartbeat_interval)] if args.heartbeat_interval else []
+    app_args = []
+    if args.election_interval:
+        app_args += ["--election_interval", str(args.election_interval)]
+    if args.probe_interval:
+        app_args += ["--probe_interval", str(args.probe_interval)]
+
+    reports = []
+    for trial in range(args.trials):
+        print(f"--- Trial {trial + 1}/{args.trials}")
+        report = run_chaos(parse_schedule(args.schedule), players=args.players, backends=args.backends,
+                           apps=args.apps, duration=args.duration, think_time=args.think_time, mode=args.mode,
+                           seed=args.seed, server_args=server_args, app_args=app_args)
+        print_summary(report["load"])
+        print_report(report)
+        reports.append(report)
+    result = {"reports": reports}
+    if args.trials > 1:
+        result["summary"] = summarize_trials(reports)
+        print(json.dumps(result["summary"], indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nchat.proto\"\x16\n\x14GetLeaderInfoRequest\"%\n\x15GetLeaderInfoResponse\x12\x0c\n\x04info\x18\x01 \x01(\t\"1\n\x14SaveGameStateRequest\x12\x19\n\x11session_data_json\x18\x01 \x01(\t\"(\n\x15SaveGameStateResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\"\x16\n\x14LoadGameStateRequest\"Z\n\x15LoadGameStateResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x19\n\x11session_data_json\x18\x02 \x01(\t\x12\x15\n\rerror_message\x18\x03 \x01(\t\"\x07\n\x05\x45mpty\"\x1a\n\x07Version\x12\x0f\n\x07version\x18\x01 \x01(\t\"3\n\x0fVersionResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\":\n\x1dReplicateSaveGameStateRequest\x12\x19\n\x11session_data_json\x18\x01 \x01(\t\"1\n\x1eReplicateSaveGameStateResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\"\r\n\x0bPingRequest\"\x1d\n\x0cPingResponse\x12\r\n\x05\x61live\x18\x01 \x01(\x08\x32\xf9\x01\n\x0b\x43hatService\x12>\n\rGetLeaderInfo\x12\x15.GetLeaderInfoRequest\x1a\x16.GetLeaderInfoResponse\x12>\n\rSaveGameState\x12\x15.SaveGameStateRequest\x1a\x16.SaveGameStateResponse\x12>\n\rLoadGameState\x12\x15.LoadGameStateRequest\x1a\x16.LoadGameStateResponse\x12*\n\x0c\x43heckVersion\x12\x08.Version\x1a\x10.VersionResponse2o\n\x12ReplicationService\x12Y\n\x16ReplicateSaveGameState\x12\x1e.ReplicateSaveGameStateRequest\x1a\x1f.ReplicateSaveGameStateResponse2-\n\x06Health\x12#\n\x04Ping\x12\x0c.PingRequest\x1a\r.PingResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nchat.proto\"\x16\n\x14GetLeaderInfoRequest\"3\n\x15GetLeaderInfoResponse\x12\x0c\n\x04info\x18\x01 \x01(\t\x12\x0c\n\x04term\x18\x02 \x01(\x03\"c\n\x14SaveGameStateRequest\x12\x19\n\x11session_data_json\x18\x01 \x01(\t\x12\x0f\n\x07game_id\x18\x02 \x01(\t\x12\x0b\n\x03seq\x18\x03 \x01(\x03\x12\x12\n\nrequest_id\x18\x04 \x01(\t\"i\n\x15SaveGameStateResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x15\n\rerror_message\x18\x02 \x01(\t\x12\x15\n\rcommitted_seq\x18\x03 \x01(\x03\x12\x11\n\tduplicate\x18\x04 \x01(\x08\"\'\n\x14LoadGameStateRequest\x12\x0f\n\x07game_id\x18\x01 \x01(\t\"x\n\x15LoadGameStateResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x19\n\x11session_data_json\x18\x02 \x01(\t\x12\x15\n\rerror_message\x18\x03 \x01(\t\x12\x0f\n\x07game_id\x18\x04 \x01(\t\x12\x0b\n\x03seq\x18\x05 \x01(\x03\"C\n\x12GameHistoryRequest\x12\x0f\n\x07game_id\x18\x01 \x01(\t\x12\r\n\x05\x61\x66ter\x18\x02 \x01(\x03\x12\r\n\x05limit\x18\x03 \x01(\x05\"n\n\x10GameHistoryEntry\x12\n\n\x02id\x18\x01 \x01(\x03\x12\x0b\n\x03seq\x18\x02 \x01(\x03\x12\x12\n\nwritten_at\x18\x03 \x01(\x01\x12\x19\n\x11session_data_json\x18\x04 \x01(\t\x12\x12\n\nevent_json\x18\x05 \x01(\t\"9\n\x13GameHistoryResponse\x12\"\n\x07\x65ntries\x18\x01 \x03(\x0b\x32\x11.GameHistoryEntry\".\n\x15WatchGameStateRequest\x12\x15\n\rafter_version\x18\x01 \x01(\x03\"=\n\x0fGameStateUpdate\x12\x0f\n\x07version\x18\x01 \x01(\x03\x12\x19\n\x11session_data_json\x18\x02 \x01(\t\"\x07\n\x05\x45mpty\"\x1a\n\x07Version\x12\x0f\n\x07version\x18\x01 \x01(\t\"3\n\x0fVersionResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"\x8d\x01\n\x1dReplicateSaveGameStateRequest\x12\x19\n\x11session_data_json\x18\x01 \x01(\t\x12\x0c\n\x04term\x18\x02 \x01(\x03\x12\x11\n\tleader_id\x18\x03 \x01(\x05\x12\x0f\n\x07game_id\x18\x04 \x01(\t\x12\x0b\n\x03seq\x18\x05 \x01(\x03\x12\x12\n\nrequest_id\x18\x06 \x01(\t\"?\n\x1eReplicateSaveGameStateResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0c\n\x04term\x18\x02 \x01(\x03\".\n\x0bPingRequest\x12\x0c\n\x04term\x18\x01 \x01(\x03\x12\x11\n\tleader_id\x18\x02 \x01(\x05\"B\n\x0cPingResponse\x12\r\n\x05\x61live\x18\x01 \x01(\x08\x12\x0c\n\x04term\x18\x02 \x01(\x03\x12\x15\n\rlease_granted\x18\x03 \x01(\x08\x32\xf4\x02\n\x0b\x43hatService\x12>\n\rGetLeaderInfo\x12\x15.GetLeaderInfoRequest\x1a\x16.GetLeaderInfoResponse\x12>\n\rSaveGameState\x12\x15.SaveGameStateRequest\x1a\x16.SaveGameStateResponse\x12>\n\rLoadGameState\x12\x15.LoadGameStateRequest\x1a\x16.LoadGameStateResponse\x12*\n\x0c\x43heckVersion\x12\x08.Version\x1a\x10.VersionResponse\x12<\n\x0eWatchGameState\x12\x16.WatchGameStateRequest\x1a\x10.GameStateUpdate0\x01\x12;\n\x0eGetGameHistory\x12\x13.GameHistoryRequest\x1a\x14.GameHistoryResponse2o\n\x12ReplicationService\x12Y\n\x16ReplicateSaveGameState\x12\x1e.ReplicateSaveGameStateRequest\x1a\x1f.ReplicateSaveGameStateResponse2-\n\x06Health\x12#\n\x04Ping\x12\x0c.PingRequest\x1a\r.PingResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -34,33 +34,43 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_GETLEADERINFOREQUEST']._serialized_start=14
   _globals['_GETLEADERINFOREQUEST']._serialized_end=36
   _globals['_GETLEADERINFORESPONSE']._serialized_start=38
-  _globals['_GETLEADERINFORESPONSE']._serialized_end=75
-  _globals['_SAVEGAMESTATEREQUEST']._serialized_start=77
-  _globals['_SAVEGAMESTATEREQUEST']._serialized_end=126
-  _globals['_SAVEGAMESTATERESPONSE']._serialized_start=128
-  _globals['_SAVEGAMESTATERESPONSE']._serialized_end=168
-  _globals['_LOADGAMESTATEREQUEST']._serialized_start=170
-  _globals['_LOADGAMESTATEREQUEST']._serialized_end=192
-  _globals['_LOADGAMESTATERESPONSE']._serialized_start=194
-  _globals['_LOADGAMESTATERESPONSE']._serialized_end=284
-  _globals['_EMPTY']._serialized_start=286
-  _globals['_EMPTY']._serialized_end=293
-  _globals['_VERSION']._serialized_start=295
-  _globals['_VERSION']._serialized_end=321
-  _globals['_VERSIONRESPONSE']._serialized_start=323
-  _globals['_VERSIONRESPONSE']._serialized_end=374
-  _globals['_REPLICATESAVEGAMESTATEREQUEST']._serialized_start=376
-  _globals['_REPLICATESAVEGAMESTATEREQUEST']._serialized_end=434
-  _globals['_REPLICATESAVEGAMESTATERESPONSE']._serialized_start=436
-  _globals['_REPLICATESAVEGAMESTATERESPONSE']._serialized_end=485
-  _globals['_PINGREQUEST']._serialized_start=487
-  _globals['_PINGREQUEST']._serialized_end=500
-  _globals['_PINGRESPONSE']._serialized_start=502
-  _globals['_PINGRESPONSE']._serialized_end=531
-  _globals['_CHATSERVICE']._serialized_start=534
-  _globals['_CHATSERVICE']._serialized_end=783
-  _globals['_REPLICATIONSERVICE']._serialized_start=785
-  _globals['_REPLICATIONSERVICE']._serialized_end=896
-  _globals['_HEALTH']._serialized_start=898
-  _globals['_HEALTH']._serialized_end=943
+  _globals['_GETLEADERINFORESPONSE']._serialized_end=89
+  _globals['_SAVEGAMESTATEREQUEST']._serialized_start=91
+  _globals['_SAVEGAMESTATEREQUEST']._serialized_end=190
+  _globals['_SAVEGAMESTATERESPONSE']._serialized_start=192
+  _globals['_SAVEGAMESTATERESPONSE']._serialized_end=297
+  _globals['_LOADGAMESTATEREQUEST']._serialized_start=299
+  _globals['_LOADGAMESTATEREQUEST']._serialized_end=338
+  _globals['_LOADGAMESTATERESPONSE']._serialized_start=340
+  _globals['_LOADGAMESTATERESPONSE']._serialized_end=460
+  _globals['_GAMEHISTORYREQUEST']._serialized_start=462
+  _globals['_GAMEHISTORYREQUEST']._serialized_end=529
+  _globals['_GAMEHISTORYENTRY']._serialized_start=531
+  _globals['_GAMEHISTORYENTRY']._serialized_end=641
+  _globals['_GAMEHISTORYRESPONSE']._serialized_start=643
+  _globals['_GAMEHISTORYRESPONSE']._serialized_end=700
+  _globals['_WATCHGAMESTATEREQUEST']._serialized_start=702
+  _globals['_WATCHGAMESTATEREQUEST']._serialized_end=748
+  _globals['_GAMESTATEUPDATE']._serialized_start=750
+  _globals['_GAMESTATEUPDATE']._serialized_end=811
+  _globals['_EMPTY']._serialized_start=813
+  _globals['_EMPTY']._serialized_end=820
+  _globals['_VERSION']._serialized_start=822
+  _globals['_VERSION']._serialized_end=848
+  _globals['_VERSIONRESPONSE']._serialized_start=850
+  _globals['_VERSIONRESPONSE']._serialized_end=901
+  _globals['_REPLICATESAVEGAMESTATEREQUEST']._serialized_start=904
+  _globals['_REPLICATESAVEGAMESTATEREQUEST']._serialized_end=1045
+  _globals['_REPLICATESAVEGAMESTATERESPONSE']._serialized_start=1047
+  _globals['_REPLICATESAVEGAMESTATERESPONSE']._serialized_end=1110
+  _globals['_PINGREQUEST']._serialized_start=1112
+  _globals['_PINGREQUEST']._serialized_end=1158
+  _globals['_PINGRESPONSE']._serialized_start=1160
+  _globals['_PINGRESPONSE']._serialized_end=1226
+  _globals['_CHATSERVICE']._serialized_start=1229
+  _globals['_CHATSERVICE']._serialized_end=1601
+  _globals['_REPLICATIONSERVICE']._serialized_start=1603
+  _globals['_REPLICATIONSERVICE']._serialized_end=1714
+  _globals['_HEALTH']._serialized_start=1716
+  _globals['_HEALTH']._serialized_end=1761
 # @@protoc_insertion_point(module_scope)
@@ -54,6 +54,16 @@ class ChatServiceStub(object):
                 request_serializer=chat__pb2.Version.SerializeToString,
                 response_deserializer=chat__pb2.VersionResponse.FromString,
                 _registered_method=True)
+        self.WatchGameState = channel.unary_stream(
+                '/ChatService/WatchGameState',
+                request_serializer=chat__pb2.WatchGameStateRequest.SerializeToString,
+                response_deserializer=chat__pb2.GameStateUpdate.FromString,
+                _registered_method=True)
+        self.GetGameHistory = channel.unary_unary(
+                '/ChatService/GetGameHistory',
+                request_serializer=chat__pb2.GameHistoryRequest.SerializeToString,
+                response_deserializer=chat__pb2.GameHistoryResponse.FromString,
+                _registered_method=True)
 
 
 class ChatServiceServicer(object):
@@ -83,6 +93,18 @@ class ChatServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def WatchGameState(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetGameHistory(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_ChatServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -106,6 +128,16 @@ def add_ChatServiceServicer_to_server(servicer, server):
                     request_deserializer=chat__pb2.Version.FromString,
                     response_serializer=chat__pb2.VersionResponse.SerializeToString,
             ),
+            'WatchGameState': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchGameState,
+                    request_deserializer=chat__pb2.WatchGameStateRequest.FromString,
+                    response_serializer=chat__pb2.GameStateUpdate.SerializeToString,
+            ),
+            'GetGameHistory': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetGameHistory,
+                    request_deserializer=chat__pb2.GameHistoryRequest.FromString,
+                    response_serializer=chat__pb2.GameHistoryResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'ChatService', rpc_method_handlers)
@@ -225,6 +257,60 @@ class ChatService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def WatchGameState(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/ChatService/WatchGameState',
+            chat__pb2.WatchGameStateRequest.SerializeToString,
+            chat__pb2.GameStateUpdate.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetGameHistory(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/ChatService/GetGameHistory',
+            chat__pb2.GameHistoryRequest.SerializeToString,
+            chat__pb2.GameHistoryResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
 
 class ReplicationServiceStub(object):
     """Missing associated documentation comment in .proto file."""
@@ -0,0 +1,48 @@
+import json
+
+BACKEND_BASE_PORT = 8001  # Backend server i listens on BACKEND_BASE_PORT + i - 1 by default
+APP_BASE_PORT = 5001  # Frontend app i listens on APP_BASE_PORT + i - 1 by default
+
+# -------------------------
+# ClusterConfig: topology of both tiers. Nodes are {'id', 'host', 'port'}
+# dicts with IDs 1..N; a lower ID wins leader elections.
+# -------------------------
+class ClusterConfig:
+    def __init__(self, backends, apps):
+        self.backends = sorted(backends, key=lambda node: node['id'])
+        self.apps = sorted(apps, key=lambda node: node['id'])
+        for tier, nodes in (("backends", self.backends), ("apps", self.apps)):
+            ids = [node['id'] for node in nodes]
+            if ids != list(range(1, len(nodes) + 1)):
+                raise ValueError(f"Cluster {tier} must be numbered 1..{len(nodes)}, got {ids}")
+
+    @property
+    def quorum(self):
+        """Number of backends (the leader included) that make a majority."""
+        return len(self.backends) // 2 + 1
+
+    def backend(self, server_id):
+        return self.backends[server_id - 1]
+
+    def backend_addresses(self):
+        """host:port of every backend, in ID order."""
+        return [f"{node['host']}:{node['port']}" for node in self.backends]
+
+    def backend_peers(self, server_id):
+        """(peer_id, "host:port") for every backend except server_id."""
+        return [(node['id'], f"{node['host']}:{node['port']}") for node in self.backends if node['id'] != server_id]
+
+def load_cluster_config(path):
+    """Read a topology file: {"backends": [{"id", "host", "port"}, ...], "apps": [...]}."""
+    with open(path) as f:
+        data = json.load(f)
+    return ClusterConfig(data.get('backends', []), data.get('apps', []))
+
+def cluster_from_ips(backend_ips, app_ips=None):
+    """Build a topology from comma-separated IP lists, numbering nodes in order and
+    giving them the default ports."""
+    backends = [{'id': i + 1, 'host': ip, 'port': BACKEND_BASE_PORT + i}
+                for i, ip in enumerate(backend_ips.split(","))]
+    apps = [{'id': i + 1, 'host': ip, 'port': APP_BASE_PORT + i}
+            for i, ip in enumerate(app_ips.split(","))] if app_ips else []
+    return ClusterConfig(backends, apps)
@@ -0,0 +1,57 @@
+import math
+import threading
+import time
+from collections import deque
+
+# -------------------------
+# PhiAccrualFailureDetector: instead of a fixed timeout, rates how suspicious
+# the silence since the last heartbeat is, given the heartbeat intervals seen
+# so far (Hayashibara et al., "The phi accrual failure detector"). phi = 1
+# means a ~10% chance the peer is still alive, phi = 8 about 1e-8.
+# -------------------------
+class PhiAccrualFailureDetector:
+    def __init__(self, threshold=8.0, window_size=100, min_std_dev=0.05,
+                 acceptable_pause=0.0, first_interval=0.5):
+        self.threshold = threshold
+        self.min_std_dev = min_std_dev  # seconds; keeps phi sane when heartbeats are very regular
+        self.acceptable_pause = acceptable_pause  # seconds of extra silence tolerated (e.g. GC pauses)
+        self.first_interval = first_interval  # seconds; assumed interval until real ones are seen
+        self.intervals = deque(maxlen=window_size)
+        self.last_heartbeat = None
+        self.lock = threading.Lock()
+
+    def heartbeat(self, now=None):
+        """Record that the peer answered a probe."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if self.last_heartbeat is None:
+                # Seed the window so the first real interval isn't judged on nothing
+                self.intervals.append(self.first_interval)
+            else:
+                self.intervals.append(now - self.last_heartbeat)
+            self.last_heartbeat = now
+
+    def phi(self, now=None):
+        """Suspicion level for the peer; grows the longer it stays silent."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if self.last_heartbeat is None:
+                return float('inf')  # Never heard from it
+            elapsed = now - self.last_heartbeat
+            raw_mean = sum(self.intervals) / len(self.intervals)
+            variance = sum((i - raw_mean) ** 2 for i in self.intervals) / len(self.intervals)
+        mean = raw_mean + self.acceptable_pause
+        std_dev = max(math.sqrt(variance), self.min_std_dev)
+        # Logistic approximation of the normal CDF, as used by Akka and Cassandra
+        y = (elapsed - mean) / std_dev
+        try:
+            e = math.exp(-y * (1.5976 + 0.070566 * y * y))
+        except OverflowError:
+            return 0.0  # Far earlier than the next heartbeat is due
+        if elapsed > mean:
+            return -math.log10(e / (1.0 + e)) if e > 0.0 else float('inf')
+        return -math.log10(1.0 - 1.0 / (1.0 + e))
+
+    def is_available(self, now=None):
+        """True while phi stays under the threshold."""
+        return self.phi(now) < self.threshold
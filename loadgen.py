@@ -0,0 +1,308 @@
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import requests
+
+from cluster import load_cluster_config
+
+def percentile(samples, p):
+    """The p-th percentile (0-100) of samples by the nearest-rank method."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+# -------------------------
+# LatencyRecorder: per-endpoint latencies and error counts, shared by every
+# simulated player. An error is a request that got no usable answer (a
+# connection failure, a timeout, a 503 from a backup app or a 5xx); game-level
+# refusals such as a rejected claim are outcomes, counted separately.
+# -------------------------
+class LatencyRecorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)  # endpoint -> [seconds] of successful requests
+        self.errors = Counter()  # endpoint -> failed requests
+        self.outcomes = Counter()  # e.g. "claim_accepted", "claim_rejected"
+        self.events = []  # (monotonic time, endpoint, ok), for failover timelines
+        self.outcome_events = []  # (monotonic time, outcome)
+        self.started = time.monotonic()
+
+    def record(self, endpoint, seconds, ok):
+        with self.lock:
+            if ok:
+                self.latencies[endpoint].append(seconds)
+            else:
+                self.errors[endpoint] += 1
+            self.events.append((time.monotonic(), endpoint, ok))
+
+    def count(self, outcome):
+        with self.lock:
+            self.outcomes[outcome] += 1
+            self.outcome_events.append((time.monotonic(), outcome))
+
+    def summary(self):
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            endpoints = {}
+            for endpoint in sorted(set(self.latencies) | set(self.errors)):
+                samples = self.latencies[endpoint]
+                total = len(samples) + self.errors[endpoint]
+                endpoints[endpoint] = {
+                    "requests": total,
+                    "errors": self.errors[endpoint],
+                    "error_rate": self.errors[endpoint] / total,
+                    "throughput_rps": total / elapsed,
+                    "p50_ms": percentile(samples, 50) * 1000 if samples else None,
+                    "p99_ms": percentile(samples, 99) * 1000 if samples else None,
+                }
+            total_requests = sum(e["requests"] for e in endpoints.values())
+            total_errors = sum(e["errors"] for e in endpoints.values())
+            return {
+                "duration_s": elapsed,
+                "requests": total_requests,
+                "errors": total_errors,
+                "error_rate": total_errors / total_requests if total_requests else 0.0,
+                "throughput_rps": total_requests / elapsed,
+                "endpoints": endpoints,
+                "outcomes": dict(self.outcomes),
+            }
+
+def print_summary(summary):
+    print(f"{summary['requests']} requests in {summary['duration_s']:.1f} s: "
+          f"{summary['throughput_rps']:.1f} req/s, {summary['error_rate']:.2%} errors")
+    print(f"{'endpoint':<22}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>10}")
+    for endpoint, stats in summary["endpoints"].items():
+        p50 = f"{stats['p50_ms']:.1f}" if stats["p50_ms"] is not None else "-"
+        p99 = f"{stats['p99_ms']:.1f}" if stats["p99_ms"] is not None else "-"
+        print(f"{endpoint:<22}{stats['requests']:>10}{stats['throughput_rps']:>10.1f}"
+              f"{p50:>10}{p99:>10}{stats['error_rate']:>10.2%}")
+    if summary["outcomes"]:
+        print("Outcomes: " + ", ".join(f"{k}={v}" for k, v in sorted(summary["outcomes"].items())))
+
+# -------------------------
+# SimulatedPlayer: one browser's worth of traffic. It joins the lobby, waits
+# for its room to be seated, then polls /game_state like script.js does and,
+# after a think time, claims the symbol its card shares with the center card.
+# Closed loop: each player sends its next request only after the previous one
+# has answered. Requests that fail move the player on to the next app, the way
+# a person would try another frontend when the leader goes away.
+# -------------------------
+class SimulatedPlayer(threading.Thread):
+    def __init__(self, username, app_urls, recorder, stop_event, think_time=1.0,
+                 poll_interval=1.0, mode="claim", timeout=5.0, seed=None, vote_restart=True):
+        super().__init__(name=f"player-{username}", daemon=True)
+        self.username = username
+        self.app_urls = list(app_urls)
+        self.app_index = 0
+        self.recorder = recorder
+        self.stop_event = stop_event
+        self.think_time = think_time
+        self.poll_interval = poll_interval
+        self.mode = mode
+        self.timeout = timeout
+        self.vote_restart = vote_restart
+        self.rng = random.Random(seed)
+        self.http = requests.Session()
+        self.ticket = None
+        self.session_id = None
+        self.matches = 0  # Matches the app told us were ours
+
+    def request(self, method, path, endpoint, **kwargs):
+        """Send one request; returns the decoded JSON, or None after recording an error."""
+        url = self.app_urls[self.app_index] + path
+        headers = {"X-Session-Id": self.session_id} if self.session_id else {}
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+            ok = response.status_code < 500 and response.headers.get("Content-Type", "").startswith(
+                ("application/json", "text/html"))
+            data = response.json() if ok and response.headers["Content-Type"].startswith("application/json") else {}
+        except (requests.RequestException, ValueError):
+            ok, data = False, None
+        self.recorder.record(endpoint, time.perf_counter() - start, ok)
+        if not ok:
+            # Try the next app; a backup answers 503 until it is elected
+            self.app_index = (self.app_index + 1) % len(self.app_urls)
+            return None
+        return data
+
+    def pause(self, seconds):
+        """Sleep, waking early when the run is stopped; returns False once stopped."""
+        return not self.stop_event.wait(seconds)
+
+    def think(self):
+        # Reaction times are skewed: mostly near the median with a long slow tail
+        return self.pause(self.rng.lognormvariate(math.log(self.think_time), 0.5) if self.think_time > 0 else 0)
+
+    def join_lobby(self):
+        while not self.stop_event.is_set():
+            data = self.request("POST", "/set_username", "/set_username", json={"username": self.username})
+            if data is not None and data.get("success") is False:
+                # Taken (e.g. our own join landed before a failover): come back under a new name
+                self.recorder.count("username_taken")
+                self.username = f"{self.username}-{uuid.uuid4().hex[:4]}"
+                continue
+            if data and data.get("ticket"):
+                self.ticket = data["ticket"]
+                return data
+            # Failed, or an HTML page from an app that is still initializing: try again
+            self.pause(self.poll_interval)
+        return None
+
+    def wait_for_seat(self, status):
+        """Poll the lobby until our room is seated (the page long-polls /lobby/wait instead)."""
+        while status is None or not status.get("game_ready"):
+            if not self.pause(self.poll_interval):
+                return False
+            status = self.request("GET", "/check_game_status", "/check_game_status", params={"ticket": self.ticket})
+        self.session_id = status["session_id"]
+        self.request("GET", "/spot_it_game", "/spot_it_game", params={"session_id": self.session_id})
+        return True
+
+    def find_match(self, state):
+        player = {e["emoji"] for e in state.get("player_emojis") or []}
+        center = state.get("center_emojis")
+        if not player or not isinstance(center, list):
+            return None
+        common = player & {e["emoji"] for e in center}
+        return next(iter(common), None)
+
+    def claim(self, emoji, state_version):
+        if self.mode == "claim":
+            data = self.request("POST", "/claim_match", "/claim_match",
+                                json={"emoji": emoji, "state_version": state_version})
+            if data is not None:
+                self.recorder.count("claim_accepted" if data.get("accepted") else "claim_rejected")
+                self.matches += bool(data.get("accepted"))
+            return data
+        # Two-click flow of the classic page: own card first, then the center card
+        if self.request("POST", "/clickedPlayer", "/clickedPlayer", json={"emoji": emoji}) is None:
+            return None
+        data = self.request("POST", "/clickedCenter", "/clickedCenter", json={"emoji": emoji})
+        if data is not None:
+            self.recorder.count("click_matched" if "player_emojis" in data else "click_missed")
+            self.matches += "player_emojis" in data
+        return data
+
+    def play(self):
+        """Play until the run stops; returns True if the room was closed and we should rejoin."""
+        voted_for = None
+        while not self.stop_event.is_set():
+            state = self.request("GET", "/game_state", "/game_state")
+            if state is None:
+                self.pause(self.poll_interval)
+                continue
+            if state.get("room_closed"):
+                return True
+            if state.get("game_finished"):
+                # Vote for a rematch once per finished game, then keep watching
+                if self.vote_restart and voted_for != state.get("state_version"):
+                    data = self.request("POST", "/request_restart", "/request_restart",
+                                        json={"username": self.username})
+                    if data is not None and data.get("success"):
+                        voted_for = state.get("state_version")
+                self.pause(self.poll_interval)
+                continue
+            emoji = self.find_match(state)
+            if emoji is None:
+                self.pause(self.poll_interval)
+                continue
+            if not self.think():
+                break
+            self.claim(emoji, state.get("state_version"))
+        return False
+
+    def run(self):
+        while not self.stop_event.is_set():
+            status = self.join_lobby()
+            if status is None or not self.wait_for_seat(status):
+                return
+            if not self.play():
+                return
+            self.ticket = self.session_id = None
+
+def start_players(app_urls, n_players, recorder, stop_event, think_time=1.0, poll_interval=1.0, mode="claim",
+                  ramp_up=0.0, seed=None, vote_restart=True):
+    """Start n_players simulated players; they run until stop_event is set."""
+    run_id = uuid.uuid4().hex[:6]
+    players = [
+        SimulatedPlayer(f"load-{run_id}-{i}", app_urls, recorder, stop_event, think_time=think_time,
+                        poll_interval=poll_interval, mode=mode,
+                        seed=None if seed is None else seed + i, vote_restart=vote_restart)
+        for i in range(n_players)
+    ]
+    for player in players:
+        player.start()
+        if ramp_up:
+            time.sleep(ramp_up / n_players)
+    return players
+
+def run_load(app_urls, n_players, duration, think_time=1.0, poll_interval=1.0, mode="claim",
+             ramp_up=0.0, seed=None, recorder=None, stop_event=None):
+    """Run n_players simulated players against app_urls for duration seconds; returns the recorder."""
+    recorder = recorder or LatencyRecorder()
+    stop_event = stop_event or threading.Event()
+    players = start_players(app_urls, n_players, recorder, stop_event, think_time=think_time,
+                            poll_interval=poll_interval, mode=mode, ramp_up=ramp_up, seed=seed)
+    stop_event.wait(duration)
+    stop_event.set()
+    for player in players:
+        player.join(timeout=10)
+    return recorder
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Closed-loop load generator for the Spot It frontends.")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--apps", type=str, help="Comma-separated app base URLs, e.g. http://127.0.0.1:5001")
+    target.add_argument("--cluster", type=str, help="Cluster topology file; load goes to its apps")
+    target.add_argument("--local", action="store_true",
+                        help="Start a cluster on loopback (see local_cluster.py) for the run")
+    parser.add_argument("--backends", type=int, default=3, help="Backend servers for --local")
+    parser.add_argument("--app_count", type=int, default=3, help="Frontend apps for --local")
+    parser.add_argument("--room_size", type=int, default=2, help="Players per room for --local")
+    parser.add_argument("--players", type=int, default=2, help="Number of simulated players")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--think_time", type=float, default=1.0, help="Median seconds before claiming a match")
+    parser.add_argument("--poll_interval", type=float, default=1.0, help="Seconds between idle polls")
+    parser.add_argument("--mode", choices=["claim", "clicks"], default="claim",
+                        help="Claim matches with /claim_match or with the two-click flow")
+    parser.add_argument("--ramp_up", type=float, default=0.0, help="Seconds over which players arrive")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible think times")
+    parser.add_argument("--json", type=str, default=None, help="Also write the summary to this file")
+    args = parser.parse_args()
+
+    cluster = None
+    if args.local:
+        from local_cluster import LocalCluster
+        cluster = LocalCluster(args.backends, args.app_count, args.room_size)
+        print(f"Starting a local cluster in {cluster.workdir}...")
+        if cluster.start() is None:
+            cluster.stop()
+            raise SystemExit("No app became leader")
+        urls = cluster.app_urls()
+    elif args.cluster:
+        config = load_cluster_config(args.cluster)
+        urls = [f"http://{node['host']}:{node['port']}" for node in config.apps]
+    else:
+        urls = [u.strip().rstrip("/") for u in (args.apps or "http://127.0.0.1:5001").split(",")]
+
+    try:
+        recorder = run_load(urls, args.players, args.duration, think_time=args.think_time,
+                            poll_interval=args.poll_interval, mode=args.mode, ramp_up=args.ramp_up,
+                            seed=args.seed)
+    finally:
+        if cluster is not None:
+            cluster.stop()
+    summary = recorder.summary()
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
@@ -0,0 +1,121 @@
+import threading
+import uuid
+from collections import deque
+
+# -------------------------
+# Lobby: waiting players queued into rooms of room_size, in join order.
+# A join is O(1): the player goes into the room being filled, and a room that
+# fills up is sealed and queued until a table is free to host it. Waiters block
+# on one condition that is notified once per change, not once per waiter.
+# -------------------------
+class Lobby:
+    def __init__(self, room_size):
+        self.room_size = room_size
+        self.changed = threading.Condition()
+        self.version = 0  # Bumped on every change, so waiters know when to look again
+        self.rooms = {}  # room_id -> {"id", "members": [username], "status": "forming/ready/playing"}
+        self.ready = deque()  # IDs of sealed rooms waiting for a table, oldest first
+        self.player_rooms = {}  # username -> room_id
+        self.forming = self._open_room()
+
+    def _open_room(self):
+        room = {"id": str(uuid.uuid4()), "members": [], "status": "forming"}
+        self.rooms[room["id"]] = room
+        return room
+
+    def _bump(self):
+        self.version += 1
+        self.changed.notify_all()
+
+    def join(self, username):
+        """Queue a player; returns their room. Raises ValueError if the name is taken."""
+        with self.changed:
+            if username in self.player_rooms:
+                raise ValueError(f"Username {username} is already taken")
+            room = self.forming
+            room["members"].append(username)
+            self.player_rooms[username] = room["id"]
+            if len(room["members"]) >= self.room_size:
+                room["status"] = "ready"
+                self.ready.append(room["id"])
+                self.forming = self._open_room()
+            self._bump()
+            return room
+
+    def take_ready_room(self):
+        """Hand the oldest sealed room to a table, or return None if none is waiting."""
+        with self.changed:
+            if not self.ready:
+                return None
+            room = self.rooms[self.ready.popleft()]
+            room["status"] = "playing"
+            self._bump()
+            return room
+
+    def close_room(self, room_id):
+        """Forget a room whose game is over, freeing its usernames."""
+        with self.changed:
+            room = self.rooms.pop(room_id, None)
+            if room is None:
+                return
+            for username in room["members"]:
+                self.player_rooms.pop(username, None)
+            self._bump()
+
+    def status(self, username, room_id=None):
+        """Where a player stands, or None if they aren't queued (in room_id, if given)."""
+        with self.changed:
+            if username not in self.player_rooms or room_id not in (None, self.player_rooms[username]):
+                return None
+            room = self.rooms[self.player_rooms[username]]
+            return {
+                "username": username,
+                "room_id": room["id"],
+                "status": room["status"],
+                "members": list(room["members"]),
+                "waiting_count": self.room_size - len(room["members"]) if room["status"] == "forming" else 0,
+                "rooms_ahead": self.ready.index(room["id"]) if room["status"] == "ready" else 0,
+            }
+
+    def waiting_count(self):
+        """Players still needed to fill the room being formed."""
+        with self.changed:
+            return self.room_size - len(self.forming["members"])
+
+    def room_counts(self):
+        """Number of rooms in each status."""
+        with self.changed:
+            counts = {"forming": 0, "ready": 0, "playing": 0}
+            for room in self.rooms.values():
+                counts[room["status"]] += 1
+            return counts
+
+    def wait_for_change(self, seen_version, timeout):
+        """Block until the lobby changes after seen_version (or timeout); returns the version."""
+        with self.changed:
+            self.changed.wait_for(lambda: self.version != seen_version, timeout)
+            return self.version
+
+    def to_dict(self, sealed_only=False):
+        """Snapshot of the lobby; with sealed_only, the room being filled is left out."""
+        with self.changed:
+            rooms = [room for room in self.rooms.values() if not (sealed_only and room is self.forming)]
+            return {
+                "room_size": self.room_size,
+                "version": self.version,
+                "rooms": rooms,
+                "ready": list(self.ready),
+                "forming": None if sealed_only else self.forming["id"],
+            }
+
+    def load(self, data):
+        """Replace this lobby's contents with a to_dict() snapshot."""
+        with self.changed:
+            self.room_size = data["room_size"]
+            self.rooms = {room["id"]: room for room in data["rooms"]}
+            self.ready = deque(data["ready"])
+            self.forming = self.rooms[data["forming"]] if data.get("forming") else self._open_room()
+            self.player_rooms = {u: room["id"] for room in self.rooms.values() for u in room["members"]}
+            if data["version"] != self.version:
+                self.version = data["version"]
+                self.changed.notify_all()
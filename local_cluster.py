@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import grpc
+import requests
+
+import chat_pb2
+import chat_pb2_grpc
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def free_port(host="127.0.0.1"):
+    """Ask the OS for a port nobody is listening on."""
+    with socket.socket() as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+# -------------------------
+# LocalCluster: backend servers and frontend apps as local processes on
+# free loopback ports, for load and failover testing. Every process runs in
+# its own process group (the Flask reloader forks a child) with its working
+# directory and log file in workdir.
+# -------------------------
+class LocalCluster:
+    def __init__(self, n_backends=3, n_apps=3, players=2, workdir=None, host="127.0.0.1",
+                 secret_key="local-cluster-secret", server_args=(), app_args=()):
+        self.host = host
+        self.players = players
+        self.secret_key = secret_key
+        self.server_args = list(server_args)  # Extra command-line arguments, e.g. timing knobs
+        self.app_args = list(app_args)
+        self.workdir = workdir or tempfile.mkdtemp(prefix="spotit-cluster-")
+        self.config = {
+            "backends": [{"id": i, "host": host, "port": free_port(host)} for i in range(1, n_backends + 1)],
+            "apps": [{"id": i, "host": host, "port": free_port(host)} for i in range(1, n_apps + 1)],
+        }
+        self.config_path = os.path.join(self.workdir, "cluster.json")
+        with open(self.config_path, "w") as f:
+            json.dump(self.config, f, indent=2)
+        self.processes = {}  # ("backend"/"app", id) -> Popen
+
+    def _spawn(self, kind, node_id, args):
+        log = open(os.path.join(self.workdir, f"{kind}_{node_id}.log"), "ab")
+        proc = subprocess.Popen(
+            [sys.executable, "-u", os.path.join(REPO_DIR, args[0])] + args[1:],
+            cwd=self.workdir, stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+        )
+        log.close()
+        self.processes[(kind, node_id)] = proc
+        return proc
+
+    def start_backend(self, server_id):
+        return self._spawn("backend", server_id, ["server.py", "--id", str(server_id), "--cluster", self.config_path]
+                           + self.server_args)
+
+    def start_app(self, app_id):
+        return self._spawn("app", app_id, [
+            "app.py", "--app_id", str(app_id), "--cluster", self.config_path,
+            "--players", str(self.players), "--secret_key", self.secret_key,
+        ] + self.app_args)
+
+    def start(self, timeout=30):
+        """Start every backend, then every app, and wait for an app leader."""
+        for node in self.config["backends"]:
+            self.start_backend(node["id"])
+        for node in self.config["apps"]:
+            self.start_app(node["id"])
+        return self.wait_for_app_leader(timeout)
+
+    def kill(self, kind, node_id):
+        """SIGKILL a node's whole process group, like a machine dying."""
+        proc = self.processes.pop((kind, node_id), None)
+        if proc is None:
+            return
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        proc.wait()
+
+    def stop(self):
+        for kind, node_id in list(self.processes):
+            self.kill(kind, node_id)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def app_urls(self):
+        return [f"http://{node['host']}:{node['port']}" for node in self.config["apps"]]
+
+    def app_leader(self):
+        """ID of the app serving requests (backups answer 503), or None."""
+        for node in self.config["apps"]:
+            if ("app", node["id"]) not in self.processes:
+                continue
+            try:
+                response = requests.get(f"http://{node['host']}:{node['port']}/check_game_status", timeout=0.5)
+            except requests.RequestException:
+                continue
+            if response.status_code == 200 and response.headers.get("Content-Type", "").startswith("application/json"):
+                return node["id"]
+        return None
+
+    def backend_leader(self):
+        """(server ID, term) of the backend leader as reported by a live backend, or (None, 0)."""
+        for node in self.config["backends"]:
+            if ("backend", node["id"]) not in self.processes:
+                continue
+            try:
+                with grpc.insecure_channel(f"{node['host']}:{node['port']}") as channel:
+                    stub = chat_pb2_grpc.ChatServiceStub(channel)
+                    info = stub.GetLeaderInfo(chat_pb2.GetLeaderInfoRequest(), timeout=0.5)
+            except grpc.RpcError:
+                continue
+            for leader in self.config["backends"]:
+                if info.info == f"{leader['host']}:{leader['port']}":
+                    return leader["id"], info.term
+        return None, 0
+
+    def wait_for_app_leader(self, timeout=30, exclude=None):
+        """Wait until an app other than exclude serves requests; returns its ID or None."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            leader = self.app_leader()
+            if leader is not None and leader != exclude:
+                return leader
+            time.sleep(0.1)
+        return None
+
+    def wait_for_backend_leader(self, timeout=30, exclude=None):
+        """Wait until a backend other than exclude leads; returns (ID, term) or (None, 0)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            leader, term = self.backend_leader()
+            if leader is not None and leader != exclude:
+                return leader, term
+            time.sleep(0.1)
+        return None, 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a Spot It cluster on loopback until interrupted.")
+    parser.add_argument("--backends", type=int, default=3, help="Number of backend servers")
+    parser.add_argument("--apps", type=int, default=3, help="Number of frontend apps")
+    parser.add_argument("--players", type=int, default=2, help="Players per room")
+    parser.add_argument("--workdir", type=str, default=None, help="Directory for the cluster file, logs and state")
+    args = parser.parse_args()
+
+    cluster = LocalCluster(args.backends, args.apps, args.players, args.workdir)
+    print(f"Cluster file and logs in {cluster.workdir}")
+    try:
+        leader = cluster.start()
+        print(f"App leader: {leader}; apps at {', '.join(cluster.app_urls())}")
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cluster.stop()
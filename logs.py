@@ -0,0 +1,52 @@
+import logging
+import threading
+import time
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+def get_logger(name):
+    return logging.getLogger(f"spotit.{name}")
+
+# -------------------------
+# RateLimitFilter: lets through at most `burst` records per message template
+# every `period` seconds; the rest are dropped and counted, and the next
+# record let through says how many of its kind were suppressed. Templates
+# are the unformatted msg, so "saved %s" with different arguments is one
+# kind, and dropped records are never formatted.
+# -------------------------
+class RateLimitFilter(logging.Filter):
+    def __init__(self, burst=10, period=1.0):
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        self.lock = threading.Lock()
+        self.windows = {}  # (logger, template) -> [window start, records let through, suppressed]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True  # Never hide problems
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.period:
+                suppressed = window[2] if window else 0
+                window = self.windows[key] = [now, 0, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+            if window[1] >= self.burst:
+                window[2] += 1
+                return False
+            window[1] += 1
+            return True
+
+def configure_logging(level="INFO", burst=10, period=1.0):
+    """Send spotit.* loggers to stderr at level, rate limited per message template."""
+    logger = logging.getLogger("spotit")
+    logger.setLevel(getattr(logging, str(level).upper()))
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(RateLimitFilter(burst, period))
+    logger.handlers = [handler]
+    logger.propagate = False
+    return logger
@@ -0,0 +1,164 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"  # Prometheus text exposition format
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# -------------------------
+# Metrics: counters, gauges and histograms, each with optional labels. A
+# labelled metric keeps one series per combination of label values, so
+# labels must come from small fixed sets (routes, peers, states), never from
+# user input.
+# -------------------------
+class Counter:
+    type_name = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}  # label values -> count
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(tuple(str(labels[name]) for name in self.label_names), 0)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, _format_labels(self.label_names, key), value) for key, value in sorted(self.values.items())]
+
+class Gauge(Counter):
+    """A value that goes up and down; with fn, read from fn() (a number or {label values: number}) at scrape time."""
+    type_name = "gauge"
+
+    def __init__(self, name, help, labels=(), fn=None):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self.lock:
+            self.values[key] = value
+
+    def samples(self):
+        if self.fn is None:
+            return super().samples()
+        try:
+            current = self.fn()
+        except Exception as e:
+            print(f"[Metrics] Gauge {self.name} failed: {e}")
+            return []
+        if not isinstance(current, dict):
+            current = {(): current}
+        return [(self.name, _format_labels(self.label_names, key if isinstance(key, tuple) else (key,)), value)
+                for key, value in sorted(current.items())]
+
+class Histogram:
+    type_name = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels):
+        series = self.series.get(tuple(str(labels[name]) for name in self.label_names))
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self.lock:
+            snapshot = {key: list(series) for key, series in self.series.items()}
+        samples = []
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                samples.append((f"{self.name}_bucket", _format_labels(self.label_names, key, [("le", le)]), cumulative))
+            samples.append((f"{self.name}_sum", _format_labels(self.label_names, key), series[-1]))
+            samples.append((f"{self.name}_count", _format_labels(self.label_names, key), cumulative))
+        return samples
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=(), fn=None):
+        return self._register(Gauge(name, help, labels, fn))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+def serve_metrics(registry, port, host="127.0.0.1"):
+    """Serve registry.render() at http://host:port/metrics from a daemon thread; returns the server."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would drown the log
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,83 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+MAX_PROFILE_SECONDS = 60
+
+# -------------------------
+# Sampling profiler: every `interval` seconds, record the Python stack of
+# every other thread. It runs against a live process without restarting it
+# or instrumenting calls, and sees the threads that are already running
+# (cProfile only sees the thread that starts it), at the cost of statistical
+# rather than exact counts. Time a thread spends waiting shows up too, in the
+# function it waits in, so filter on thread names to look at request threads.
+# -------------------------
+class StackProfile:
+    def __init__(self, stacks, samples, interval, seconds):
+        self.stacks = stacks  # (thread name, outermost frame, ..., innermost frame) -> samples
+        self.samples = samples  # Sampling rounds taken
+        self.interval = interval
+        self.seconds = seconds
+
+    def collapsed(self):
+        """One "thread;outer;...;inner count" line per stack, the input format of flame graph tools."""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, limit=40):
+        """A pstats-like table of functions by samples in them (self) and under them (cumulative)."""
+        own, cumulative = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack[1:]
+            if frames:
+                own[frames[-1]] += count
+            for frame in set(frames):
+                cumulative[frame] += count
+        total = sum(self.stacks.values()) or 1
+        lines = [f"{total} samples over {self.seconds:.1f} s ({self.samples} rounds every {self.interval * 1000:g} ms)",
+                 f"{'self':>8} {'self%':>7} {'cum':>8} {'cum%':>7}  function"]
+        for frame, count in cumulative.most_common(limit):
+            lines.append(f"{own[frame]:>8} {own[frame] / total:>7.1%} {count:>8} {count / total:>7.1%}  {frame}")
+        return "\n".join(lines) + "\n"
+
+    def render(self, fmt):
+        return self.collapsed() if fmt == "collapsed" else self.top()
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def sample_stacks(seconds, interval=0.005, thread_filter=None):
+    """Sample the stacks of all other threads for seconds; thread_filter keeps threads whose name contains it."""
+    seconds = min(max(seconds, 0), MAX_PROFILE_SECONDS)
+    me = threading.get_ident()
+    stacks = Counter()
+    rounds = 0
+    started = time.monotonic()
+    deadline = started + seconds
+    while True:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            name = names.get(thread_id, str(thread_id))
+            if thread_id == me or (thread_filter and thread_filter not in name):
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            stacks[(name,) + tuple(reversed(labels))] += 1
+        rounds += 1
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(interval)
+    return StackProfile(stacks, rounds, interval, time.monotonic() - started)
+
+def profile_to_file(path, seconds, interval=0.005):
+    """Sample for seconds and write the collapsed stacks to path and the table to path + ".top"."""
+    profile = sample_stacks(seconds, interval)
+    with open(path, "w") as f:
+        f.write(profile.collapsed())
+    with open(path + ".top", "w") as f:
+        f.write(profile.top())
+    return profile
@@ -6,37 +6,230 @@ import chat_pb2_grpc
 import multiprocessing
 import argparse
 import atexit
+import signal
+from cluster import load_cluster_config, cluster_from_ips
+from tracing import Tracer, JsonlExporter
+from metrics import MetricsRegistry, SIZE_BUCKETS, serve_metrics
+from logs import get_logger, configure_logging
+from profiling import profile_to_file
+from storage import create_storage_engine
 
 HEARTBEAT_INTERVAL = 2  # seconds
+LEASE_DURATION = 2.5 * HEARTBEAT_INTERVAL  # seconds a granted leader lease lasts; renewed every heartbeat
+RECENT_REQUESTS = 1024  # request IDs remembered to recognise retried saves
+FLUSH_INTERVAL = 0.02  # seconds a logged replica write may wait for its batch to be flushed
+FLUSH_BATCH = 64  # logged writes that trigger a flush before FLUSH_INTERVAL is up
+WATCH_POLL_INTERVAL = 1  # seconds a WatchGameState stream waits before checking the client is still there
+PROFILE_SECONDS = 10  # seconds sampled after a SIGUSR1
 SERVER_VERSION = "1.0.0"
 ports = {1: 8001, 2: 8002, 3: 8003}
 all_host_port_pairs = []
+tracer = Tracer("server")  # Configured in main: sample rate and a JSONL file per server
+log = get_logger("server")
+
+# Metrics, served as text on --metrics_port
+metrics = MetricsRegistry()
+SAVES = metrics.counter("spotit_backend_saves_total", "SaveGameState calls by result", labels=("result",))
+SAVE_SECONDS = metrics.histogram("spotit_backend_save_seconds", "Time to store and replicate one SaveGameState")
+SNAPSHOT_BYTES = metrics.histogram("spotit_backend_snapshot_bytes", "Size of saved session snapshots",
+                                   buckets=SIZE_BUCKETS)
+STORE_WRITE_SECONDS = metrics.histogram("spotit_store_write_seconds", "Time to write one batch to the storage engine")
+STORE_BATCH_RECORDS = metrics.histogram("spotit_store_batch_records", "Saves written together in one batch",
+                                        buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+REPLICATION_ACKS = metrics.histogram("spotit_replication_acks", "Acknowledgements per save, the leader's own included",
+                                     buckets=(1, 2, 3, 4, 5, 7, 9))
+REPLICATION_PEER_SECONDS = metrics.histogram("spotit_replication_peer_seconds", "Replication call latency per peer",
+                                             labels=("peer", "result"))
+REPLICA_WRITES = metrics.counter("spotit_replica_writes_total", "ReplicateSaveGameState calls by result",
+                                 labels=("result",))
+ELECTION_TRANSITIONS = metrics.counter("spotit_backend_election_transitions_total",
+                                       "Leader election state changes by new state", labels=("state",))
 
 # -------------------------
-# PersistentStore: writes to a JSON file unique per server.
+# PersistentStore: the server's saved games, kept by a storage engine (see
+# storage.py) unique per server, with the current state also in memory.
+# Saves of a game carry increasing sequence numbers, so a retried save is
+# recognised by its request ID and not written twice, and a save that
+# arrives after a newer one (reordered, or from a deposed leader) is refused
+# instead of overwriting newer state.
+# log() appends saves to an in-memory log, visible to loads and watch streams
+# at once, and flush() (or the flusher thread, every FLUSH_INTERVAL) writes
+# them to the engine in batches, so a burst of replica writes costs one
+# engine write instead of one each. save() writes a save right away and only
+# makes it visible once the write succeeded.
 # -------------------------
 class PersistentStore:
-    def __init__(self, filename):
-        self.filename = filename
+    def __init__(self, engine):
+        self.engine = engine
         self.lock = threading.RLock()
-        if os.path.exists(filename):
-            os.remove(filename)
-            print(f"Cleared {filename}")
-    
-    def save(self, session_data_json):
+        # Committed state is also kept in memory, numbered, for WatchGameState streams
+        self.updated = threading.Condition(self.lock)
+        self.game_seqs = engine.games()  # game_id -> seq of the last save stored
+        self.recent_requests = {}  # request_id -> (game_id, seq, log position) of recent saves, oldest first
+        current = engine.load()  # The game last saved before a restart, if the engine keeps any
+        self.game_id, self.seq, self.session_data_json = current if current else ("", 0, None)
+        self.version = 1 if current else 0
+        self.pending = []  # Logged (game_id, seq, session_data_json) not yet written to the engine
+        self.logged = 0  # Position of the last logged save
+        self.flushed = 0  # Position of the last save written to the engine
+        self.flush_lock = threading.Lock()  # Keeps batches in log order
+        self.flush_due = threading.Condition(self.lock)  # Wakes the flusher early for a full batch
+
+    def check(self, game_id, seq, request_id):
+        """"store" if a save may be written, "duplicate" if it already was, "stale" if a newer one was."""
+        with self.lock:
+            if request_id and request_id in self.recent_requests:
+                return "duplicate"
+            if seq and seq <= self.game_seqs.get(game_id, 0):
+                return "stale"
+            return "store"
+
+    def committed_seq(self, game_id):
+        with self.lock:
+            return self.game_seqs.get(game_id, 0)
+
+    def save(self, session_data_json, game_id="", seq=0, request_id=""):
+        """Write a save to the engine, after the logged ones, unless check() says otherwise; returns check()'s
+        verdict. The save only becomes the current state once it is written: if the write raises, the store
+        is left as it was and a retry is written again instead of being taken for a duplicate."""
+        record = (game_id, seq, session_data_json)
+        with self.flush_lock:
+            with self.lock:
+                verdict = self.check(game_id, seq, request_id)
+                position = self.recent_requests[request_id][2] if verdict == "duplicate" else self.logged
+                if verdict == "store":
+                    batch, self.pending = self.pending, []
+            if verdict == "store":
+                self.write(batch + [record], requeue=batch)
+                with self.lock:
+                    self.flushed = position
+                    self.apply(record, request_id, position)
+        if verdict == "duplicate":
+            self.flush(position)  # The first copy may only be logged so far
+        return verdict
+
+    def log(self, session_data_json, game_id="", seq=0, request_id=""):
+        """Log a save unless check() says otherwise, leaving the write to the next flush.
+        Returns check()'s verdict and the position to pass to flush() to wait for the save (for a duplicate,
+        the first copy; for a stale save, the newer ones) to be written. seq 0 always logs."""
         with self.lock:
-            with open(self.filename, 'w') as f:
-                f.write(session_data_json)
+            verdict = self.check(game_id, seq, request_id)
+            if verdict == "duplicate":
+                return verdict, self.recent_requests[request_id][2]
+            if verdict == "stale":
+                return verdict, self.logged
+            record = (game_id, seq, session_data_json)
+            self.pending.append(record)
+            self.logged += 1
+            if len(self.pending) >= FLUSH_BATCH:
+                self.flush_due.notify()
+            self.apply(record, request_id, self.logged)
+            return verdict, self.logged
+
+    def apply(self, record, request_id, position):
+        """Make a logged or written save the current state (lock held)."""
+        game_id, seq, session_data_json = record
+        if seq:
+            if seq < self.game_seqs.get(game_id, 0):
+                return  # A newer save was logged while this one was being written
+            self.game_seqs[game_id] = seq
+        if request_id:
+            self.recent_requests[request_id] = (game_id, seq, position)
+            if len(self.recent_requests) > RECENT_REQUESTS:
+                del self.recent_requests[next(iter(self.recent_requests))]
+        self.version += 1
+        self.game_id, self.seq, self.session_data_json = record
+        self.updated.notify_all()
+
+    def flush(self, position=None):
+        """Write every logged save to the engine as one batch. With position, return at once if the
+        save logged there is written already: saves logged while another flush was running wait for
+        the flush lock together, and the first to get it writes them all (group commit). A failed
+        write raises here, and in every later flush until the saves are written."""
+        with self.flush_lock:
+            with self.lock:
+                if position is not None and self.flushed >= position:
+                    return
+                batch, self.pending = self.pending, []
+                logged = self.logged
+            self.write(batch, requeue=batch)
+            with self.lock:
+                self.flushed = logged
+
+    def write(self, records, requeue):
+        """Write records to the engine in one batch (flush lock held). If that fails, the logged
+        saves in requeue go back to the front of the log for the next flush."""
+        if not records:
+            return
+        started = time.perf_counter()
+        try:
+            self.engine.write_batch(records)
+        except Exception:
+            with self.lock:
+                self.pending = requeue + self.pending
+            raise
+        STORE_WRITE_SECONDS.observe(time.perf_counter() - started)
+        STORE_BATCH_RECORDS.observe(len(records))
+
+    def run_flusher(self):
+        """Flush every FLUSH_INTERVAL seconds, or as soon as FLUSH_BATCH saves are logged; runs forever."""
+        while True:
+            with self.lock:
+                self.flush_due.wait_for(lambda: len(self.pending) >= FLUSH_BATCH, timeout=FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                log.error("Writing logged saves to storage failed: %s", e)
+                time.sleep(FLUSH_INTERVAL)
+
+    def load(self):
+        """The state saved last, or None."""
+        with self.lock:
+            return self.session_data_json
+
+    def load_game(self, game_id=""):
+        """(game_id, seq, session_data_json) of game_id, or of the game saved last if it is empty; None if there is none."""
+        with self.lock:
+            if self.session_data_json is not None and game_id in ("", self.game_id):
+                return self.game_id, self.seq, self.session_data_json
+        self.flush()  # An older game's last state may only be logged so far
+        return self.engine.load(game_id) if game_id else None
+
+    def history(self, game_id, after=0, limit=50):
+        """A page of game_id's history from the engine (see StorageEngine.history)."""
+        self.flush()
+        return self.engine.history(game_id, after, limit)
+
+    def wait_for_update(self, after_version, timeout):
+        """Wait until a state newer than after_version is saved. Returns (version, json) or None."""
+        with self.lock:
+            self.updated.wait_for(lambda: self.version > after_version, timeout=timeout)
+            if self.version > after_version:
+                return self.version, self.session_data_json
+            return None
 
 # -------------------------
-# Health Service: for simple pinging.
+# Health Service: for simple pinging. Pings that carry a leader_id are lease
+# requests and are answered by the LeaderElection.
 # -------------------------
 class HealthService(chat_pb2_grpc.HealthServicer):
+    def __init__(self, election=None):
+        self.election = election
+
     def Ping(self, request, context):
-        return chat_pb2.PingResponse(alive=True)
+        if self.election is None:
+            return chat_pb2.PingResponse(alive=True)
+        return self.election.handle_ping(request)
 
 # -------------------------
-# LeaderElection: fixed ordering by server_id.
+# LeaderElection: fixed ordering by server_id, with terms and leases.
+# The lowest live server is the leader candidate. It claims a new term and
+# only acts as leader while a majority of the cluster has granted it a lease,
+# renewed on every heartbeat. A server that granted a lease won't grant
+# another leader one until it runs out, so a partitioned old leader loses its
+# lease before anyone else can get one. Replicas refuse writes from older terms
+# and from any server but the one they granted their lease in the write's term.
+# A server that fails and comes back rejoins the ordering.
 # -------------------------
 class LeaderElection:
     def __init__(self, server_id, peers):
@@ -46,53 +239,151 @@ class LeaderElection:
         self.leader_id = None
         self.lock = threading.Lock()
         # Initially, we assume peers are not up.
-        self.peer_status = {pid: False for pid, _ in peers}
-        # Track if a peer has ever been seen alive.
-        self.peer_ever_alive = {pid: False for pid, _ in peers}
-    def ping_peer(self, address):
+        self.peer_status = {pid: False for pid, _ in peers}  # Answered the last heartbeat
+        self.quorum = (len(peers) + 1) // 2 + 1  # Majority of the whole cluster
+        self.term = 0  # Highest term seen
+        self.lease_expiry = 0  # Leader: monotonic time our lease runs out
+        self.granted_leader = None  # Follower: who we promised a lease to...
+        self.granted_term = 0  # ...for which term...
+        self.granted_until = 0  # ...and until when (monotonic)
+        self.claiming = False  # Whether we're currently claiming leadership
+
+    def ping_peer(self, address, request=None):
         try:
             channel = grpc.insecure_channel(address)
             stub = chat_pb2_grpc.HealthStub(channel)
-            resp = stub.Ping(chat_pb2.PingRequest(), timeout=1)
-            return resp.alive
+            return stub.Ping(request or chat_pb2.PingRequest(), timeout=1)
         except Exception:
-            return False
+            return None
+
+    def handle_ping(self, request):
+        """Answer a peer's ping, granting its lease request if it's for a current term
+        and we haven't promised the lease to another leader."""
+        with self.lock:
+            if not request.leader_id:
+                return chat_pb2.PingResponse(alive=True, term=self.term)
+            now = time.monotonic()
+            if request.term < self.term:
+                return chat_pb2.PingResponse(alive=True, term=self.term, lease_granted=False)
+            if self.granted_leader not in (None, request.leader_id) and now < self.granted_until:
+                return chat_pb2.PingResponse(alive=True, term=max(self.term, request.term), lease_granted=False)
+            if request.term > self.term and self.state == "leader":
+                log.warning("Server %s: stepping down, term %s > %s", self.server_id, request.term, self.term)
+                self._become("backup")
+                self.lease_expiry = 0
+                self.claiming = False
+            self.term = request.term
+            self.granted_leader = request.leader_id
+            self.granted_term = request.term
+            self.granted_until = now + LEASE_DURATION
+            return chat_pb2.PingResponse(alive=True, term=self.term, lease_granted=True)
+
+    def observe_term(self, term):
+        """Step down if a peer reports a newer term than ours."""
+        with self.lock:
+            if term > self.term:
+                if self.state == "leader":
+                    log.warning("Server %s: stepping down, term %s > %s", self.server_id, term, self.term)
+                self.term = term
+                self._become("backup")
+                self.lease_expiry = 0
+                self.claiming = False
+
+    def accepts_write(self, term, leader_id):
+        """Whether a replicated write from leader_id in term may be applied: not from an older
+        term, nor from another server than the one we granted our lease (or lead) in that term."""
+        with self.lock:
+            if term < self.term:
+                return False
+            if term == self.term and self.granted_term == term and self.granted_leader != leader_id:
+                return False
+        self.observe_term(term)
+        return True
+
+    def _become(self, state):
+        """Change state (lock held), counting and logging real transitions."""
+        if state != self.state:
+            ELECTION_TRANSITIONS.inc(state=state)
+            log.info("Server %s: %s -> %s (term %s)", self.server_id, self.state, state, self.term)
+        self.state = state
+
+    def has_lease(self):
+        """True while this server is the leader and its lease hasn't run out."""
+        with self.lock:
+            return self.state == "leader" and time.monotonic() < self.lease_expiry
+
+    def leader_address(self):
+        """host:port of the current leader, from the last heartbeat (no pinging)."""
+        with self.lock:
+            leader_id = self.leader_id or self.server_id
+        return all_host_port_pairs[leader_id - 1]
 
     def elect(self):
         with self.lock:
+            # Claim leadership if we were the lowest live server last round
+            lower_alive = any(self.peer_status[pid] for pid in self.peer_status if pid < self.server_id)
+            claiming = not lower_alive
+            if claiming and not self.claiming:
+                self.term += 1  # New leadership, new term
+            if self.claiming and not claiming and self.state != "leader" and self.granted_leader == self.server_id:
+                self.granted_leader = None  # Never led on our own lease, so it can go to the lower server now
+            self.claiming = claiming
+            term = self.term
+            now = time.monotonic()
+            # A claimant grants its own lease first, so it won't grant it to another claimant too
+            self_granted = claiming and (self.granted_leader in (None, self.server_id) or now >= self.granted_until)
+            if self_granted:
+                self.granted_leader, self.granted_term = self.server_id, term
+                self.granted_until = now + LEASE_DURATION
+        round_start = time.monotonic()
+        request = chat_pb2.PingRequest(term=term, leader_id=self.server_id if claiming else 0)
+        # Ping outside the lock: peers pinging us at the same time need it to answer
+        responses = {pid: self.ping_peer(addr, request) for pid, addr in self.peers}
+
+        with self.lock:
+            grants = 1 if self_granted else 0
+            highest_term = term
             for pid, addr in self.peers:
-                is_alive = self.ping_peer(addr)
-                # If never seen alive, update status based on ping.
-                if not self.peer_ever_alive[pid]:
+                resp = responses[pid]
+                is_alive = resp is not None and resp.alive
+                if resp is not None:
+                    highest_term = max(highest_term, resp.term)
+                    if claiming and resp.lease_granted:
+                        grants += 1
+                # A failed server may come back; the leases keep its return safe
+                if is_alive != self.peer_status[pid]:
                     if is_alive:
-                        self.peer_status[pid] = True
-                        self.peer_ever_alive[pid] = True
+                        log.info("Server %s is up.", pid)
                     else:
-                        self.peer_status[pid] = False
-                else:
-                    # If seen before, once it fails, mark as permanently dead.
-                    if not is_alive:
-                        if self.peer_status[pid] is True:
-                            print(f"Server {pid} has died and cannot come back.")
-                        self.peer_status[pid] = False
+                        log.warning("Server %s is down.", pid)
+                self.peer_status[pid] = is_alive
+
+            log.debug("Peer status: %s", self.peer_status)
 
-            print(self.peer_status)
+            if highest_term > self.term:
+                # Someone is ahead of us, catch up and claim a newer term next round
+                self.term = highest_term
+                self._become("backup")
+                self.lease_expiry = 0
+                self.claiming = False
+            elif claiming and grants >= self.quorum:
+                self._become("leader")
+                self.lease_expiry = round_start + LEASE_DURATION
+            else:
+                self._become("backup")
 
             # Derive lower_alive from peer_status
             lower_alive = any(self.peer_status[pid] for pid in self.peer_status if pid < self.server_id)
-
-            # lower_alive = any(self.ping_peer(addr) for pid, addr in self.peers if pid < self.server_id)
-            if not lower_alive:
-                self.state = "leader"
+            if self.state == "leader" or not lower_alive:
+                # Leader, or the candidate still gathering its lease
                 self.leader_id = self.server_id
             else:
-                self.state = "backup"
                 candidate = self.server_id
                 for pid, addr in self.peers:
                     if self.peer_status.get(pid, False):    
                         candidate = min(candidate, pid)
                 self.leader_id = candidate
-            print(f"Server {self.server_id}: state={self.state}, leader={self.leader_id}")
+            log.debug("Server %s: state=%s, leader=%s, term=%s", self.server_id, self.state, self.leader_id, self.term)
             return all_host_port_pairs[self.leader_id - 1] # return host:port of leader
 
     def start(self):
@@ -125,58 +416,115 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         ack_count = 1  # Leader's own write counts.
         for pid, addr in self.peers:
             if not self.election.peer_status.get(pid, True):
-                print(f"[REPL] Skipping peer {pid} at {addr} (marked down).")
+                log.debug("[REPL] Skipping peer %s at %s (marked down).", pid, addr)
                 continue
-            try:
-                print(f"[REPL] Attempting replication to peer {pid} at {addr} using method {method}.")
-                channel = grpc.insecure_channel(addr)
-                stub = chat_pb2_grpc.ReplicationServiceStub(channel)
-                response = getattr(stub, method)(rep_req, timeout=2)
-                if response.success:
-                    print(f"[REPL] Peer {pid} at {addr} acknowledged replication.")
-                    ack_count += 1
-                else:
-                    print(f"[REPL] Peer {pid} at {addr} did NOT acknowledge replication.")
-            except Exception as e:
-                print(f"[REPL] Replication error to peer {pid} at {addr}: {e}")
+            with tracer.start_span(f"{method} -> server {pid}", attributes={"peer": pid}) as span:
+                started = time.perf_counter()
+                result = "error"
+                try:
+                    log.debug("[REPL] Attempting replication to peer %s at %s using method %s.", pid, addr, method)
+                    channel = grpc.insecure_channel(addr)
+                    stub = chat_pb2_grpc.ReplicationServiceStub(channel)
+                    response = getattr(stub, method)(rep_req, timeout=2, metadata=tracer.grpc_metadata())
+                    span.set_attribute("acked", response.success)
+                    if response.success:
+                        log.debug("[REPL] Peer %s at %s acknowledged replication.", pid, addr)
+                        result = "acked"
+                        ack_count += 1
+                    else:
+                        log.warning("[REPL] Peer %s at %s did NOT acknowledge replication.", pid, addr)
+                        result = "refused"
+                        self.election.observe_term(response.term)
+                except Exception as e:
+                    span.error = str(e)
+                    log.warning("[REPL] Replication error to peer %s at %s: %s", pid, addr, e)
+                REPLICATION_PEER_SECONDS.observe(time.perf_counter() - started, peer=pid, result=result)
         return ack_count
     
     def SaveGameState(self, request, context):
         """
-            Save Game State
+            Save Game State. Only accepted while this server holds the leader lease.
         """
-        session_data_json = request.session_data_json
-        self.store.save(session_data_json)
-        rep_req = chat_pb2.ReplicateSaveGameStateRequest(session_data_json=session_data_json)
-        ack_count = self.replicate_to_peers("ReplicateSaveGameState", rep_req)
-        if ack_count >= 2:
-            print(f"SAVED AND REPLICATED GAME STATE.")
-        else:
-            print(f"GAME STATE REPLICATION FAILED.")
-        return chat_pb2.SaveGameStateResponse(success = True)
+        with tracer.start_span("ChatService.SaveGameState", parent=tracer.context_from_grpc(context),
+                               attributes={"server": self.server_id, "bytes": len(request.session_data_json)}) as span:
+            if not self.election.has_lease():
+                span.set_attribute("rejected", "no lease")
+                SAVES.inc(result="no_lease")
+                return chat_pb2.SaveGameStateResponse(success=False, error_message=f"Server {self.server_id} does not hold the leader lease.")
+            started = time.perf_counter()
+            session_data_json = request.session_data_json
+            SNAPSHOT_BYTES.observe(len(session_data_json))
+            span.set_attribute("seq", request.seq)
+            with tracer.start_span("store.save"):
+                verdict = self.store.save(session_data_json, request.game_id, request.seq, request.request_id)
+            committed_seq = self.store.committed_seq(request.game_id)
+            if verdict == "duplicate":
+                # Not written again, but replicated again: the first attempt may have failed before a quorum had it
+                log.debug("Retried save %s of game %s is stored already, replicating it again.", request.seq, request.game_id)
+            if verdict == "stale":
+                span.set_attribute("rejected", "stale seq")
+                SAVES.inc(result="stale")
+                log.warning("Refused save %s of game %s, %s is already stored.", request.seq, request.game_id, committed_seq)
+                return chat_pb2.SaveGameStateResponse(success=False, committed_seq=committed_seq,
+                                                      error_message=f"Save {request.seq} is older than save {committed_seq} of this game.")
+            rep_req = chat_pb2.ReplicateSaveGameStateRequest(session_data_json=session_data_json,
+                                                             term=self.election.term,
+                                                             leader_id=self.server_id,
+                                                             game_id=request.game_id,
+                                                             seq=request.seq,
+                                                             request_id=request.request_id)
+            with tracer.start_span("replicate_to_peers") as replication:
+                ack_count = self.replicate_to_peers("ReplicateSaveGameState", rep_req)
+                replication.set_attribute("acks", ack_count)
+            REPLICATION_ACKS.observe(ack_count)
+            SAVE_SECONDS.observe(time.perf_counter() - started)
+            if ack_count >= self.election.quorum:
+                SAVES.inc(result="duplicate" if verdict == "duplicate" else "replicated")
+                log.debug("Saved and replicated game state (%s acks).", ack_count)
+            else:
+                SAVES.inc(result="under_replicated")
+                log.warning("Game state replication failed: %s acks, quorum %s.", ack_count, self.election.quorum)
+            return chat_pb2.SaveGameStateResponse(success = True, committed_seq=committed_seq,
+                                                  duplicate=verdict == "duplicate")
     
     def GetLeaderInfo(self, request, context):
         """
             Allows client to access the host and port information of the leader
         """
-        return chat_pb2.GetLeaderInfoResponse(info=self.election.elect())
+        # Answered from the last heartbeat: the leader holds a lease, no need to re-ping
+        return chat_pb2.GetLeaderInfoResponse(info=self.election.leader_address(), term=self.election.term)
     
     def LoadGameState(self, request, context):
         print(f"Server {self.server_id}: LoadGameState called by {context.peer()}")
-        try:
-            with self.store.lock: # Use the persistent store's lock
-                if os.path.exists(self.store.filename):
-                    with open(self.store.filename, 'r') as f:
-                        session_data_json = f.read()
-                    print(f"Server {self.server_id}: Successfully loaded state from {self.store.filename}")
-                    return chat_pb2.LoadGameStateResponse(success=True, session_data_json=session_data_json)
-                else:
-                    print(f"Server {self.server_id}: State file {self.store.filename} not found.")
-                    return chat_pb2.LoadGameStateResponse(success=False, error_message=f"State file {self.store.filename} not found.")
-        except Exception as e:
-            error_msg = f"Error loading game state from {self.store.filename}: {e}"
-            print(f"Server {self.server_id}: {error_msg}")
-            return chat_pb2.LoadGameStateResponse(success=False, error_message=error_msg)
+        stored = self.store.load_game(request.game_id)
+        if stored is None:
+            print(f"Server {self.server_id}: No game state saved yet.")
+            return chat_pb2.LoadGameStateResponse(success=False, error_message=f"Server {self.server_id} has no saved game state.")
+        print(f"Server {self.server_id}: Successfully loaded game state")
+        game_id, seq, session_data_json = stored
+        return chat_pb2.LoadGameStateResponse(success=True, session_data_json=session_data_json, game_id=game_id, seq=seq)
+
+    def GetGameHistory(self, request, context):
+        """
+            One page of a game's history, oldest first
+        """
+        entries = self.store.history(request.game_id, request.after, request.limit or 50)
+        return chat_pb2.GameHistoryResponse(entries=[chat_pb2.GameHistoryEntry(**entry) for entry in entries])
+
+    def WatchGameState(self, request, context):
+        """
+            Stream every committed game state after request.after_version, so
+            backup apps can keep a warm copy of the game
+        """
+        print(f"Server {self.server_id}: WatchGameState opened by {context.peer()}")
+        last_version = request.after_version
+        while context.is_active():
+            update = self.store.wait_for_update(last_version, WATCH_POLL_INTERVAL)
+            if update is None:
+                continue
+            last_version, session_data_json = update
+            yield chat_pb2.GameStateUpdate(version=last_version, session_data_json=session_data_json)
+        print(f"Server {self.server_id}: WatchGameState closed by {context.peer()}")
 
     def CheckVersion(self, request, context):
         if request.version != SERVER_VERSION:
@@ -188,14 +536,40 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
     
 # -------------------------
 # ReplicationService: Followers use this to replicate messages.
+# When a follower acknowledges a write depends on `ack`:
+#   "write": after writing it to storage on its own (slowest, one write per save)
+#   "flush": after the batch it joined was written (group commit: durable,
+#            and concurrent writes share one write)
+#   "log":   once it is in the in-memory log (fastest; a follower that crashes
+#            loses up to FLUSH_INTERVAL of writes, which the quorum still holds)
 # -------------------------
 class ReplicationService(chat_pb2_grpc.ReplicationServiceServicer):
-    def __init__(self, store):
+    def __init__(self, store, election=None, ack="write"):
         self.store = store
+        self.election = election
+        self.ack = ack
 
     def ReplicateSaveGameState(self, request, context):
-        self.store.save(request.session_data_json)
-        return chat_pb2.ReplicateSaveGameStateResponse(success=True)
+        with tracer.start_span("ReplicationService.ReplicateSaveGameState", parent=tracer.context_from_grpc(context),
+                               attributes={"term": request.term}) as span:
+            if self.election is not None and not self.election.accepts_write(request.term, request.leader_id):
+                # Write from a deposed leader, or from a server we didn't grant our lease this term
+                span.set_attribute("rejected", "not the lease holder")
+                REPLICA_WRITES.inc(result="rejected")
+                return chat_pb2.ReplicateSaveGameStateResponse(success=False, term=self.election.term)
+            with tracer.start_span("store.save" if self.ack == "write" else "store.log"):
+                if self.ack == "write":
+                    verdict = self.store.save(request.session_data_json, request.game_id, request.seq, request.request_id)
+                else:
+                    verdict, position = self.store.log(request.session_data_json, request.game_id, request.seq,
+                                                       request.request_id)
+            if self.ack == "flush":
+                # A retry waits for its first copy, a reordered write for the newer state, to be written
+                with tracer.start_span("store.flush"):
+                    self.store.flush(position)
+            # A retried or reordered write is acknowledged without being written: a newer state is already here
+            REPLICA_WRITES.inc(result="stored" if verdict == "store" else verdict)
+            return chat_pb2.ReplicateSaveGameStateResponse(success=True, term=request.term)
 
 def clear(ports):
     for server_id in ports.keys():
@@ -204,17 +578,79 @@ def clear(ports):
             os.remove(filename)
             print(f"Cleared {filename}")
 # -------------------------
+# On-demand profiling: `kill -USR1 <pid>` samples every thread of the live
+# server for PROFILE_SECONDS and writes profile_<id>_<time>.txt (collapsed
+# stacks, flame graph input) and profile_<id>_<time>.txt.top (a table of
+# functions). Signals are only allowed to local admins of the process.
+# -------------------------
+def install_profile_handler(server_id):
+    if not hasattr(signal, "SIGUSR1") or threading.current_thread() is not threading.main_thread():
+        return
+    running = threading.Lock()
+
+    def run(path):
+        try:
+            profile_to_file(path, PROFILE_SECONDS)
+            log.info("Profile written to %s", path)
+        except Exception as e:
+            log.error("Profiling failed: %s", e)
+        finally:
+            running.release()
+
+    def on_signal(signum, frame):
+        if not running.acquire(blocking=False):
+            log.warning("A profile is already running, ignoring SIGUSR1")
+            return
+        path = f"profile_{server_id}_{time.strftime('%Y%m%d-%H%M%S')}.txt"
+        log.info("Profiling for %s s into %s", PROFILE_SECONDS, path)
+        threading.Thread(target=run, args=(path,), daemon=True).start()
+
+    signal.signal(signal.SIGUSR1, on_signal)
+
+# -------------------------
+# Shutdown: atexit handlers don't run when a signal kills the process, so on
+# SIGTERM the logged saves are written first, then the signal is re-raised.
+# -------------------------
+def install_flush_handler(store):
+    if threading.current_thread() is not threading.main_thread():
+        return
+
+    def on_signal(signum, frame):
+        try:
+            store.flush()
+        except Exception as e:
+            log.error("Writing logged saves to storage failed at shutdown: %s", e)
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+    signal.signal(signal.SIGTERM, on_signal)
+
+# -------------------------
 # Main server function. Automatically spawn each server with its own JSON file.
 # -------------------------
-def serve(server_id, host, port, peers):
-    store = PersistentStore(f"users_{server_id}.json")
+def serve(server_id, host, port, peers, metrics_port=None, storage="json", storage_path=None, replica_ack="log",
+          fsync=False):
+    default_path = f"users_{server_id}.json" if storage == "json" else f"users_{server_id}.db"
+    store = PersistentStore(create_storage_engine(storage, storage_path or default_path, fsync))
+    if replica_ack == "log":
+        threading.Thread(target=store.run_flusher, daemon=True).start()
+        atexit.register(store.flush)
+        install_flush_handler(store)
     election = LeaderElection(server_id, peers)
     threading.Thread(target=election.start, daemon=True).start()
+    install_profile_handler(server_id)
+    if metrics_port:
+        metrics.gauge("spotit_backend_term", "Highest leader term seen", fn=lambda: election.term)
+        metrics.gauge("spotit_backend_is_leader", "1 while this server holds the leader lease",
+                      fn=lambda: int(election.has_lease()))
+        serve_metrics(metrics, metrics_port)
+        print(f"Server {server_id} metrics on http://127.0.0.1:{metrics_port}/metrics")
 
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    # Each backup app holds a WatchGameState stream open on a worker thread
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=32))
     chat_pb2_grpc.add_ChatServiceServicer_to_server(ChatService(store, election, peers), server)
-    chat_pb2_grpc.add_ReplicationServiceServicer_to_server(ReplicationService(store), server)
-    chat_pb2_grpc.add_HealthServicer_to_server(HealthService(), server)
+    chat_pb2_grpc.add_ReplicationServiceServicer_to_server(ReplicationService(store, election, replica_ack), server)
+    chat_pb2_grpc.add_HealthServicer_to_server(HealthService(election), server)
     # Bind on all interfaces so that external peers can connect:
     server.add_insecure_port(f"0.0.0.0:{port}")
     server.start()
@@ -244,25 +680,60 @@ def launch_servers():
 # run each server separately
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Start a specific server instance.")
-    parser.add_argument("--id", type=int, required=True, help="Server ID (1, 2, or 3)")
-    parser.add_argument("--all_ips", type=str, required=True,
-                        help="Comma-separated list of external IP addresses for all servers (order: server1,server2,server3)")
+    parser.add_argument("--id", type=int, required=True, help="Server ID (1..N)")
+    parser.add_argument("--all_ips", type=str, default=None,
+                        help="Comma-separated list of external IP addresses for all servers (order: server1,server2,...); server i listens on port 8000+i")
+    parser.add_argument("--cluster", type=str, default=None,
+                        help="Cluster topology JSON file with the host and port of every server (overrides --all_ips)")
+    parser.add_argument("--heartbeat_interval", type=float, default=HEARTBEAT_INTERVAL,
+                        help="Seconds between leader heartbeats; the leader lease lasts 2.5 heartbeats")
+    parser.add_argument("--metrics_port", type=int, default=None,
+                        help="Serve metrics in the Prometheus text format at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--log_level", type=str, default="INFO", help="DEBUG, INFO, WARNING or ERROR")
+    parser.add_argument("--trace_sample_rate", type=float, default=0.0,
+                        help="Fraction of calls without a caller's trace that are traced; the apps' sampling decisions are always followed")
+    parser.add_argument("--trace_file", type=str, default=None,
+                        help="JSONL file spans are written to (default: traces_<id>.jsonl)")
+    parser.add_argument("--storage", choices=["json", "sqlite"], default="json",
+                        help="json: the latest state in users_<id>.json, cleared at startup; "
+                             "sqlite: every game and its history in users_<id>.db (WAL mode), kept across restarts")
+    parser.add_argument("--storage_path", type=str, default=None, help="File of the storage engine")
+    parser.add_argument("--replica_ack", choices=["write", "flush", "log"], default="log",
+                        help="When a follower acknowledges a replicated save: after writing it alone (write), "
+                             "after writing the batch it joined (flush), or once it is logged in memory (log)")
+    parser.add_argument("--fsync", action="store_true",
+                        help="Make every write to storage reach the disk (fsync) before it counts as written")
+    parser.add_argument("--flush_interval", type=float, default=FLUSH_INTERVAL,
+                        help="Seconds between batched writes of logged replica saves")
+    parser.add_argument("--flush_batch", type=int, default=FLUSH_BATCH,
+                        help="Logged replica saves that trigger a batched write early")
+    parser.add_argument("--profile_seconds", type=float, default=PROFILE_SECONDS,
+                        help="Seconds sampled when the server receives SIGUSR1")
     
     args = parser.parse_args()
+    configure_logging(args.log_level)
+    tracer.sample_rate = args.trace_sample_rate
+    tracer.exporters.append(JsonlExporter(args.trace_file or f"traces_{args.id}.jsonl"))
+    HEARTBEAT_INTERVAL = args.heartbeat_interval
+    LEASE_DURATION = 2.5 * HEARTBEAT_INTERVAL
+    PROFILE_SECONDS = args.profile_seconds
+    FLUSH_INTERVAL = args.flush_interval
+    FLUSH_BATCH = args.flush_batch
+    if args.cluster:
+        cluster = load_cluster_config(args.cluster)
+    elif args.all_ips:
+        cluster = cluster_from_ips(args.all_ips)
+    else:
+        parser.error("one of --cluster or --all_ips is required")
 
-    # Parse the IPs:
-    all_ips = args.all_ips.split(",")
-    host = all_ips[args.id - 1]  # External IP of this server
-    # Build peers list and for all servers: each peer is a tuple (peer_id, "peer_ip:peer_port")
-    peers = []
-    for i in range(len(all_ips)):
-        if (i+1) != args.id:
-            peers.append((i+1, f"{all_ips[i]}:{ports[i+1]}"))
-        all_host_port_pairs.append(f"{all_ips[i]}:{ports[i+1]}")
-    
-    if args.id not in ports:
-        print(f"Invalid server ID {args.id}. Choose from {list(ports.keys())}.")
+    all_host_port_pairs.extend(cluster.backend_addresses())
+    if not 1 <= args.id <= len(cluster.backends):
+        print(f"Invalid server ID {args.id}. Choose from 1..{len(cluster.backends)}.")
     else:
         server_id = args.id
-        port = ports[server_id]
-        serve(server_id, host, port, peers)
+        node = cluster.backend(server_id)  # External IP and port of this server
+        # Build peers list: each peer is a tuple (peer_id, "peer_ip:peer_port")
+        peers = cluster.backend_peers(server_id)
+        print(f"Server {server_id}: cluster of {len(cluster.backends)} servers, write quorum {cluster.quorum}")
+        serve(server_id, node['host'], node['port'], peers, args.metrics_port, args.storage, args.storage_path,
+              args.replica_ack, args.fsync)
@@ -0,0 +1,148 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# -------------------------
+# SharedState: state shared by every worker process of one frontend host.
+# Values are JSON documents stored under a key with a version number that is
+# bumped on every put, so a worker can tell whether its copy is stale.
+# -------------------------
+class SharedState:
+    def lock(self):
+        """Context manager giving exclusive access across all workers."""
+        raise NotImplementedError
+
+    def get(self, key):
+        """Return (version, value) for key, or (0, None) if it was never set."""
+        raise NotImplementedError
+
+    def version(self, key):
+        """Return the version of key without reading its value, 0 if it was never set."""
+        raise NotImplementedError
+
+    def put(self, key, value):
+        """Store value under key and return its new version."""
+        raise NotImplementedError
+
+# -------------------------
+# InProcessSharedState: single worker, everything lives in a dict.
+# -------------------------
+class InProcessSharedState(SharedState):
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data = {}
+
+    @contextmanager
+    def lock(self):
+        with self._lock:
+            yield
+
+    def get(self, key):
+        with self._lock:
+            return self._data.get(key, (0, None))
+
+    def version(self, key):
+        with self._lock:
+            return self._data.get(key, (0, None))[0]
+
+    def put(self, key, value):
+        with self._lock:
+            version = self._data.get(key, (0, None))[0] + 1
+            self._data[key] = (version, value)
+            return version
+
+# -------------------------
+# SQLiteSharedState: a local SQLite file that all workers on the host open.
+# lock() holds a write transaction (BEGIN IMMEDIATE), which SQLite makes
+# exclusive across processes; a process-local RLock makes it re-entrant.
+# get() and version() outside lock() read the last committed value (WAL
+# readers don't wait for the writer), so read-only callers skip the lock.
+# -------------------------
+class SQLiteSharedState(SharedState):
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS shared_state ("
+                "key TEXT PRIMARY KEY, version INTEGER NOT NULL, value TEXT)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+
+    def _conn(self):
+        # Connections can't cross fork() or threads, so keep one per thread per pid.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def lock(self):
+        with self._lock:
+            conn = self._conn()
+            outermost = self._local.depth == 0
+            if outermost:
+                conn.execute("BEGIN IMMEDIATE")
+            self._local.depth += 1
+            try:
+                yield
+            except BaseException:
+                self._local.depth -= 1
+                if outermost:
+                    conn.execute("ROLLBACK")
+                raise
+            else:
+                self._local.depth -= 1
+                if outermost:
+                    conn.execute("COMMIT")
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT version, value FROM shared_state WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return 0, None
+        return row[0], json.loads(row[1])
+
+    def version(self, key):
+        row = self._conn().execute("SELECT version FROM shared_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def put(self, key, value):
+        with self.lock():
+            conn = self._conn()
+            row = conn.execute("SELECT version FROM shared_state WHERE key = ?", (key,)).fetchone()
+            version = (row[0] if row else 0) + 1
+            conn.execute(
+                "INSERT OR REPLACE INTO shared_state (key, version, value) VALUES (?, ?, ?)",
+                (key, version, json.dumps(value)),
+            )
+            return version
+
+def create_shared_state(backend, path=None):
+    """Build the shared state implementation selected on the command line.
+
+    Like the backend's PersistentStore, a SQLite file left over from an earlier
+    run is cleared so workers never resume a stale game.
+    """
+    if backend == "memory":
+        return InProcessSharedState()
+    if backend == "sqlite":
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        return SQLiteSharedState(path)
+    raise ValueError(f"Unknown shared state backend: {backend}")
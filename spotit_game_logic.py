@@ -1,6 +1,10 @@
 import random
 import sympy
 from collections import deque
+from functools import lru_cache
+from logs import get_logger
+
+log = get_logger("game")
 
 ALL_EMOJIS = [
     "😀", "😂", "🥰", "😎", "😭", "😡", "👍", "👄", "🙏", "💪", 
@@ -11,9 +15,22 @@ ALL_EMOJIS = [
     "🛌", "👅", "🛬", "📷", "🎥", "🧸", "💎"
 ]
 
-def generate_cards():
-    q = 7
-    F = sympy.GF(q)
+def generate_cards(seed=None, q=7):
+    """Build the q**2 + q + 1 cards of a Spot It deck of order q (a prime), each
+    with q + 1 symbols. The same seed always gives the same symbol sizes,
+    rotations and positions, so a deck can be rebuilt from (seed, q) alone."""
+    if seed is None:
+        seed = random.randrange(2**32)
+    return [[dict(e) for e in card] for card in _deck_layout(seed, q)]
+
+@lru_cache(maxsize=8)
+def _deck_layout(seed, q):
+    # Building the projective plane is slow (~0.2 s), and every state load
+    # rebuilds its deck, so keep recent decks around as templates that
+    # generate_cards copies before handing out.
+    if q**2 + q + 1 > len(ALL_EMOJIS):
+        raise ValueError(f"Not enough symbols for a deck of order {q}")
+    rng = random.Random(seed)
     points = []
     for x in range(q):
         for y in range(q):
@@ -41,18 +58,18 @@ def generate_cards():
                 if (a, b, c) != (0, 0, 0):
                     line = []
                     i = 0
-                    indices = list(range(8))
-                    random.shuffle(indices)
+                    indices = list(range(q + 1))
+                    rng.shuffle(indices)
                     for emoji_id, (x, y, z) in enumerate(norm_points):
                         if (a * x + b * y + c * z) % q == 0:
                             e = {}
                             e['emoji'] = ALL_EMOJIS[emoji_id]
-                            e['size'] = random.randint(20, 80)
-                            e['rotation'] = random.randint(0, 360)
+                            e['size'] = rng.randint(20, 80)
+                            e['rotation'] = rng.randint(0, 360)
                             e['index'] = indices[i]
                             line.append(e)
                             i += 1
-                    if i == 8:
+                    if i == q + 1:
                         lines.append(line)
     seen = set()
     unique_lines = []
@@ -61,20 +78,24 @@ def generate_cards():
         if signature not in seen:
             seen.add(signature)
             unique_lines.append(line)
-    lines = unique_lines
-    return lines
+    return tuple(unique_lines)
 
-def shuffle_cards(cards):
-    random.shuffle(cards)
+def shuffle_cards(cards, seed=None):
+    """Shuffle cards in place; with a seed the order is reproducible."""
+    rng = random.Random(seed) if seed is not None else random
+    rng.shuffle(cards)
     return cards
 
 class SpotItGame:
-    def __init__(self, player_names, initial_cards=None, initial_cards_pile=None, initial_scores=None):
+    def __init__(self, player_names, initial_cards=None, initial_cards_pile=None, initial_scores=None,
+                 seed=None, q=7):
         self.player_names = player_names
         self.n_players = len(player_names)
-
+        self.q = q
+        self.seed = seed if seed is not None else random.randrange(2**32)
         if initial_cards is not None and initial_cards_pile is not None and initial_scores is not None:
-            # Load from initial state
+            # Load from a legacy snapshot that carried the full deck
+            self.seed = None  # This deck can't be rebuilt from a seed
             self.cards = initial_cards
             # Convert player ID keys back to int if they are strings, handle 'center'
             self.cards_pile = {int(k) if k.isdigit() else k: v for k, v in initial_cards_pile.items()}
@@ -82,17 +103,43 @@ class SpotItGame:
             if 'center' in self.cards_pile and isinstance(self.cards_pile['center'], list):
                  self.cards_pile['center'] = deque(self.cards_pile['center'])
             self.scores = initial_scores
-            print("[SpotItGame] Initialized from loaded state.") # Added log
+            log.debug("[SpotItGame] Initialized from loaded state.")
         else:
             # Initialize new game state
-            self.cards = shuffle_cards(generate_cards())
+            self.cards = shuffle_cards(generate_cards(self.seed, q), self.seed)
             self.cards_pile = {player_id: [self.cards[player_id]] for player_id in range(self.n_players)}
             self.cards_pile['center'] = deque(self.cards[self.n_players:])
             self.scores = [0] * self.n_players
-            print("[SpotItGame] Initialized new game state.") # Added log
+            log.debug("[SpotItGame] Initialized new game state.")
 
         self.last_clicked_player_emoji = None
         self.last_clicked_center_emoji = None
+        self._card_ids = None
+
+    @classmethod
+    def from_card_ids(cls, player_names, seed, q, pile_ids, scores):
+        """Rebuild a game from its seed and the card IDs in each pile."""
+        game = cls(player_names, seed=seed, q=q)
+        game.cards_pile = {int(k) if str(k).isdigit() else k: [game.cards[i] for i in ids]
+                           for k, ids in pile_ids.items()}
+        game.cards_pile['center'] = deque(game.cards_pile.get('center', []))
+        game.scores = list(scores)
+        return game
+
+    @property
+    def deck_id(self):
+        """Identifies the deck layout; the same for every process playing this game."""
+        return f"{self.seed}-{self.q}"
+
+    def pile_ids(self):
+        """Card IDs in every pile, which together with the seed is the whole deal."""
+        return {str(k): [self.card_id(c) for c in pile] for k, pile in self.cards_pile.items()}
+
+    def card_id(self, card):
+        """Position of card in the deck; rotating a card doesn't change its ID."""
+        if self._card_ids is None:
+            self._card_ids = {frozenset(e['emoji'] for e in c): i for i, c in enumerate(self.cards)}
+        return self._card_ids.get(frozenset(e['emoji'] for e in card))
 
     def get_player_center_emojis(self, player_id):
         return {
@@ -13,9 +13,123 @@
 let selectedPlayerEmoji = null;
 let selectedCenterEmoji = null;
 
-// Track last fetched emojis to avoid unnecessary re-renders
-let lastPlayerData = null;
-let lastCenterData = null;
+// Track last fetched cards to avoid unnecessary re-renders
+let lastCardsKey = null;
+
+// Client features: the server renders its choice into the game page
+// (window.SPOTIT_CONFIG), and a query flag such as ?compact=0 or ?optimistic=0
+// overrides it
+function clientFlag(name, fallback) {
+  const param = new URLSearchParams(window.location.search).get(name);
+  if (param !== null) return param !== '0' && param !== 'false';
+  const config = window.SPOTIT_CONFIG || {};
+  return config[name] !== undefined ? config[name] : fallback;
+}
+
+// Notches the player's card is turned clockwise. Rotation happens here in the
+// browser; the server only remembers the offset (see rotate())
+let playerRotation = 0;
+let renderedPlayerCard = null;
+
+// Optimistic matches: the browser judges a pair itself, shows the result at
+// once and sends a single claim tagged with the state_version of the cards it
+// showed; the server accepts it or answers with the current cards. Without it
+// each click waits for /clickedPlayer or /clickedCenter
+const OPTIMISTIC_MATCHES = clientFlag('optimistic', true);
+let stateVersion = null;
+let shownCards = null;
+
+// Compact card format: responses name cards by ID and the deck layout is
+// fetched once per game from /deck and cached (see cardsFromResponse).
+// Without it every response carries the full symbol lists
+const COMPACT_CARDS = clientFlag('compact', true);
+const deckCache = {};
+
+function loadDeck(deckId) {
+  if (deckCache[deckId]) return Promise.resolve(deckCache[deckId]);
+  const stored = sessionStorage.getItem('spotit_deck_' + deckId);
+  if (stored) {
+    deckCache[deckId] = JSON.parse(stored);
+    return Promise.resolve(deckCache[deckId]);
+  }
+  return fetchWithSession('/deck')
+    .then(response => response.json())
+    .then(deck => {
+      if (!deck.deck_id) return null;
+      deckCache[deck.deck_id] = deck;
+      try {
+        sessionStorage.setItem('spotit_deck_' + deck.deck_id, JSON.stringify(deck));
+      } catch (e) {
+        // Storage full: the in-memory cache still works for this page
+      }
+      // A new game may have started since the response that asked for the deck
+      return deck.deck_id === deckId ? deck : null;
+    });
+}
+
+/** Expand a card ID into emoji objects */
+function expandCard(deck, cardId) {
+  return deck.cards[cardId].map(([symbol, size, rotation, index]) => ({
+    emoji: deck.symbols[symbol],
+    size: size,
+    rotation: rotation,
+    index: index
+  }));
+}
+
+/** True if a response carries cards, in either format */
+function hasCards(data) {
+  if (!data) return false;
+  if (data.deck_id !== undefined) return data.player_card !== undefined;
+  return Boolean(data.center_emojis && data.player_emojis);
+}
+
+/** Key that changes whenever the cards in a response change */
+function cardsKey(data) {
+  if (data.deck_id !== undefined) {
+    return [data.deck_id, data.player_card, data.center_card, data.center_emojis].join(':');
+  }
+  return JSON.stringify([data.player_emojis, data.center_emojis]);
+}
+
+/** Resolve a response to {player, center} emoji lists, or null if it has no cards */
+function cardsFromResponse(data) {
+  if (!hasCards(data)) return Promise.resolve(null);
+  if (data.deck_id === undefined) {
+    return Promise.resolve({
+      player: data.player_emojis,
+      center: data.center_emojis,
+      rotation: data.player_rotation || 0
+    });
+  }
+  return loadDeck(data.deck_id).then(deck => {
+    if (!deck) return null;
+    return {
+      player: expandCard(deck, data.player_card),
+      center: data.center_card === null ? data.center_emojis : expandCard(deck, data.center_card),
+      rotation: data.player_rotation || 0
+    };
+  });
+}
+
+/** Render the cards of a response once they are resolved */
+function renderCards(data) {
+  return cardsFromResponse(data).then(cards => {
+    if (cards && cards.center && cards.player) {
+      // Take the server's offset only for a card we haven't shown yet, so it
+      // can't undo a local rotation that is still on its way to the server
+      const playerCard = cards.player.map(e => e.emoji).sort().join('');
+      if (playerCard !== renderedPlayerCard) {
+        playerRotation = cards.rotation;
+        renderedPlayerCard = playerCard;
+      }
+      updateCard(cards.center, cards.player);
+      shownCards = cards;
+      if (data.state_version !== undefined) stateVersion = data.state_version;
+    }
+    return cards;
+  });
+}
 
 /** Re-apply persisted highlights after re-render */
 function applyHighlights() {
@@ -51,17 +165,22 @@ function arrangeEmoji(containerId) {
   const centerX = container.offsetWidth / 2;
   const centerY = container.offsetHeight / 2;
   const radius = container.offsetWidth / 2 - 60;
+  const notches = emojis.length - 1; // Symbols on the ring; index 0 is the middle
+  const steps = containerId === 'player-circle-container' ? playerRotation : 0;
 
   emojis.forEach((emoji) => {
-    const index = parseInt(emoji.getAttribute('data-index'));
+    const baseIndex = parseInt(emoji.getAttribute('data-index'));
+    const index = baseIndex === 0 ? 0 : ((baseIndex - 1 + steps) % notches) + 1;
+    const baseRotation = parseFloat(emoji.getAttribute('data-rotation')) || 0;
+    emoji.style.transform = `rotate(${baseRotation + steps * 360 / notches}deg)`;
 
     if (index === 0) {
       // center emoji
       emoji.style.left = `${centerX - emoji.offsetWidth / 2}px`;
       emoji.style.top = `${centerY - emoji.offsetHeight / 2}px`;
     } else {
-      // outer 7 emojis
-      let angle = (2 * Math.PI / 7) * (index - 1); // index 1-7
+      // outer emojis
+      let angle = (2 * Math.PI / notches) * (index - 1); // index 1-notches
       let x = centerX + radius * Math.cos(angle);
       let y = centerY + radius * Math.sin(angle);
 
@@ -94,7 +213,7 @@ function updateCard(newCenterEmojis, newPlayerEmojis) {
       span.className = 'emoji';
       span.setAttribute('data-index', e.index);
       span.style.fontSize = `${e.size}px`;
-      span.style.transform = `rotate(${e.rotation}deg)`;
+      span.setAttribute('data-rotation', e.rotation);
       span.onclick = () => emojiClicked(e.emoji, false);
       span.innerText = e.emoji;
       centerContainer.appendChild(span);
@@ -107,7 +226,7 @@ function updateCard(newCenterEmojis, newPlayerEmojis) {
     span.className = 'emoji';
     span.setAttribute('data-index', e.index);
     span.style.fontSize = `${e.size}px`;
-    span.style.transform = `rotate(${e.rotation}deg)`;
+    span.setAttribute('data-rotation', e.rotation);
     span.onclick = () => emojiClicked(e.emoji, true);
     span.innerText = e.emoji;
     playerContainer.appendChild(span);
@@ -153,7 +272,75 @@ function highlightEmoji(containerId, emojiChar) {
   });
 }
 
+function showToast(message) {
+  Swal.fire({
+    toast: true,
+    position: 'top',
+    showConfirmButton: false,
+    timer: 3000,
+    timerProgressBar: true,
+    icon: 'info',
+    title: message
+  });
+}
+
+/** Optimistic mode: judge the pair locally and only send the server a claim */
+function clickOptimistic(emoji, isPlayer) {
+  const containerId = isPlayer ? 'player-circle-container' : 'center-circle-container';
+  const other = isPlayer ? selectedCenterEmoji : selectedPlayerEmoji;
+  if (other === null) {
+    highlightEmoji(containerId, emoji);
+    return;
+  }
+
+  // Second half of a pair
+  const playerEmoji = isPlayer ? emoji : other;
+  const centerEmoji = isPlayer ? other : emoji;
+  selectedPlayerEmoji = null;
+  selectedCenterEmoji = null;
+  clearHighlights();
+  if (playerEmoji !== centerEmoji) {
+    showToast(`${playerEmoji} and ${centerEmoji} is not a match!`);
+    return;
+  }
+
+  showToast(`You found a match ${emoji}!`);
+  // Predict the outcome: the center card becomes the player's card and the
+  // next center card arrives with the server's answer
+  const claimedVersion = stateVersion;
+  if (shownCards && Array.isArray(shownCards.center)) {
+    playerRotation = 0;
+    renderedPlayerCard = shownCards.center.map(e => e.emoji).sort().join('');
+    updateCard([], shownCards.center);
+  }
+  fetchWithSession('/claim_match', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ emoji: emoji, state_version: claimedVersion })
+  })
+    .then(response => response.json())
+    .then(data => {
+      if (!data.accepted) {
+        showToast(data.message);
+      }
+      // Either way the answer carries the authoritative cards
+      renderedPlayerCard = null;
+      if (hasCards(data)) {
+        renderCards(data);
+        lastCardsKey = cardsKey(data);
+      }
+      if (data.names && data.scores) {
+        updateScoreboard(data.names, data.scores);
+      }
+    })
+    .catch(error => console.error('Claim error:', error));
+}
+
 function emojiClicked(emoji, isPlayer) {
+  if (OPTIMISTIC_MATCHES && stateVersion !== null) {
+    clickOptimistic(emoji, isPlayer);
+    return;
+  }
   addr = isPlayer ? '/clickedPlayer' : '/clickedCenter';
   containerId = isPlayer ? 'player-circle-container' : 'center-circle-container';
   fetchWithSession(addr, {
@@ -164,18 +351,10 @@ function emojiClicked(emoji, isPlayer) {
     .then(response => response.json())
     .then(data => { // for a nice popup message
       if (data && data.message) {
-        Swal.fire({
-          toast: true,
-          position: 'top',
-          showConfirmButton: false,
-          timer: 3000,
-          timerProgressBar: true,
-          icon: 'info',
-          title: data.message
-        });
+        showToast(data.message);
       }
-      if (data && data.center_emojis && data.player_emojis) {
-        updateCard(data.center_emojis, data.player_emojis);
+      if (hasCards(data)) {
+        renderCards(data);
       }
       // Handle highlight toggle and clear
       if (data && data.clear_highlight) {
@@ -212,14 +391,14 @@ function shuffle() {
           scrollbarPadding: false
         });
       }
-      else if (data && data.center_emojis && data.player_emojis) {
+      else if (hasCards(data)) {
         Swal.fire({ title: "Shuffled", icon: "success", scrollbarPadding: false });
         if (data.clear_highlight) {
           selectedPlayerEmoji = null;
           selectedCenterEmoji = null;
           clearHighlights();
         }
-        updateCard(data.center_emojis, data.player_emojis);
+        renderCards(data);
       }
     });
 }
@@ -248,21 +427,16 @@ function updateScoreboard(names, scores) {
 }
 
 function rotate(direction) {
+  const notches = document.querySelectorAll('#player-circle-container .emoji').length - 1;
+  if (notches < 1) return;
+  playerRotation = (playerRotation + (direction === 'clockwise' ? 1 : notches - 1)) % notches;
+  arrangeEmoji('player-circle-container');
+  // Only the offset goes to the server, without waiting for an answer
   fetchWithSession('/rotate', {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ direction: direction })
-  })
-    .then(response => response.json())
-    .then(data => { // for a nice popup message
-      if (data && data.center_emojis && data.player_emojis) {
-        // clearHighlights();
-        updateCard(data.center_emojis, data.player_emojis);
-      }
-      if (data && data.containerId && data.highlight) {
-        highlightEmoji(data.containerId, data.highlight)
-      }
-    });
+    body: JSON.stringify({ rotation: playerRotation })
+  }).catch(error => console.error('Rotate error:', error));
 }
 
 function promptUsername() {
@@ -323,8 +497,9 @@ function promptUsername() {
             // Update waiting count on page
             document.getElementById('waiting-count').textContent = waitingCount;
             
-            // Start polling for game status
-            pollGameStatus();
+            // Wait for the lobby to seat our room
+            sessionStorage.setItem('spotit_lobby_ticket', data.ticket);
+            waitForRoom(data.ticket);
           }
         } else {
           // Show error message
@@ -353,46 +528,66 @@ function promptUsername() {
   });
 }
 
-function pollGameStatus() {
-  // Poll the server every 2 seconds to check if all players have joined
-  const interval = setInterval(() => {
-    fetchWithSession('/check_game_status')
-      .then(response => response.json())
-      .then(data => {
-        if (data.game_ready) {
-          clearInterval(interval);
-          
-          // Show a message before redirecting
-          Swal.fire({
-            title: 'Game Starting!',
-            text: 'All players have joined. Starting the game...',
-            icon: 'success',
-            timer: 1500,
-            showConfirmButton: false
-          }).then(() => {
-            window.location.href = data.redirect;
-          });
-        } else {
-          // Update waiting count
-          if (data.waiting_count !== undefined) {
-            document.getElementById('waiting-count').textContent = data.waiting_count;
-            
-            // Update the Swal popup if it exists
-            if (Swal.isVisible()) {
-              Swal.update({
-                text: `Waiting for ${data.waiting_count} more players to join...`
-              });
-            }
-          }
-        }
-      })
-      .catch(error => console.error('Error checking game status:', error));
-  }, 2000);
-  
-  // Store the interval ID in sessionStorage so it persists across page refreshes
-  sessionStorage.setItem('pollingIntervalId', interval);
-  
-  return interval;
+// Lobby: long-poll /lobby/wait until our room is seated. Each answer carries
+// the lobby version it describes; the server holds the next request until the
+// lobby moves past it, or asks us to come back after retry_after seconds when
+// it has no thread free to wait
+let lobbyTicket = null;
+
+function waitForRoom(ticket, version) {
+  lobbyTicket = ticket;
+  let url = '/lobby/wait?ticket=' + encodeURIComponent(ticket);
+  if (version !== undefined) url += '&version=' + version;
+  fetchWithSession(url)
+    .then(response => response.json())
+    .then(data => {
+      if (ticket !== lobbyTicket) return;  // Joined again with a new ticket
+      handleLobbyStatus(data);
+      if (!data.game_ready) {
+        setTimeout(() => waitForRoom(ticket, data.version), (data.retry_after || 0) * 1000);
+      }
+    })
+    .catch(error => {
+      console.error('Error waiting for a room:', error);
+      if (ticket === lobbyTicket) {
+        setTimeout(() => waitForRoom(ticket, version), 2000);
+      }
+    });
+}
+
+function handleLobbyStatus(data) {
+  if (data.game_ready) {
+    sessionStorage.removeItem('spotit_lobby_ticket');
+    if (data.session_id) {
+      sessionStorage.setItem('spotit_session_id', data.session_id);
+    }
+    if (data.username) {
+      sessionStorage.setItem('spotit_username', data.username);
+    }
+    
+    // Show a message before redirecting
+    Swal.fire({
+      title: 'Game Starting!',
+      text: 'All players have joined. Starting the game...',
+      icon: 'success',
+      timer: 1500,
+      showConfirmButton: false
+    }).then(() => {
+      window.location.href = data.redirect;
+    });
+  } else if (data.waiting_count !== undefined) {
+    // Update waiting count
+    document.getElementById('waiting-count').textContent = data.waiting_count;
+    
+    // Update the Swal popup if it exists
+    if (Swal.isVisible() && data.username) {
+      Swal.update({
+        text: data.waiting_count > 0
+          ? `Waiting for ${data.waiting_count} more players to join...`
+          : `Your room is full, waiting for a free table (${data.rooms_ahead} rooms ahead)...`
+      });
+    }
+  }
 }
 
 // Handle voting to start a new game
@@ -672,21 +867,12 @@ document.addEventListener('DOMContentLoaded', function() {
     sessionStorage.removeItem('spotit_username');
     sessionStorage.removeItem('spotit_session_id');
     
-    // If we have URL parameters, check game status immediately
-    const urlParams = new URLSearchParams(window.location.search);
-    if (urlParams.get('check_game_status') === 'true') {
-      // Immediately check game status
-      fetchWithSession('/check_game_status')
-        .then(response => response.json())
-        .then(data => {
-          if (data.game_ready) {
-            window.location.href = data.redirect;
-          }
-        });
+    // Follow the lobby only after joining; a ticket from before a reload keeps our place.
+    // Without one the page shows the count it was rendered with
+    const ticket = sessionStorage.getItem('spotit_lobby_ticket');
+    if (ticket) {
+      waitForRoom(ticket);
     }
-    
-    // Start polling for game status automatically
-    pollGameStatus();
   }
 });
 
@@ -696,16 +882,23 @@ if (document.getElementById('player-circle-container')) {
     fetchWithSession('/game_state')
       .then(response => response.json())
       .then(data => {
-        const playerJson = JSON.stringify(data.player_emojis);
-        const centerJson = JSON.stringify(data.center_emojis);
-        if (playerJson !== lastPlayerData || centerJson !== lastCenterData) {
+        if (data.room_closed) {
+          // Our finished game gave the table to the next room
+          window.location.href = data.redirect;
+          return;
+        }
+        const key = cardsKey(data);
+        if (key !== lastCardsKey) {
           // Clear highlights on new card state
           selectedPlayerEmoji = null;
           selectedCenterEmoji = null;
           clearHighlights();
-          updateCard(data.center_emojis, data.player_emojis);
-          lastPlayerData = playerJson;
-          lastCenterData = centerJson;
+          if (hasCards(data)) {
+            renderCards(data);
+          }
+          lastCardsKey = key;
+        } else if (data.state_version !== undefined) {
+          stateVersion = data.state_version;
         }
         updateScoreboard(data.names, data.scores);
         
@@ -873,6 +1066,10 @@ function fetchWithSession(url, options = {}) {
     }
   }
   
+  if (COMPACT_CARDS) {
+    options.headers['X-Card-Format'] = 'compact';
+  }
+  
   // Add username to headers if available
   const username = sessionStorage.getItem('spotit_username');
   if (username) {
@@ -884,8 +1081,16 @@ function fetchWithSession(url, options = {}) {
   return fetch(url, options);
 }
 
-// Arrange the emojis once the page loads
-window.onload = arrangeEmojiForAll;
+// Arrange the emojis once the page loads, turned the way the player left them
+window.onload = function() {
+  const playerContainer = document.getElementById('player-circle-container');
+  if (playerContainer) {
+    playerRotation = parseInt(playerContainer.getAttribute('data-player-rotation')) || 0;
+    const version = parseInt(playerContainer.getAttribute('data-state-version'));
+    stateVersion = isNaN(version) ? null : version;
+  }
+  arrangeEmojiForAll();
+};
 
 // When a username is submitted
 document.addEventListener('DOMContentLoaded', function() {
@@ -934,8 +1139,9 @@ document.addEventListener('DOMContentLoaded', function() {
             document.getElementById('waiting-message').style.display = 'block';
             document.getElementById('username-form').style.display = 'none';
             
-            // Start polling for game status
-            pollGameStatus();
+            // Wait for the lobby to seat our room
+            sessionStorage.setItem('spotit_lobby_ticket', data.ticket);
+            waitForRoom(data.ticket);
           }
         } else {
           // Show error message
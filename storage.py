@@ -0,0 +1,224 @@
+import json
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from collections import deque
+import threading
+import time
+
+SCHEMA_VERSION = 2
+CHECKPOINT_EVERY = 50  # History keeps a game's whole state once per this many saves, only the event otherwise
+
+def history_event(session_data_json):
+    """The compact event (type, player, card IDs) a snapshot was saved for, as JSON; "{}" if it has none."""
+    try:
+        event = json.loads(session_data_json).get("event")
+    except (TypeError, ValueError, AttributeError):
+        event = None
+    return json.dumps(event or {})
+
+# -------------------------
+# StorageEngine: where a backend server keeps the saved states of its games.
+# A record is (game_id, seq, session_data_json); seq 0 marks a save without
+# a sequence number. Engines don't decide which saves to keep, the
+# PersistentStore in front of them does.
+# History is a bounded log of compact entries: the event each save was made
+# for, plus the whole state (a checkpoint) on every CHECKPOINT_EVERY-th save
+# of a game, so a page can be replayed from its last checkpoint.
+# -------------------------
+class StorageEngine(ABC):
+    _unchecked = None  # game_id -> saves since its last history checkpoint
+
+    @abstractmethod
+    def write_batch(self, records):
+        """Store records, oldest first, all or none."""
+
+    def write(self, game_id, seq, session_data_json):
+        self.write_batch([(game_id, seq, session_data_json)])
+
+    @abstractmethod
+    def load(self, game_id=None):
+        """(game_id, seq, session_data_json) of game_id, or of the last game written; None if there is none."""
+
+    @abstractmethod
+    def games(self):
+        """{game_id: seq of its current state} for every stored game."""
+
+    def history(self, game_id, after=0, limit=50):
+        """Up to limit history entries of game_id as dicts with id, seq, written_at, event_json and
+        session_data_json (the checkpointed state, "" between checkpoints), oldest first.
+        Pass the last id of a page as after to get the next one. Engines that keep no history return []."""
+        return []
+
+    def history_entries(self, records):
+        """(event_json, checkpoint state or "") to log for each record."""
+        if self._unchecked is None:
+            self._unchecked = {}
+        entries = []
+        for game_id, seq, session_data_json in records:
+            unchecked = self._unchecked.get(game_id, CHECKPOINT_EVERY)
+            checkpoint = unchecked >= CHECKPOINT_EVERY
+            self._unchecked[game_id] = 1 if checkpoint else unchecked + 1
+            entries.append((history_event(session_data_json), session_data_json if checkpoint else ""))
+        return entries
+
+    def close(self):
+        pass
+
+# -------------------------
+# JsonFileEngine: the latest state in one JSON file, overwritten on every
+# write. Cheap for one game; its history is a ring of the newest
+# `history_limit` entries, kept in memory. A file left over from an earlier
+# run is cleared so the server never resumes a stale game, so the history
+# lasts as long as the file does. With fsync, a write returns once the file
+# is on disk.
+# -------------------------
+class JsonFileEngine(StorageEngine):
+    def __init__(self, path, fsync=False, history_limit=1000):
+        self.path = path
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.current = None  # (game_id, seq) of the state in the file
+        self.log = deque(maxlen=history_limit)  # History entries of every game, oldest first
+        self.next_id = 1
+        if os.path.exists(path):
+            os.remove(path)
+            print(f"Cleared {path}")
+
+    def write_batch(self, records):
+        if not records:
+            return
+        game_id, seq, session_data_json = records[-1]  # Every write replaces the file, so the last one wins
+        now = time.time()
+        with self.lock:
+            with open(self.path, 'w') as f:
+                f.write(session_data_json)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.current = (game_id, seq)
+            for (entry_game, entry_seq, _), (event_json, checkpoint) in zip(records, self.history_entries(records)):
+                self.log.append({"id": self.next_id, "game_id": entry_game, "seq": entry_seq, "written_at": now,
+                                 "event_json": event_json, "session_data_json": checkpoint})
+                self.next_id += 1
+
+    def load(self, game_id=None):
+        with self.lock:
+            if self.current is None or (game_id is not None and game_id != self.current[0]):
+                return None
+            with open(self.path) as f:
+                return self.current + (f.read(),)
+
+    def games(self):
+        with self.lock:
+            return {self.current[0]: self.current[1]} if self.current else {}
+
+    def history(self, game_id, after=0, limit=50):
+        page = []
+        with self.lock:
+            for entry in self.log:
+                if entry["game_id"] == game_id and entry["id"] > after:
+                    page.append({k: v for k, v in entry.items() if k != "game_id"})
+                    if len(page) >= limit:
+                        break
+        return page
+
+# -------------------------
+# SQLiteEngine: one SQLite database in WAL mode, kept across restarts.
+# `games` holds the current state of each game, `history` the newest
+# `history_limit` history entries per game, `metadata` the schema version,
+# checked on open so a newer database is not misread (version 1 kept a whole
+# state in every history row; those rows read as checkpoints). A batch of
+# writes is one transaction, so it costs one commit.
+# synchronous=FULL makes every commit reach the disk, NORMAL only guards
+# against the process (not the machine) crashing.
+# -------------------------
+class SQLiteEngine(StorageEngine):
+    def __init__(self, path, synchronous="NORMAL", history_limit=1000):
+        self.path = path
+        self.history_limit = history_limit
+        self.lock = threading.Lock()
+        # One connection shared by the server's threads, used under self.lock
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA synchronous={synchronous}")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS games ("
+            "game_id TEXT PRIMARY KEY, seq INTEGER NOT NULL, state TEXT NOT NULL, last_write INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS games_last_write ON games (last_write);"
+            "CREATE TABLE IF NOT EXISTS history ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, game_id TEXT NOT NULL, seq INTEGER NOT NULL, "
+            "written_at REAL NOT NULL, state TEXT NOT NULL, event TEXT NOT NULL DEFAULT '{}');"
+            "CREATE INDEX IF NOT EXISTS history_game ON history (game_id, id);"
+            "CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT);"
+        )
+        self.conn.execute("INSERT OR IGNORE INTO metadata (key, value) VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+        version = int(self.get_meta("schema_version"))
+        if version > SCHEMA_VERSION:
+            self.conn.close()
+            raise ValueError(f"{path} has schema version {version}, this server reads up to {SCHEMA_VERSION}")
+        if version < 2:
+            self.conn.execute("ALTER TABLE history ADD COLUMN event TEXT NOT NULL DEFAULT '{}'")
+            self.conn.execute("UPDATE metadata SET value = ? WHERE key = 'schema_version'", (str(SCHEMA_VERSION),))
+
+    def write_batch(self, records):
+        if not records:
+            return
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for (game_id, seq, session_data_json), (event_json, checkpoint) in zip(
+                        records, self.history_entries(records)):
+                    history_id = self.conn.execute(
+                        "INSERT INTO history (game_id, seq, written_at, state, event) VALUES (?, ?, ?, ?, ?)",
+                        (game_id, seq, now, checkpoint, event_json)).lastrowid
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO games (game_id, seq, state, last_write) VALUES (?, ?, ?, ?)",
+                        (game_id, seq, session_data_json, history_id))
+                for game_id in {record[0] for record in records}:
+                    self.conn.execute(
+                        "DELETE FROM history WHERE game_id = ? AND id <= "
+                        "(SELECT id FROM history WHERE game_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                        (game_id, game_id, self.history_limit))
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                self._unchecked = None  # The rolled back rows may include a checkpoint; take one on the next write
+                raise
+            self.conn.execute("COMMIT")
+
+    def load(self, game_id=None):
+        with self.lock:
+            if game_id is None:
+                return self.conn.execute(
+                    "SELECT game_id, seq, state FROM games ORDER BY last_write DESC LIMIT 1").fetchone()
+            return self.conn.execute("SELECT game_id, seq, state FROM games WHERE game_id = ?", (game_id,)).fetchone()
+
+    def games(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT game_id, seq FROM games").fetchall())
+
+    def history(self, game_id, after=0, limit=50):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, seq, written_at, event, state FROM history WHERE game_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (game_id, after, limit)).fetchall()
+        return [{"id": id, "seq": seq, "written_at": written_at, "event_json": event, "session_data_json": state}
+                for id, seq, written_at, event, state in rows]
+
+    def get_meta(self, key, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM metadata WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def create_storage_engine(kind, path, fsync=False):
+    """Build the storage engine selected on the command line; with fsync, writes wait for the disk."""
+    if kind == "json":
+        return JsonFileEngine(path, fsync)
+    if kind == "sqlite":
+        return SQLiteEngine(path, "FULL" if fsync else "NORMAL")
+    raise ValueError(f"Unknown storage engine: {kind}")
@@ -0,0 +1,351 @@
+import unittest
+import sys
+import os
+import json
+import threading
+import tempfile
+import unittest.mock
+from contextlib import contextmanager
+
+# Add the parent directory to the path so we can import the modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import app
+import chat_pb2
+from backend_client import CircuitBreaker
+from lobby import Lobby
+from shared_state import InProcessSharedState
+from storage import JsonFileEngine
+
+class FakeBackend:
+    """Accepts every save, keeps the requests it was sent and serves their history."""
+    def __init__(self, directory):
+        self.breaker = CircuitBreaker()
+        self.saves = []
+        self.engine = JsonFileEngine(os.path.join(directory, "users_1.json"))
+
+    def call(self, method, request, metadata=None, **kwargs):
+        if method == "SaveGameState":
+            self.saves.append(request)
+            self.engine.write(request.game_id, request.seq, request.session_data_json)
+            return chat_pb2.SaveGameStateResponse(success=True)
+        if method == "GetGameHistory":
+            entries = self.engine.history(request.game_id, request.after, request.limit)
+            return chat_pb2.GameHistoryResponse(entries=[chat_pb2.GameHistoryEntry(**entry) for entry in entries])
+        raise NotImplementedError(method)
+
+    def events(self):
+        return [json.loads(save.session_data_json)["event"]["event_type"] for save in self.saves]
+
+class CheckedSharedState(InProcessSharedState):
+    """Counts the writes made without the cross-worker lock, which another worker could overwrite.
+    Like SQLiteSharedState, the lock only makes writers take turns; reads don't wait for it."""
+    def __init__(self):
+        super().__init__()
+        self.writer = threading.RLock()
+        self.held = threading.local()
+        self.unlocked_puts = 0
+
+    @contextmanager
+    def lock(self):
+        with self.writer:
+            self.held.depth = getattr(self.held, 'depth', 0) + 1
+            try:
+                yield
+            finally:
+                self.held.depth -= 1
+
+    def put(self, key, value):
+        if not getattr(self.held, 'depth', 0):
+            self.unlocked_puts += 1
+        return super().put(key, value)
+
+class AppTestCase(unittest.TestCase):
+    """Runs the app's routes in-process as the leader, with a fresh game and a fake backend."""
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        app.APP_ELECTION_STATE = "leader"
+        app.backend = self.backend = FakeBackend(self.directory.name)
+        app.shared_state = self.shared_state = CheckedSharedState()
+        app.local_state_version = app.local_lobby_version = 0
+        app.lobby_shared_at = None
+        app.expected_players = 2
+        app.lobby = Lobby(2)
+        app.room_id = None
+        app.players.clear()
+        app.player_sessions.clear()
+        app.rebuild_player_indexes()
+        app.game_started = app.game_finished = False
+        app.spotit_game = None
+        app.restart_votes.clear()
+        app.restart_requesters.clear()
+        app.restart_initiator = app.restart_initiator_clear_time = app.restart_next_seed = app.next_game = None
+        app.restart_in_progress = False
+        app.restart_cooldown_until = 0
+        app.save_pending = False
+        app.save_outbox.clear()
+        for job in app.scheduler.get_jobs():
+            if job.id in ('seat_waiting_room', 'restart_game', 'prepare_next_game'):
+                job.remove()
+        self.client = app.app.test_client()
+
+    def start_game(self, names=("ann", "bob")):
+        """Seat a room of names and deal its cards; returns their session IDs."""
+        tickets = [self.client.post('/set_username', json={"username": name}).get_json()["ticket"] for name in names]
+        sessions = [self.client.get('/check_game_status', query_string={"ticket": t}).get_json()["session_id"]
+                    for t in tickets]
+        self.client.get('/spot_it_game', query_string={"session_id": sessions[0]})
+        return sessions
+
+    def get(self, path, sid, **kwargs):
+        return self.client.get(path, headers={"X-Session-Id": sid}, **kwargs)
+
+    def post(self, path, sid, body):
+        return self.client.post(path, headers={"X-Session-Id": sid}, json=body)
+
+    def match(self, sid):
+        """The symbol sid's card shares with the center card, and the state_version it was read at."""
+        state = self.get('/game_state', sid).get_json()
+        common = {e['emoji'] for e in state['player_emojis']} & {e['emoji'] for e in state['center_emojis']}
+        return common.pop(), state['state_version']
+
+class TestGameStateIsReadOnly(AppTestCase):
+    def test_an_empty_center_pile_finishes_the_game_once(self):
+        ann, _ = self.start_game()
+        app.spotit_game.cards_pile['center'].clear()
+        first = self.get('/game_state', ann).get_json()
+        self.get('/game_state', ann)
+        self.assertTrue(first['game_finished'])
+        self.assertEqual(self.backend.events().count("game_finish"), 1)
+        self.assertEqual(self.shared_state.unlocked_puts, 0)
+
+class TestCrossWorkerLocking(AppTestCase):
+    def test_writes_wait_for_another_worker_and_reads_do_not(self):
+        ann, _ = self.start_game()
+        emoji, version = self.match(ann)
+        holding, release = threading.Event(), threading.Event()
+        def other_worker():
+            with self.shared_state.lock():
+                holding.set()
+                release.wait(5)
+        threading.Thread(target=other_worker).start()
+        holding.wait(5)
+        self.assertEqual(self.get('/game_state', ann).status_code, 200)  # Reads don't queue
+        answers = []
+        claim = threading.Thread(target=lambda: answers.append(app.app.test_client().post(
+            '/claim_match', headers={"X-Session-Id": ann}, json={"emoji": emoji, "state_version": version}).get_json()))
+        claim.start()
+        claim.join(timeout=0.3)
+        self.assertEqual(answers, [])  # The write waits for the other worker
+        release.set()
+        claim.join(timeout=5)
+        self.assertTrue(answers[0]['accepted'])
+
+    def test_routes_catch_up_with_what_another_worker_published(self):
+        ann, _ = self.start_game()
+        session_data = json.loads(json.dumps(app.build_session_data()))
+        session_data['current_state']['scores'] = [0, 5]
+        session_data['current_state']['state_version'] += 1
+        self.shared_state.put('session', session_data)  # Another worker's claim
+        self.assertEqual(self.get('/game_state', ann).get_json()['scores'], [0, 5])
+        emoji, version = self.match(ann)
+        self.post('/claim_match', ann, {"emoji": emoji, "state_version": version})
+        self.assertEqual(self.shared_state.get('session')[1]['current_state']['scores'], [1, 5])
+        self.assertEqual(self.shared_state.unlocked_puts, 1)  # Only the put above
+
+class TestPlayerIndexes(AppTestCase):
+    def own_card(self, sid):
+        return {e['emoji'] for e in self.get('/game_state', sid).get_json()['player_emojis']}
+
+    def top_card(self, player_id):
+        return {e['emoji'] for e in app.spotit_game.cards_pile[player_id][-1]}
+
+    def test_sessions_resolve_to_their_players(self):
+        ann, bob = self.start_game()
+        self.assertEqual((app.session_player_ids[ann], app.session_player_ids[bob]), (0, 1))
+        self.assertEqual(self.own_card(bob), self.top_card(1))
+
+    def test_indexes_are_rebuilt_from_a_loaded_snapshot(self):
+        ann, bob = self.start_game()
+        snapshot = json.loads(json.dumps(app.build_session_data()))
+        app.players.clear()
+        app.player_sessions.clear()
+        app.rebuild_player_indexes()
+        app.apply_session_data(snapshot)
+        self.assertEqual(app.player_names, ["ann", "bob"])
+        self.assertEqual(app.session_player_ids, {ann: 0, bob: 1})
+        self.assertEqual(self.own_card(bob), self.top_card(1))
+
+    def test_map_session_follows_the_username(self):
+        _, bob = self.start_game()
+        app.map_session("new-browser", "bob")
+        self.assertEqual(app.session_player_ids["new-browser"], 1)
+        app.map_session(bob, "nobody")  # Not a player of this room
+        self.assertNotIn(bob, app.session_player_ids)
+
+class TestSessionTokens(AppTestCase):
+    def test_a_token_identifies_its_player_after_a_failover(self):
+        _, bob = self.start_game()
+        app.player_sessions.clear()  # A new leader that hasn't seen this session yet
+        app.rebuild_player_indexes()
+        self.assertEqual(app.get_username_from_sid(bob), "bob")
+        self.assertEqual(self.post('/decline_restart', bob, {}).get_json()['declined_by'], "bob")
+
+    def test_a_tampered_token_identifies_nobody(self):
+        _, bob = self.start_game()
+        tampered = bob[:-4] + ("AAAA" if not bob.endswith("AAAA") else "BBBB")
+        self.assertIsNone(app.read_session_token(tampered))
+        answer = app.app.test_client().post('/decline_restart', headers={"X-Session-Id": tampered}, json={})
+        self.assertEqual(answer.get_json()['error'], 'Could not identify player')
+
+    def test_a_token_for_an_earlier_room_is_sent_to_the_login(self):
+        self.start_game()
+        old = app.session_serializer.dumps({'room': 'an-earlier-room', 'player_id': 1, 'username': 'bob'})
+        self.assertTrue(app.session_room_closed(old))
+        self.assertIsNone(app.read_session_token(old))
+        page = app.app.test_client().get('/spot_it_game', query_string={"session_id": old})
+        self.assertEqual((page.status_code, page.headers['Location']), (302, '/'))
+        self.assertTrue(self.get('/game_state', old).get_json()['room_closed'])
+
+class TestWarmStandby(AppTestCase):
+    def test_a_promoted_backup_serves_the_streamed_game(self):
+        ann, bob = self.start_game()
+        emoji, version = self.match(ann)
+        self.post('/claim_match', ann, {"emoji": emoji, "state_version": version})
+        streamed, saves = json.dumps(app.build_session_data()), len(self.backend.saves)
+        card = app.spotit_game.cards_pile[1][-1]
+        app.players.clear()  # A backup that has seen nothing yet
+        app.player_sessions.clear()
+        app.rebuild_player_indexes()
+        app.spotit_game, app.game_started = None, False
+        app.APP_ELECTION_STATE = "backup"
+        self.assertTrue(app.apply_streamed_state(streamed))
+        self.assertEqual(self.get('/game_state', bob).status_code, 503)  # Backups don't serve players
+        app.APP_ELECTION_STATE = "leader"
+        state = self.get('/game_state', bob).get_json()
+        self.assertEqual((state['names'], state['scores']), (["ann", "bob"], [1, 0]))
+        self.assertEqual(state['player_emojis'], card)
+        self.assertEqual(len(self.backend.saves), saves)  # Applying a committed state saves nothing
+        self.assertFalse(app.apply_streamed_state(streamed))  # Promoted: its own state is authoritative
+
+class TestLobby(AppTestCase):
+    def join(self, name):
+        return self.client.post('/set_username', json={"username": name}).get_json()
+
+    def test_long_poll_answers_once_the_lobby_changes(self):
+        ticket = self.join("ann")["ticket"]
+        first = self.client.get('/lobby/wait', query_string={"ticket": ticket}).get_json()  # Nothing seen yet
+        self.assertEqual((first['game_ready'], first['waiting_count']), (False, 1))
+        answers = []
+        waiter = threading.Thread(target=lambda: answers.append(app.app.test_client().get(
+            '/lobby/wait', query_string={"ticket": ticket, "version": first['version']}).get_json()))
+        waiter.start()
+        waiter.join(timeout=0.3)
+        self.assertEqual(answers, [])  # Held until something happens
+        self.join("bob")
+        waiter.join(timeout=5)
+        self.assertTrue(answers[0]['game_ready'])
+
+    def test_waiting_is_bounded(self):
+        ticket = self.join("ann")["ticket"]
+        version = app.lobby.version
+        busy = threading.BoundedSemaphore(1)
+        busy.acquire()
+        with unittest.mock.patch.object(app, 'lobby_waiters', busy):
+            answer = self.client.get('/lobby/wait', query_string={"ticket": ticket, "version": version}).get_json()
+        self.assertEqual(answer['retry_after'], app.LOBBY_RETRY_SECONDS)
+        self.assertEqual(self.client.get('/lobby/wait').status_code, 400)
+
+    def test_only_sealed_rooms_are_replicated(self):
+        self.join("ann")
+        self.assertEqual(self.backend.saves, [])  # A forming room only goes to the other workers
+        self.assertEqual(app.shared_state.get('lobby')[1]['rooms'][0]['members'], ["ann"])
+        for name in ("bob", "cat"):
+            self.join(name)
+        lobby = json.loads(self.backend.saves[-1].session_data_json)['lobby']
+        self.assertEqual([room['members'] for room in lobby['rooms']], [["ann", "bob"]])
+        self.assertEqual(app.shared_state.get('lobby')[1]['rooms'][-1]['members'], ["cat"])
+
+class TestClaimMatch(AppTestCase):
+    def test_two_claims_on_one_center_card_award_one_point(self):
+        ann, bob = self.start_game()
+        claims = [self.match(ann), self.match(bob)]
+        self.assertEqual(claims[0][1], claims[1][1])  # Both read the same cards
+        answers = [self.post('/claim_match', sid, {"emoji": emoji, "state_version": version}).get_json()
+                   for sid, (emoji, version) in zip((ann, bob), claims)]
+        self.assertEqual([a['accepted'] for a in answers], [True, False])
+        self.assertEqual(answers[1]['scores'], [1, 0])
+        self.assertEqual(self.backend.events().count("match_found"), 1)
+
+    def test_a_stale_state_version_is_rejected(self):
+        ann, _ = self.start_game()
+        emoji, version = self.match(ann)
+        answer = self.post('/claim_match', ann, {"emoji": emoji, "state_version": version - 1}).get_json()
+        self.assertFalse(answer['accepted'])
+        self.assertEqual(answer['scores'], [0, 0])
+        self.assertEqual(answer['state_version'], version)  # The current cards come back
+
+    def test_a_match_is_saved_once(self):
+        ann, _ = self.start_game()
+        saves = len(self.backend.saves)
+        emoji, version = self.match(ann)
+        self.post('/claim_match', ann, {"emoji": emoji, "state_version": version})
+        self.assertEqual(self.backend.events()[saves:], ["match_found"])
+
+class TestDeclineRestart(AppTestCase):
+    def scheduled(self):
+        return {job.id for job in app.scheduler.get_jobs()} & {'prepare_next_game', 'restart_game'}
+
+    def test_declining_drops_the_next_deal(self):
+        ann, bob = self.start_game()
+        self.post('/request_restart', ann, {})
+        self.assertEqual(self.scheduled(), {'prepare_next_game'})
+        self.assertTrue(self.post('/decline_restart', bob, {}).get_json()['restart_cancelled'])
+        self.assertEqual(self.scheduled(), set())
+
+    def test_a_decline_after_the_last_vote_cancels_the_restart(self):
+        ann, bob = self.start_game()
+        self.post('/request_restart', ann, {})
+        self.assertTrue(self.post('/request_restart', bob, {}).get_json()['restart_started'])
+        self.assertIn('restart_game', self.scheduled())
+        self.post('/decline_restart', ann, {})
+        self.assertEqual(self.scheduled(), set())
+
+class TestRotate(AppTestCase):
+    def test_offset_is_kept_in_the_session_cookie(self):
+        ann, _ = self.start_game()
+        saves, version = len(self.backend.saves), self.shared_state.version('session')
+        self.assertEqual(self.post('/rotate', ann, {"direction": "counterclockwise"}).get_json()['player_rotation'], 6)
+        self.assertEqual(self.post('/rotate', ann, {"rotation": 9}).get_json()['player_rotation'], 2)
+        self.assertEqual(self.get('/game_state', ann).get_json()['player_rotation'], 2)  # From the cookie
+        self.assertEqual((len(self.backend.saves), self.shared_state.version('session')), (saves, version))
+        other_browser = app.app.test_client().get('/game_state', headers={"X-Session-Id": ann})
+        self.assertEqual(other_browser.get_json()['player_rotation'], 0)
+
+    def test_a_new_card_starts_unturned(self):
+        ann, _ = self.start_game()
+        self.post('/rotate', ann, {"direction": "clockwise"})
+        emoji, version = self.match(ann)
+        self.post('/claim_match', ann, {"emoji": emoji, "state_version": version})
+        self.assertEqual(self.get('/game_state', ann).get_json()['player_rotation'], 0)
+
+class TestGameHistory(AppTestCase):
+    def test_pages_of_compact_events_with_checkpoints(self):
+        ann, _ = self.start_game()
+        emoji, version = self.match(ann)
+        self.post('/claim_match', ann, {"emoji": emoji, "state_version": version})
+        first = self.client.get('/game_history', query_string={"limit": 2}).get_json()
+        self.assertEqual([e['event_type'] for e in first['history']], ["all_players_joined", "reset"])
+        self.assertIn('checkpoint', first['history'][0])  # The first save of a game
+        self.assertNotIn('checkpoint', first['history'][1])
+        rest = self.client.get('/game_history', query_string={"cursor": first['next_cursor']}).get_json()
+        self.assertEqual(rest['history'][-1]['event_type'], "match_found")
+        self.assertEqual(rest['history'][-1]['player'], 0)
+        self.assertIsNone(rest['next_cursor'])
+
+    def test_rejects_a_limit_below_one(self):
+        for limit in (0, -1):
+            self.assertEqual(self.client.get('/game_history', query_string={"limit": limit}).status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
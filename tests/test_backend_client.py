@@ -0,0 +1,126 @@
+import unittest
+import sys
+import os
+import time
+
+import grpc
+
+# Add the parent directory to the path so we can import the modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend_client import BackendClient, CircuitBreaker, CircuitOpenError
+
+class FakeRpcError(grpc.RpcError):
+    def __init__(self, code):
+        super().__init__()
+        self._code = code
+
+    def code(self):
+        return self._code
+
+    def details(self):
+        return self._code.name
+
+class FakeStub:
+    """Answers SaveGameState from a script of results: an exception to raise or a value to return."""
+    def __init__(self, *results):
+        self.results = list(results)
+        self.timeouts = []
+
+    def SaveGameState(self, request, timeout=None, metadata=None):
+        self.timeouts.append(timeout)
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+def client_with(stub, **kwargs):
+    client = BackendClient(backoff=0.001, **kwargs)
+    client.stub, client.address = stub, "leader:8001"
+    return client
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_threshold_and_lets_one_trial_through(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertGreater(breaker.allow(), 0)
+        time.sleep(0.06)
+        self.assertEqual(breaker.allow(), 0)  # The trial call
+        self.assertGreater(breaker.allow(), 0)  # Others wait for it
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0.05)
+        for _ in range(5):
+            breaker.record_failure()
+        time.sleep(0.06)
+        self.assertEqual(breaker.allow(), 0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+class TestBackendClient(unittest.TestCase):
+    def test_calls_have_deadlines(self):
+        stub = FakeStub("ok")
+        client = client_with(stub, deadlines={"SaveGameState": 0.7})
+        self.assertEqual(client.call("SaveGameState", None), "ok")
+        self.assertEqual(stub.timeouts, [0.7])
+
+    def test_retries_unavailable_idempotent_calls(self):
+        stub = FakeStub(FakeRpcError(grpc.StatusCode.UNAVAILABLE), FakeRpcError(grpc.StatusCode.DEADLINE_EXCEEDED), "ok")
+        client = client_with(stub, retries=2)
+        self.assertEqual(client.call("SaveGameState", None), "ok")
+        self.assertEqual(client.breaker.state, "closed")
+
+    def test_does_not_retry_non_idempotent_calls(self):
+        stub = FakeStub(FakeRpcError(grpc.StatusCode.UNAVAILABLE), "ok")
+        client = client_with(stub)
+        with self.assertRaises(grpc.RpcError):
+            client.call("SaveGameState", None, idempotent=False)
+        self.assertEqual(len(stub.results), 1)
+
+    def test_does_not_retry_application_errors(self):
+        stub = FakeStub(FakeRpcError(grpc.StatusCode.INVALID_ARGUMENT), "ok")
+        client = client_with(stub, breaker=CircuitBreaker(failure_threshold=1))
+        with self.assertRaises(grpc.RpcError) as raised:
+            client.call("SaveGameState", None)
+        self.assertEqual(raised.exception.code(), grpc.StatusCode.INVALID_ARGUMENT)
+        self.assertEqual(client.breaker.state, "closed")
+
+    def test_open_circuit_fails_fast(self):
+        unavailable = FakeRpcError(grpc.StatusCode.UNAVAILABLE)
+        stub = FakeStub(unavailable, unavailable, unavailable, "ok")
+        client = client_with(stub, retries=5, breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60))
+        with self.assertRaises(CircuitOpenError) as raised:
+            client.call("SaveGameState", None)
+        self.assertEqual(raised.exception.code(), grpc.StatusCode.UNAVAILABLE)
+        self.assertEqual(len(stub.results), 1)  # Stopped calling once the circuit opened
+
+    def test_a_trial_call_that_raises_something_else_reopens_the_circuit(self):
+        stub = FakeStub(FakeRpcError(grpc.StatusCode.UNAVAILABLE), ValueError("bad request"), "ok")
+        client = client_with(stub, retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.05))
+        with self.assertRaises(grpc.RpcError):
+            client.call("SaveGameState", None)
+        time.sleep(0.06)
+        with self.assertRaises(ValueError):
+            client.call("SaveGameState", None)  # The trial call
+        self.assertEqual(client.breaker.state, "open")
+        time.sleep(0.06)
+        self.assertEqual(client.call("SaveGameState", None), "ok")  # A new trial is let through
+
+    def test_connect_resets_the_circuit(self):
+        client = BackendClient(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+        client.breaker.record_failure()
+        client.connect("127.0.0.1:1")
+        self.assertEqual(client.breaker.state, "closed")
+        self.assertEqual(client.address, "127.0.0.1:1")
+
+    def test_not_connected(self):
+        with self.assertRaises(CircuitOpenError) as raised:
+            BackendClient().call("SaveGameState", None)
+        self.assertEqual(raised.exception.details(), "Not connected to a backend leader")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add the parent directory to the path so we can import the modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks import compare, load_baseline, save_baseline, measure
+
+class TestBenchmarks(unittest.TestCase):
+    def test_only_slowdowns_beyond_the_threshold_are_regressions(self):
+        baseline = {"fast": {"seconds_per_op": 1.0}, "slow": {"seconds_per_op": 1.0}}
+        results = {"fast": 1.2, "slow": 1.3, "new": 5.0}
+        self.assertEqual(compare(results, baseline, threshold=0.25), {"slow": (1.0, 1.3)})
+
+    def test_baseline_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "baseline.json")
+            self.assertEqual(load_baseline(path), {})
+            save_baseline({"update_cards": 1e-6}, path)
+            self.assertEqual(load_baseline(path), {"update_cards": {"seconds_per_op": 1e-6}})
+
+    def test_measure_returns_seconds_per_call(self):
+        seconds = measure(lambda: (lambda: sum(range(10))), repeat=2, min_time=0.01)
+        self.assertGreater(seconds, 0)
+        self.assertLess(seconds, 0.01)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+
+# Add the parent directory to the path so we can import the modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from chaos import parse_schedule, count_transitions, first_match_after
+from loadgen import LatencyRecorder
+
+class TestChaos(unittest.TestCase):
+    def test_schedule_is_sorted_and_validated(self):
+        self.assertEqual(parse_schedule("30:backend, 10:app"), [(10.0, "app"), (30.0, "backend")])
+        with self.assertRaises(ValueError):
+            parse_schedule("10:database")
+
+    def test_transitions_compare_acknowledgements_with_final_scores(self):
+        players = [SimpleNamespace(username="a", matches=3), SimpleNamespace(username="b", matches=2)]
+        result = count_transitions(players, {"a": 2, "b": 3})
+        self.assertEqual(result, {"acknowledged": 5, "final": 5, "lost": 1, "duplicated": 1})
+
+    def test_first_match_counts_only_accepted_matches_after_the_kill(self):
+        recorder = LatencyRecorder()
+        recorder.outcome_events = [(1.0, "claim_accepted"), (2.5, "claim_rejected"), (4.0, "claim_accepted")]
+        self.assertEqual(first_match_after(recorder, 2.0), 2.0)
+        self.assertIsNone(first_match_after(recorder, 5.0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+# Add the parent directory to the path so we can import the modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from cluster import ClusterConfig, load_cluster_config, cluster_from_ips
+
+class TestClusterConfig(unittest.TestCase):
+    def test_from_ips_uses_default_ports(self):
+        cluster = cluster_from_ips("10.0.0.1,10.0.0.2,10.0.0.3,10.0.0.4,10.0.0.5", "10.0.1.1")
+        self.assertEqual(cluster.backend_addresses()[4], "10.0.0.5:8005")
+        self.assertEqual(cluster.apps, [{'id': 1, 'host': '10.0.1.1', 'port': 5001}])
+        self.assertEqual(cluster.backend_peers(2)[0], (1, "10.0.0.1:8001"))
+
+    def test_quorum_is_majority(self):
+        for size, quorum in [(1, 1), (2, 2), (3, 2), (4, 3), (5, 3)]:
+            cluster = cluster_from_ips(",".join(["127.0.0.1"] * size))
+            self.assertEqual(cluster.quorum, quorum)
+
+    def test_load_file(self):
+        topology = {
+            "backends": [{"id": 2, "host": "b", "port": 9002}, {"id": 1, "host": "a", "port": 9001}],
+            "apps": [{"id": 1, "host": "a", "port": 6001}]
+        }
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump(topology, f)
+        try:
+            cluster = load_cluster_config(f.name)
+        finally:
+            os.remove(f.name)
+        self.assertEqual(cluster.backend_addresses(), ["a:9001", "b:9002"])
+        self.assertEqual(cluster.backend(2)['port'], 9002)
+
+    def test_ids_must_be_contiguous(self):
+        with self.assertRaises(ValueError):
+            ClusterConfig([{'id': 1, 'host': 'a', 'port': 1}, {'id': 3, 'host': 'b', 'port': 2}], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path so we can import the modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from failure_detector import PhiAccrualFailureDetector
+
+class TestPhiAccrualFailureDetector(unittest.TestCase):
+    def setUp(self):
+        self.detector = PhiAccrualFailureDetector(threshold=8.0, first_interval=0.2)
+        # Regular heartbeats every 200 ms
+        for i in range(20):
+            self.detector.heartbeat(now=i * 0.2)
+        self.last = 19 * 0.2
+
+    def test_never_seen_peer_is_unavailable(self):
+        self.assertFalse(PhiAccrualFailureDetector().is_available(now=0.0))
+
+    def test_available_right_after_heartbeat(self):
+        self.assertTrue(self.detector.is_available(now=self.last + 0.1))
+        self.assertLess(self.detector.phi(now=self.last + 0.1), 1.0)
+
+    def test_phi_grows_with_silence(self):
+        phis = [self.detector.phi(now=self.last + t) for t in (0.2, 0.4, 0.6)]
+        self.assertEqual(phis, sorted(phis))
+
+    def test_long_silence_does_not_overflow(self):
+        self.assertEqual(self.detector.phi(now=self.last + 3600), float('inf'))
+
+    def app_detector(self):
+        """A detector with the app's settings (200 ms probes that may each take up to 500 ms)
+        after 20 regular probes; returns it and the time of the last one."""
+        detector = PhiAccrualFailureDetector(threshold=8.0, first_interval=0.2, acceptable_pause=0.5, min_std_dev=0.1)
+        for i in range(20):
+            detector.heartbeat(now=i * 0.2)
+        return detector, 19 * 0.2
+
+    def test_app_settings_tolerate_a_missed_probe(self):
+        detector, last = self.app_detector()
+        self.assertTrue(detector.is_available(now=last + 0.7))  # One probe timed out
+
+    def test_app_settings_suspect_silence_after_1_2_to_1_3_seconds(self):
+        detector, last = self.app_detector()
+        self.assertTrue(detector.is_available(now=last + 1.2))  # phi 7.3
+        self.assertFalse(detector.is_available(now=last + 1.3))  # phi 10.8
+
+if __name__ == '__main__':
+    unittest.main()
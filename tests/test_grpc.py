@@ -1,4 +1,5 @@
 import unittest
+import unittest.mock
 import grpc
 import time
 import threading
@@ -61,15 +62,171 @@ class TestSpotItGrpc(unittest.TestCase):
         self.assertIn('players', load_resp.session_data_json)
         self.assertIn('scores', load_resp.session_data_json)
 
+    def test_save_ignores_retries_and_rejects_regressions(self):
+        game = "test-seq-game"
+        first = chat_pb2.SaveGameStateRequest(session_data_json='{"seq": 2}', game_id=game, seq=2, request_id="save-2")
+        self.assertTrue(self.chat_stub.SaveGameState(first).success)
+        retry = self.chat_stub.SaveGameState(first)
+        self.assertTrue(retry.success)
+        self.assertTrue(retry.duplicate)
+        older = chat_pb2.SaveGameStateRequest(session_data_json='{"seq": 1}', game_id=game, seq=1, request_id="save-1")
+        refused = self.chat_stub.SaveGameState(older)
+        self.assertFalse(refused.success)
+        self.assertEqual(refused.committed_seq, 2)
+        load_resp = self.chat_stub.LoadGameState(chat_pb2.LoadGameStateRequest())
+        self.assertEqual(load_resp.session_data_json, '{"seq": 2}')
+
+    def test_load_game_state_by_game_id(self):
+        for game, seq in (("test-load-a", 1), ("test-load-b", 1)):
+            save = chat_pb2.SaveGameStateRequest(session_data_json=f'{{"game": "{game}"}}', game_id=game, seq=seq,
+                                                 request_id=f"{game}-{seq}")
+            self.assertTrue(self.chat_stub.SaveGameState(save).success)
+        current = self.chat_stub.LoadGameState(chat_pb2.LoadGameStateRequest(game_id="test-load-b"))
+        self.assertEqual((current.game_id, current.seq), ("test-load-b", 1))
+        # The JSON file engine only keeps the game saved last, and the history in memory
+        self.assertFalse(self.chat_stub.LoadGameState(chat_pb2.LoadGameStateRequest(game_id="test-load-a")).success)
+        history = self.chat_stub.GetGameHistory(chat_pb2.GameHistoryRequest(game_id="test-load-b")).entries
+        self.assertEqual([entry.seq for entry in history], [1])
+
+    def test_replica_skips_reordered_writes(self):
+        term = self.chat_stub.GetLeaderInfo(chat_pb2.GetLeaderInfoRequest()).term
+        game = "test-replica-game"
+        for seq in (5, 4):
+            rep_req = chat_pb2.ReplicateSaveGameStateRequest(session_data_json=f'{{"seq": {seq}}}', term=term,
+                                                             leader_id=1, game_id=game, seq=seq, request_id=f"rep-{seq}")
+            self.assertTrue(self.replication_stub.ReplicateSaveGameState(rep_req).success)
+        load_resp = self.chat_stub.LoadGameState(chat_pb2.LoadGameStateRequest())
+        self.assertEqual(load_resp.session_data_json, '{"seq": 5}')
+
     def test_replicate_save_game_state(self):
         dummy_state = '{"players": ["A", "B"], "scores": [1,2]}'
         rep_req = chat_pb2.ReplicateSaveGameStateRequest(session_data_json=dummy_state)
         rep_resp = self.replication_stub.ReplicateSaveGameState(rep_req)
         self.assertTrue(hasattr(rep_resp, 'success'))
 
+    def test_replicate_rejects_stale_term(self):
+        # The single test server leads term >= 1, so a term 0 write is from a deposed leader
+        leader = self.chat_stub.GetLeaderInfo(chat_pb2.GetLeaderInfoRequest())
+        self.assertGreaterEqual(leader.term, 1)
+        rep_req = chat_pb2.ReplicateSaveGameStateRequest(session_data_json='{}', term=0, leader_id=2)
+        rep_resp = self.replication_stub.ReplicateSaveGameState(rep_req)
+        self.assertFalse(rep_resp.success)
+        self.assertEqual(rep_resp.term, leader.term)
+
+    def test_watch_game_state_streams_saved_state(self):
+        dummy_state = '{"players": ["A", "B"], "scores": [3,4]}'
+        self.chat_stub.SaveGameState(chat_pb2.SaveGameStateRequest(session_data_json=dummy_state))
+        stream = self.chat_stub.WatchGameState(chat_pb2.WatchGameStateRequest(after_version=0))
+        update = next(stream)
+        stream.cancel()
+        self.assertGreater(update.version, 0)
+        self.assertIn('scores', update.session_data_json)
+
     def test_health_ping(self):
         resp = self.health_stub.Ping(chat_pb2.PingRequest())
         self.assertTrue(hasattr(resp, 'alive'))
 
+class FakeContext:
+    def invocation_metadata(self):
+        return ()
+
+    def peer(self):
+        return "test"
+
+class FakeElection:
+    server_id = 1
+    term = 1
+    quorum = 2
+
+    def has_lease(self):
+        return True
+
+class TestSaveGameStateRetries(unittest.TestCase):
+    def test_retried_save_is_replicated_again(self):
+        import server
+        from storage import JsonFileEngine
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            service = server.ChatService(server.PersistentStore(JsonFileEngine(os.path.join(directory, "users_1.json"))),
+                                         FakeElection(), [])
+            acks = [1, 2]  # The first attempt misses the quorum
+            replicated = []
+            def replicate_to_peers(method, rep_req):
+                replicated.append(rep_req.request_id)
+                return acks.pop(0)
+            service.replicate_to_peers = replicate_to_peers
+            request = chat_pb2.SaveGameStateRequest(session_data_json='{"n": 1}', game_id="g", seq=1, request_id="r1")
+            service.SaveGameState(request, FakeContext())
+            retry = service.SaveGameState(request, FakeContext())
+            self.assertTrue(retry.success)
+            self.assertTrue(retry.duplicate)
+            self.assertEqual(replicated, ["r1", "r1"])
+
+class TestLeaderElection(unittest.TestCase):
+    def elect(self, election, alive):
+        """Run one heartbeat round in which the peers in alive answer and grant every lease."""
+        import server
+        def ping_peer(address, request=None):
+            if address not in alive:
+                return None
+            return chat_pb2.PingResponse(alive=True, term=request.term, lease_granted=bool(request.leader_id))
+        election.ping_peer = ping_peer
+        with unittest.mock.patch.object(server, "all_host_port_pairs", ["s1", "s2", "s3"]):
+            election.elect()
+
+    def test_a_failed_server_rejoins(self):
+        import server
+        election = server.LeaderElection(2, [(1, "s1"), (3, "s3")])
+        for alive in ({"s1", "s3"}, {"s1", "s3"}):  # Peers start out unseen
+            self.elect(election, alive)
+        self.assertEqual((election.state, election.leader_id), ("backup", 1))
+        self.elect(election, {"s3"})
+        self.elect(election, {"s3"})  # Claims a term once server 1 is gone
+        self.assertEqual((election.state, election.leader_id), ("leader", 2))
+        self.elect(election, {"s1", "s3"})
+        self.elect(election, {"s1", "s3"})  # Steps aside the round after it sees server 1 again
+        self.assertEqual((election.state, election.leader_id), ("backup", 1))
+        self.assertTrue(election.peer_status[1])
+
+    def test_a_claimant_keeps_its_lease_for_itself(self):
+        import server
+        election = server.LeaderElection(2, [(1, "s1"), (3, "s3")])
+        self.elect(election, {"s3"})
+        self.assertFalse(election.handle_ping(chat_pb2.PingRequest(term=election.term, leader_id=3)).lease_granted)
+        self.assertFalse(election.accepts_write(election.term, 3))
+
+    def test_replica_takes_writes_only_from_its_lease_holder(self):
+        import server
+        election = server.LeaderElection(2, [(1, "s1"), (3, "s3")])
+        self.assertTrue(election.handle_ping(chat_pb2.PingRequest(term=5, leader_id=1)).lease_granted)
+        self.assertTrue(election.accepts_write(5, 1))
+        self.assertFalse(election.accepts_write(5, 3))  # Same term, not the server we granted
+        self.assertFalse(election.accepts_write(4, 1))  # Older term
+        self.assertTrue(election.accepts_write(6, 3))  # A newer term's leader holds a majority's leases
+        self.assertEqual(election.term, 6)
+
+class TestGameHistoryRpc(unittest.TestCase):
+    def test_pages_through_saved_states(self):
+        import server
+        from storage import SQLiteEngine
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            engine = SQLiteEngine(os.path.join(directory, "users_1.db"))
+            service = server.ChatService(server.PersistentStore(engine), FakeElection(), [])
+            service.replicate_to_peers = lambda method, rep_req: 2
+            for game, seq in (("a", 1), ("a", 2), ("b", 1), ("a", 3)):
+                state = f'{{"seq": {seq}, "event": {{"event_type": "{game}{seq}"}}}}'
+                service.SaveGameState(chat_pb2.SaveGameStateRequest(session_data_json=state, game_id=game,
+                                                                    seq=seq, request_id=f"{game}{seq}"), FakeContext())
+            page = service.GetGameHistory(chat_pb2.GameHistoryRequest(game_id="a", limit=2), FakeContext())
+            self.assertEqual([entry.seq for entry in page.entries], [1, 2])
+            self.assertTrue(page.entries[0].session_data_json)  # The first save of a game is a checkpoint
+            rest = service.GetGameHistory(chat_pb2.GameHistoryRequest(game_id="a", after=page.entries[-1].id), FakeContext())
+            self.assertEqual([(entry.event_json, entry.session_data_json) for entry in rest.entries],
+                             [('{"event_type": "a3"}', "")])
+            older = service.LoadGameState(chat_pb2.LoadGameStateRequest(game_id="b"), FakeContext())
+            self.assertEqual((older.game_id, older.seq), ("b", 1))
+            engine.close()
+
 if __name__ == '__main__':
     unittest.main()
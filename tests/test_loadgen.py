@@ -0,0 +1,55 @@
+import unittest
+import sys
+import os
+import threading
+
+# Add the parent directory to the path so we can import the modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from loadgen import percentile, LatencyRecorder, SimulatedPlayer
+
+class TestLoadgen(unittest.TestCase):
+    def test_percentile_nearest_rank(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertIsNone(percentile([], 50))
+
+    def test_summary_counts_errors_per_endpoint(self):
+        recorder = LatencyRecorder()
+        for _ in range(3):
+            recorder.record("/game_state", 0.010, True)
+        recorder.record("/game_state", 5.0, False)
+        recorder.count("claim_accepted")
+        summary = recorder.summary()
+        stats = summary["endpoints"]["/game_state"]
+        self.assertEqual(stats["requests"], 4)
+        self.assertEqual(stats["errors"], 1)
+        self.assertAlmostEqual(stats["error_rate"], 0.25)
+        self.assertAlmostEqual(stats["p50_ms"], 10.0)
+        self.assertEqual(summary["outcomes"], {"claim_accepted": 1})
+
+    def test_player_finds_the_shared_symbol(self):
+        player = SimulatedPlayer("p", ["http://127.0.0.1:1"], LatencyRecorder(), None)
+        state = {
+            "player_emojis": [{"emoji": "🐶"}, {"emoji": "🍕"}],
+            "center_emojis": [{"emoji": "🍕"}, {"emoji": "🚀"}],
+        }
+        self.assertEqual(player.find_match(state), "🍕")
+        self.assertIsNone(player.find_match({"player_emojis": [{"emoji": "🐶"}], "center_emojis": "DONE p"}))
+
+    def test_join_retries_a_page_and_renames_only_when_told_the_name_is_taken(self):
+        player = SimulatedPlayer("p", ["http://127.0.0.1:1"], LatencyRecorder(), threading.Event(), poll_interval=0)
+        answers = [{}, {"success": False, "error": "Username taken"}, {"success": True, "ticket": "t"}]
+        names = []
+        def request(method, path, endpoint, json=None):
+            names.append(json["username"])
+            return answers.pop(0)  # {} is what request() makes of an HTML page
+        player.request = request
+        self.assertEqual(player.join_lobby()["ticket"], "t")
+        self.assertEqual(names[:2], ["p", "p"])  # The "Initializing" page didn't cost the name
+        self.assertNotEqual(names[2], "p")
+        self.assertEqual(player.recorder.summary()["outcomes"], {"username_taken": 1})
+
+if __name__ == '__main__':
+    unittest.main()
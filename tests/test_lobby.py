@@ -0,0 +1,71 @@
+import unittest
+import sys
+import os
+import threading
+
+# Add the parent directory to the path so we can import the modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from lobby import Lobby
+
+class TestLobby(unittest.TestCase):
+    def setUp(self):
+        self.lobby = Lobby(room_size=2)
+
+    def test_rooms_fill_in_join_order(self):
+        for name in ("a", "b", "c", "d", "e"):
+            self.lobby.join(name)
+        first, second = self.lobby.take_ready_room(), self.lobby.take_ready_room()
+        self.assertEqual(first["members"], ["a", "b"])
+        self.assertEqual(second["members"], ["c", "d"])
+        self.assertIsNone(self.lobby.take_ready_room())
+        self.assertEqual(self.lobby.status("e")["waiting_count"], 1)
+        self.assertEqual(self.lobby.status("a")["status"], "playing")
+
+    def test_queued_rooms_know_their_place(self):
+        for name in ("a", "b", "c", "d"):
+            self.lobby.join(name)
+        self.assertEqual(self.lobby.status("a")["rooms_ahead"], 0)
+        self.assertEqual(self.lobby.status("c")["rooms_ahead"], 1)
+
+    def test_usernames_are_unique_until_the_room_closes(self):
+        self.lobby.join("a")
+        with self.assertRaises(ValueError):
+            self.lobby.join("a")
+        self.lobby.join("b")
+        room = self.lobby.take_ready_room()
+        self.lobby.close_room(room["id"])
+        self.assertIsNone(self.lobby.status("a"))
+        new_room = self.lobby.join("a")
+        self.assertIsNone(self.lobby.status("a", room["id"]))  # A ticket for the closed room
+        self.assertEqual(self.lobby.status("a", new_room["id"])["status"], "forming")
+
+    def test_waiters_are_woken_by_a_join(self):
+        version = self.lobby.version
+        woke = []
+        waiter = threading.Thread(target=lambda: woke.append(self.lobby.wait_for_change(version, timeout=5)))
+        waiter.start()
+        self.lobby.join("a")
+        waiter.join(timeout=5)
+        self.assertEqual(woke, [version + 1])
+
+    def test_snapshot_round_trip(self):
+        for name in ("a", "b", "c"):
+            self.lobby.join(name)
+        copy = Lobby(room_size=5)
+        copy.load(self.lobby.to_dict())
+        self.assertEqual(copy.status("a"), self.lobby.status("a"))
+        self.assertEqual(copy.waiting_count(), 1)
+        self.assertEqual(copy.take_ready_room()["members"], ["a", "b"])
+
+    def test_sealed_only_snapshot_leaves_out_the_forming_room(self):
+        for name in ("a", "b", "c"):
+            self.lobby.join(name)
+        copy = Lobby(room_size=2)
+        copy.load(self.lobby.to_dict(sealed_only=True))
+        self.assertIsNone(copy.status("c"))
+        self.assertEqual(copy.waiting_count(), 2)
+        self.assertEqual(copy.take_ready_room()["members"], ["a", "b"])
+        copy.join("c")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+import sys
+import os
+import logging
+
+# Add the parent directory to the path so we can import the modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from logs import RateLimitFilter
+
+def record(msg, level=logging.INFO):
+    return logging.LogRecord("spotit.app", level, __file__, 1, msg, (), None)
+
+class TestRateLimitFilter(unittest.TestCase):
+    def test_bursts_are_capped_per_template(self):
+        limiter = RateLimitFilter(burst=3, period=60)
+        passed = [limiter.filter(record("saved %s")) for _ in range(10)]
+        self.assertEqual(passed, [True] * 3 + [False] * 7)
+        self.assertTrue(limiter.filter(record("joined %s")))
+
+    def test_warnings_are_never_dropped(self):
+        limiter = RateLimitFilter(burst=1, period=60)
+        self.assertTrue(all(limiter.filter(record("replication failed", logging.WARNING)) for _ in range(5)))
+
+    def test_next_window_reports_suppressed_count(self):
+        limiter = RateLimitFilter(burst=1, period=60)
+        limiter.filter(record("saved"))
+        limiter.filter(record("saved"))
+        limiter.filter(record("saved"))
+        limiter.period = 0  # Open a new window
+        next_record = record("saved")
+        self.assertTrue(limiter.filter(next_record))
+        self.assertIn("2 similar messages suppressed", next_record.getMessage())
+
+if __name__ == '__main__':
+    unittest.main()
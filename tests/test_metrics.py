@@ -0,0 +1,54 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path so we can import the modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from metrics import MetricsRegistry
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_series_per_label(self):
+        saves = self.registry.counter("saves_total", "Saves", labels=("result",))
+        saves.inc(result="ok")
+        saves.inc(2, result="ok")
+        saves.inc(result="error")
+        text = self.registry.render()
+        self.assertIn("# TYPE saves_total counter", text)
+        self.assertIn('saves_total{result="ok"} 3', text)
+        self.assertIn('saves_total{result="error"} 1', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        latency = self.registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            latency.observe(value)
+        text = self.registry.render()
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 3', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn("latency_seconds_count 4", text)
+        self.assertIn("latency_seconds_sum 4.05", text)
+        self.assertEqual(latency.count(), 4)
+
+    def test_gauge_reads_its_function_at_scrape_time(self):
+        rooms = {"forming": 1, "playing": 0}
+        self.registry.gauge("rooms", "Rooms", labels=("status",), fn=lambda: rooms)
+        rooms["playing"] = 2
+        text = self.registry.render()
+        self.assertIn('rooms{status="playing"} 2', text)
+        self.assertIn('rooms{status="forming"} 1', text)
+
+    def test_label_values_are_escaped(self):
+        errors = self.registry.counter("errors_total", "Errors", labels=("route",))
+        errors.inc(route='/a"b')
+        self.assertIn('errors_total{route="/a\\"b"} 1', self.registry.render())
+
+    def test_names_are_unique(self):
+        self.registry.counter("x", "X")
+        with self.assertRaises(ValueError):
+            self.registry.gauge("x", "X")
+
+if __name__ == '__main__':
+    unittest.main()
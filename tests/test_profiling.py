@@ -0,0 +1,67 @@
+import unittest
+import sys
+import os
+import tempfile
+import threading
+from collections import Counter
+
+# Add the parent directory to the path so we can import the modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from profiling import StackProfile, sample_stacks, profile_to_file
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.stop = threading.Event()
+        self.worker = threading.Thread(target=busy_loop, args=(self.stop,), name="busy-worker")
+        self.worker.start()
+
+    def tearDown(self):
+        self.stop.set()
+        self.worker.join()
+
+    def test_samples_other_threads(self):
+        profile = sample_stacks(0.2, interval=0.01, thread_filter="busy-worker")
+        self.assertGreater(profile.samples, 1)
+        self.assertTrue(profile.stacks)
+        for stack in profile.stacks:
+            self.assertEqual(stack[0], "busy-worker")
+            self.assertTrue(any(frame.startswith("busy_loop (test_profiling.py:") for frame in stack[1:]))
+
+    def test_skips_the_sampling_thread(self):
+        profile = sample_stacks(0.05, interval=0.01)
+        current = threading.current_thread().name
+        self.assertFalse(any(stack[0] == current for stack in profile.stacks))
+
+    def test_writes_collapsed_stacks_and_table(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "profile.txt")
+            profile = profile_to_file(path, 0.05, interval=0.01)
+            with open(path) as f:
+                lines = f.read().splitlines()
+            with open(path + ".top") as f:
+                table = f.read()
+        self.assertEqual(len(lines), len(profile.stacks))
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in lines))
+        self.assertIn("busy_loop", table)
+
+class TestStackProfile(unittest.TestCase):
+    def test_top_counts_self_and_cumulative_samples(self):
+        stacks = Counter({("t", "main", "handle", "save"): 3, ("t", "main", "handle"): 1, ("t", "main", "idle"): 4})
+        lines = StackProfile(stacks, 8, 0.005, 0.04).top().splitlines()
+        self.assertIn("8 samples", lines[0])
+        rows = {line.split()[-1]: line.split()[:4] for line in lines[2:]}
+        self.assertEqual(rows["main"], ["0", "0.0%", "8", "100.0%"])
+        self.assertEqual(rows["handle"], ["1", "12.5%", "4", "50.0%"])
+        self.assertEqual(rows["save"], ["3", "37.5%", "3", "37.5%"])
+
+    def test_collapsed_format(self):
+        profile = StackProfile(Counter({("t", "a", "b"): 2}), 2, 0.005, 0.01)
+        self.assertEqual(profile.collapsed(), "t;a;b 2\n")
+        self.assertEqual(profile.render("collapsed"), profile.collapsed())
+
+if __name__ == '__main__':
+    unittest.main()
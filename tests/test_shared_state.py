@@ -0,0 +1,57 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add the parent directory to the path so we can import the modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from shared_state import create_shared_state, InProcessSharedState, SQLiteSharedState
+
+class TestSharedState(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'state.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_in_process_versions(self):
+        state = InProcessSharedState()
+        self.assertEqual(state.get('session'), (0, None))
+        self.assertEqual(state.put('session', {'a': 1}), 1)
+        self.assertEqual(state.put('session', {'a': 2}), 2)
+        self.assertEqual(state.get('session'), (2, {'a': 2}))
+
+    def test_sqlite_shared_between_instances(self):
+        # Two instances on one file behave like two worker processes
+        first = create_shared_state('sqlite', self.path)
+        second = SQLiteSharedState(self.path)
+        with first.lock():
+            first.put('session', {'players': ['A']})
+        self.assertEqual(second.get('session'), (1, {'players': ['A']}))
+
+    def test_sqlite_lock_is_reentrant(self):
+        state = create_shared_state('sqlite', self.path)
+        with state.lock():
+            with state.lock():
+                state.put('election', {'state': 'leader'})
+        self.assertEqual(state.get('election')[1], {'state': 'leader'})
+
+    def test_sqlite_reads_while_another_worker_writes(self):
+        first = create_shared_state('sqlite', self.path)
+        second = SQLiteSharedState(self.path, timeout=0.1)
+        first.put('session', {'n': 1})
+        with first.lock():
+            first.put('session', {'n': 2})
+            # The reader sees the last committed value without waiting for the writer
+            self.assertEqual(second.version('session'), 1)
+            self.assertEqual(second.get('session'), (1, {'n': 1}))
+        self.assertEqual(second.version('session'), 2)
+        self.assertEqual(second.version('missing'), 0)
+
+    def test_sqlite_cleared_on_create(self):
+        create_shared_state('sqlite', self.path).put('session', {'stale': True})
+        self.assertEqual(create_shared_state('sqlite', self.path).get('session'), (0, None))
+
+if __name__ == '__main__':
+    unittest.main()
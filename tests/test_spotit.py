@@ -49,5 +49,25 @@ class TestSpotItGame(unittest.TestCase):
         self.assertEqual(new_game.scores, [0, 0])
         self.assertNotEqual(self.game.cards, new_game.cards)  # Should be shuffled differently
 
+    def test_same_seed_same_deck(self):
+        self.assertEqual(generate_cards(seed=42), generate_cards(seed=42))
+        self.assertEqual(shuffle_cards(generate_cards(seed=42), 42), shuffle_cards(generate_cards(seed=42), 42))
+        self.assertNotEqual(generate_cards(seed=42), generate_cards(seed=43))
+
+    def test_smaller_deck_order(self):
+        cards = generate_cards(seed=1, q=3)
+        self.assertEqual(len(cards), 13)
+        self.assertTrue(all(len(card) == 4 for card in cards))
+
+    def test_rebuild_from_card_ids(self):
+        self.game.update_cards(0)
+        self.game.scores[0] += 1
+        rebuilt = SpotItGame.from_card_ids(self.players, self.game.seed, self.game.q,
+                                           self.game.pile_ids(), self.game.scores)
+        self.assertEqual(rebuilt.pile_ids(), self.game.pile_ids())
+        self.assertEqual(rebuilt.scores, [1, 0])
+        self.assertEqual(rebuilt.get_player_center_emojis(1), self.game.get_player_center_emojis(1))
+        self.assertEqual(rebuilt.get_player_center_emojis(0), self.game.get_player_center_emojis(0))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,265 @@
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import time
+import json
+import sqlite3
+from unittest import mock
+
+# Add the parent directory to the path so we can import the modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from storage import StorageEngine, JsonFileEngine, SQLiteEngine, create_storage_engine
+
+def snapshot(seq):
+    return json.dumps({"save_seq": seq, "event": {"event_type": f"e{seq}"}})
+
+def event_types(entries):
+    return [json.loads(entry["event_json"]).get("event_type") for entry in entries]
+
+class RecordingEngine(StorageEngine):
+    """Keeps the batches written to it."""
+    def __init__(self):
+        self.batches = []
+
+    def write_batch(self, records):
+        self.batches.append(list(records))
+
+    def load(self, game_id=None):
+        return None
+
+    def games(self):
+        return {}
+
+class FailingEngine(RecordingEngine):
+    """Fails its writes while failing is set."""
+    def __init__(self):
+        super().__init__()
+        self.failing = True
+
+    def write_batch(self, records):
+        if self.failing:
+            raise OSError("disk full")
+        super().write_batch(records)
+
+class TestJsonFileEngine(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "users_1.json")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_keeps_the_latest_state(self):
+        engine = JsonFileEngine(self.path)
+        self.assertIsNone(engine.load())
+        engine.write_batch([("g", 1, '{"n": 1}'), ("g", 2, '{"n": 2}')])
+        self.assertEqual(engine.load(), ("g", 2, '{"n": 2}'))
+        self.assertIsNone(engine.load("other"))
+        self.assertEqual(engine.games(), {"g": 2})
+        with open(self.path) as f:
+            self.assertEqual(f.read(), '{"n": 2}')
+
+    def test_clears_a_leftover_file(self):
+        with open(self.path, "w") as f:
+            f.write('{"old": true}')
+        engine = JsonFileEngine(self.path)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(engine.load())
+
+    def test_history_is_a_bounded_ring(self):
+        engine = JsonFileEngine(self.path, history_limit=4)
+        engine.write_batch([("g", seq, snapshot(seq)) for seq in range(1, 6)])
+        engine.write("other", 1, snapshot(1))
+        self.assertEqual(event_types(engine.history("g")), ["e3", "e4", "e5"])
+        page = engine.history("g", limit=2)
+        self.assertEqual(event_types(engine.history("g", after=page[-1]["id"])), ["e5"])
+
+class TestHistoryCheckpoints(unittest.TestCase):
+    def test_every_engine_logs_events_with_periodic_checkpoints(self):
+        with tempfile.TemporaryDirectory() as directory, mock.patch("storage.CHECKPOINT_EVERY", 3):
+            for engine in (JsonFileEngine(os.path.join(directory, "users_1.json")),
+                           SQLiteEngine(os.path.join(directory, "users_1.db"))):
+                engine.write_batch([("g", seq, snapshot(seq)) for seq in range(1, 8)])
+                entries = engine.history("g")
+                self.assertEqual(event_types(entries), [f"e{seq}" for seq in range(1, 8)])
+                self.assertEqual([entry["session_data_json"] for entry in entries],
+                                 [snapshot(1), "", "", snapshot(4), "", "", snapshot(7)])
+                engine.close()
+
+class TestSQLiteEngine(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "users_1.db")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_stores_several_games(self):
+        engine = SQLiteEngine(self.path)
+        engine.write("a", 1, '{"game": "a1"}')
+        engine.write("b", 1, '{"game": "b1"}')
+        engine.write("a", 2, '{"game": "a2"}')
+        self.assertEqual(engine.load(), ("a", 2, '{"game": "a2"}'))  # Written last
+        self.assertEqual(engine.load("b"), ("b", 1, '{"game": "b1"}'))
+        self.assertIsNone(engine.load("c"))
+        self.assertEqual(engine.games(), {"a": 2, "b": 1})
+        engine.close()
+
+    def test_survives_a_restart(self):
+        engine = SQLiteEngine(self.path)
+        engine.write_batch([("g", 1, '{"n": 1}'), ("g", 2, '{"n": 2}')])
+        engine.close()
+        reopened = SQLiteEngine(self.path)
+        self.assertEqual(reopened.load(), ("g", 2, '{"n": 2}'))
+        self.assertEqual(reopened.get_meta("schema_version"), "2")
+        self.assertEqual([entry["seq"] for entry in reopened.history("g")], [1, 2])
+        reopened.close()
+
+    def test_history_pages_and_limit(self):
+        engine = SQLiteEngine(self.path, history_limit=5)
+        engine.write_batch([("g", seq, snapshot(seq)) for seq in range(1, 9)])
+        engine.write("other", 1, "{}")
+        first = engine.history("g", limit=3)
+        self.assertEqual([entry["seq"] for entry in first], [4, 5, 6])  # Only the newest 5 are kept
+        second = engine.history("g", after=first[-1]["id"], limit=3)
+        self.assertEqual([entry["seq"] for entry in second], [7, 8])
+        self.assertEqual(event_types(second), ["e7", "e8"])
+        engine.close()
+
+    def test_failed_batch_writes_nothing(self):
+        engine = SQLiteEngine(self.path)
+        with self.assertRaises(Exception):
+            engine.write_batch([("g", 1, '{"n": 1}'), ("g", 2, None)])  # state is NOT NULL
+        self.assertIsNone(engine.load())
+        self.assertEqual(engine.history("g"), [])
+        engine.close()
+
+    def test_upgrades_a_version_1_database(self):
+        conn = sqlite3.connect(self.path)
+        conn.executescript(
+            "CREATE TABLE history (id INTEGER PRIMARY KEY AUTOINCREMENT, game_id TEXT NOT NULL, "
+            "seq INTEGER NOT NULL, written_at REAL NOT NULL, state TEXT NOT NULL);"
+            "CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT);"
+            "INSERT INTO metadata VALUES ('schema_version', '1');"
+            "INSERT INTO history (game_id, seq, written_at, state) VALUES ('g', 1, 0, '{\"n\": 1}');")
+        conn.close()
+        engine = SQLiteEngine(self.path)
+        self.assertEqual(engine.get_meta("schema_version"), "2")
+        engine.write("g", 2, snapshot(2))
+        old, new = engine.history("g")
+        self.assertEqual((old["session_data_json"], old["event_json"]), ('{"n": 1}', "{}"))  # Read as a checkpoint
+        self.assertEqual(event_types([new]), ["e2"])
+        engine.close()
+
+    def test_refuses_a_newer_schema(self):
+        engine = SQLiteEngine(self.path)
+        self.assertIsNone(engine.get_meta("missing"))
+        engine.conn.execute("UPDATE metadata SET value = '99' WHERE key = 'schema_version'")
+        engine.close()
+        with self.assertRaises(ValueError):
+            SQLiteEngine(self.path)
+
+    def test_engines_must_implement_the_interface(self):
+        class Partial(StorageEngine):
+            def write_batch(self, records):
+                pass
+        with self.assertRaises(TypeError):
+            Partial()
+        self.assertEqual(RecordingEngine().history("g"), [])
+
+    def test_factory(self):
+        self.assertIsInstance(create_storage_engine("sqlite", self.path), SQLiteEngine)
+        with self.assertRaises(ValueError):
+            create_storage_engine("tape", self.path)
+
+class TestPersistentStoreRestart(unittest.TestCase):
+    def test_sequence_numbers_survive_a_restart(self):
+        from server import PersistentStore
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "users_1.db")
+            engine = SQLiteEngine(path)
+            self.assertEqual(PersistentStore(engine).save('{"n": 3}', "g", 3, "r3"), "store")
+            engine.close()
+            engine = SQLiteEngine(path)
+            store = PersistentStore(engine)
+            self.assertEqual(store.load(), '{"n": 3}')
+            self.assertEqual(store.committed_seq("g"), 3)
+            self.assertEqual(store.save('{"n": 2}', "g", 2, "r2"), "stale")
+            engine.close()
+
+class TestPersistentStoreFailedWrites(unittest.TestCase):
+    def setUp(self):
+        from server import PersistentStore
+        self.engine = FailingEngine()
+        self.store = PersistentStore(self.engine)
+
+    def test_failed_save_is_not_applied(self):
+        with self.assertRaises(OSError):
+            self.store.save('{"n": 1}', "g", 1, "r1")
+        self.assertIsNone(self.store.load())
+        self.assertEqual(self.store.committed_seq("g"), 0)
+        self.engine.failing = False
+        self.assertEqual(self.store.save('{"n": 1}', "g", 1, "r1"), "store")  # The retry is written, not skipped
+        self.assertEqual(self.engine.batches, [[("g", 1, '{"n": 1}')]])
+
+    def test_retry_of_an_unwritten_save_waits_for_the_write(self):
+        _, position = self.store.log('{"n": 1}', "g", 1, "r1")
+        with self.assertRaises(OSError):
+            self.store.flush(position)
+        verdict, retry_position = self.store.log('{"n": 1}', "g", 1, "r1")
+        self.assertEqual((verdict, retry_position), ("duplicate", position))
+        with self.assertRaises(OSError):
+            self.store.flush(retry_position)  # Still not written, so still not acknowledged
+        self.engine.failing = False
+        self.store.flush(retry_position)
+        self.assertEqual(self.engine.batches, [[("g", 1, '{"n": 1}')]])
+        self.assertGreaterEqual(self.store.flushed, position)
+
+class TestPersistentStoreGroupCommit(unittest.TestCase):
+    def setUp(self):
+        from server import PersistentStore
+        self.engine = RecordingEngine()
+        self.store = PersistentStore(self.engine)
+
+    def test_logged_saves_are_visible_before_they_are_written(self):
+        verdict, position = self.store.log('{"n": 1}', "g", 1, "r1")
+        self.assertEqual(verdict, "store")
+        self.assertEqual(self.store.load(), '{"n": 1}')
+        self.assertEqual(self.store.log('{"n": 1}', "g", 1, "r1")[0], "duplicate")
+        self.assertEqual(self.engine.batches, [])
+        self.assertLess(self.store.flushed, position)
+
+    def test_flush_writes_logged_saves_as_one_batch(self):
+        for seq in (1, 2, 3):
+            _, position = self.store.log(f'{{"n": {seq}}}', "g", seq, f"r{seq}")
+        self.store.flush(position)
+        self.store.flush(position)  # Written by the first flush already
+        self.assertEqual([[record[1] for record in batch] for batch in self.engine.batches], [[1, 2, 3]])
+
+    def test_save_writes_earlier_logged_saves_first(self):
+        self.store.log('{"n": 1}', "g", 1, "r1")
+        self.assertEqual(self.store.save('{"n": 2}', "g", 2, "r2"), "store")
+        self.assertEqual([[record[1] for record in batch] for batch in self.engine.batches], [[1, 2]])
+
+    def test_flusher_writes_on_its_timer(self):
+        threading.Thread(target=self.store.run_flusher, daemon=True).start()
+        _, position = self.store.log('{"n": 1}', "g", 1, "r1")
+        deadline = time.monotonic() + 2
+        while self.store.flushed < position and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.engine.batches, [[("g", 1, '{"n": 1}')]])
+
+    def test_concurrent_flushes_share_batches(self):
+        positions = [self.store.log(f'{{"n": {seq}}}', "g", seq, f"r{seq}")[1] for seq in range(1, 21)]
+        threads = [threading.Thread(target=self.store.flush, args=(position,)) for position in positions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([record[1] for batch in self.engine.batches for record in batch], list(range(1, 21)))
+        self.assertLess(len(self.engine.batches), 20)
+
+if __name__ == '__main__':
+    unittest.main()
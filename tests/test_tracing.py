@@ -0,0 +1,64 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path so we can import the modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from tracing import Tracer, RingExporter, SpanContext, TRACEPARENT
+
+class FakeGrpcContext:
+    def __init__(self, metadata):
+        self.metadata = metadata
+
+    def invocation_metadata(self):
+        return self.metadata
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.ring = RingExporter()
+        self.tracer = Tracer("app", sample_rate=1.0, exporters=[self.ring])
+
+    def test_nested_spans_share_the_trace(self):
+        with self.tracer.start_span("request") as root:
+            with self.tracer.start_span("save") as child:
+                pass
+        spans = {s["name"]: s for s in self.ring.recent()}
+        self.assertEqual(spans["save"]["trace_id"], spans["request"]["trace_id"])
+        self.assertEqual(spans["save"]["parent_id"], root.context.span_id)
+        self.assertIsNone(spans["request"]["parent_id"])
+        self.assertIsNone(self.tracer.current_span())
+
+    def test_context_crosses_rpcs_in_metadata(self):
+        server_ring = RingExporter()
+        server = Tracer("server", sample_rate=0.0, exporters=[server_ring])
+        with self.tracer.start_span("request") as root:
+            metadata = self.tracer.grpc_metadata()
+        self.assertEqual(metadata[0][0], TRACEPARENT)
+        # The server follows the caller's decision even though it samples nothing itself
+        with server.start_span("SaveGameState", parent=server.context_from_grpc(FakeGrpcContext(metadata))):
+            pass
+        span = server_ring.recent()[0]
+        self.assertEqual(span["trace_id"], root.context.trace_id)
+        self.assertEqual(span["parent_id"], root.context.span_id)
+
+    def test_unsampled_traces_are_not_exported(self):
+        self.tracer.sample_rate = 0.0
+        with self.tracer.start_span("request"):
+            with self.tracer.start_span("save") as child:
+                child.set_attribute("bytes", 10)
+            metadata = self.tracer.grpc_metadata()
+        self.assertEqual(self.ring.recent(), [])
+        self.assertFalse(SpanContext.from_traceparent(metadata[0][1]).sampled)
+
+    def test_errors_are_recorded(self):
+        with self.assertRaises(RuntimeError):
+            with self.tracer.start_span("save"):
+                raise RuntimeError("backend down")
+        self.assertEqual(self.ring.recent()[0]["error"], "RuntimeError: backend down")
+
+    def test_malformed_traceparent_is_ignored(self):
+        self.assertIsNone(SpanContext.from_traceparent("garbage"))
+        self.assertIsNone(self.tracer.context_from_grpc(FakeGrpcContext(())))
+
+if __name__ == '__main__':
+    unittest.main()
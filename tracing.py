@@ -0,0 +1,155 @@
+import contextvars
+import json
+import random
+import threading
+import time
+from collections import deque
+
+TRACEPARENT = "traceparent"  # gRPC metadata key, in the W3C trace context format
+
+_current_span = contextvars.ContextVar("spotit_current_span", default=None)
+
+class SpanContext:
+    """What a child span needs from its parent, in process or across an RPC."""
+    def __init__(self, trace_id, span_id, sampled):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    @classmethod
+    def from_traceparent(cls, value):
+        """Parse a traceparent header, or return None if it is missing or malformed."""
+        parts = (value or "").split("-")
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        return cls(parts[1], parts[2], parts[3] == "01")
+
+# -------------------------
+# Span: one timed stage of a request. Spans of unsampled traces still carry
+# their context, so the sampling decision made where the trace starts is
+# followed by every process it reaches, but they are never exported.
+# -------------------------
+class Span:
+    def __init__(self, tracer, name, context, parent_id=None, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {}) if context.sampled else None
+        self.start_time = time.time()
+        self.start = time.perf_counter()
+        self.error = None
+        self._token = None
+
+    def set_attribute(self, key, value):
+        if self.attributes is not None:
+            self.attributes[key] = value
+
+    def activate(self):
+        """Make this the current span of the thread, so spans started next are its children."""
+        self._token = _current_span.set(self)
+        return self
+
+    def finish(self):
+        duration = time.perf_counter() - self.start
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                _current_span.set(None)  # Finished from another context than it was activated in
+            self._token = None
+        if self.context.sampled:
+            self.tracer.export({
+                "trace_id": self.context.trace_id,
+                "span_id": self.context.span_id,
+                "parent_id": self.parent_id,
+                "name": self.name,
+                "service": self.tracer.service,
+                "start": self.start_time,
+                "duration_ms": duration * 1000,
+                "attributes": self.attributes,
+                "error": self.error,
+            })
+
+    def __enter__(self):
+        return self.activate()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.finish()
+        return False
+
+# -------------------------
+# Exporters: where finished spans go. A tracer can have several.
+# -------------------------
+class RingExporter:
+    """Keeps the most recent spans in memory, e.g. to serve over a debug endpoint."""
+    def __init__(self, capacity=2000):
+        self.spans = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+
+    def export(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def recent(self, trace_id=None, limit=100):
+        """The newest spans, oldest first, optionally of one trace only."""
+        with self.lock:
+            spans = [s for s in self.spans if trace_id is None or s["trace_id"] == trace_id]
+        return spans[-limit:] if limit else spans
+
+class JsonlExporter:
+    """Appends one JSON line per span to a file, created on the first span."""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span) + "\n"
+        with self.lock, open(self.path, "a") as f:
+            f.write(line)
+
+class Tracer:
+    def __init__(self, service, sample_rate=0.0, exporters=()):
+        self.service = service
+        self.sample_rate = sample_rate  # Fraction of new traces recorded; children follow their parent
+        self.exporters = list(exporters)
+
+    def export(self, span):
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                print(f"[Tracing] {type(exporter).__name__} failed: {e}")
+
+    def current_span(self):
+        return _current_span.get()
+
+    def start_span(self, name, parent=None, attributes=None):
+        """Start a span under parent (a SpanContext), or under the current span, or as a new trace.
+
+        Use it as a context manager, or call activate() and finish() yourself."""
+        if parent is None:
+            current = _current_span.get()
+            parent = current.context if current is not None else None
+        span_id = f"{random.getrandbits(64):016x}"
+        if parent is None:
+            context = SpanContext(f"{random.getrandbits(128):032x}", span_id, random.random() < self.sample_rate)
+            return Span(self, name, context, None, attributes)
+        return Span(self, name, SpanContext(parent.trace_id, span_id, parent.sampled), parent.span_id, attributes)
+
+    def grpc_metadata(self):
+        """Metadata carrying the current span's context to an RPC, or None outside a span."""
+        current = _current_span.get()
+        return ((TRACEPARENT, current.context.traceparent()),) if current is not None else None
+
+    def context_from_grpc(self, grpc_context):
+        """The caller's SpanContext from an incoming RPC's metadata, or None."""
+        for key, value in grpc_context.invocation_metadata() or ():
+            if key == TRACEPARENT:
+                return SpanContext.from_traceparent(value)
+        return None